@@ -1,4 +1,5 @@
 import os
+import socket
 
 from dotenv import load_dotenv
 
@@ -10,12 +11,119 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "your_token_here")               # Token of y
 ADMIN_ID = int(os.getenv("ADMIN_ID", 123456789))                    # Id of your admin
 
 DB_URL = os.getenv("DB_URL", "your_database_url_here")              # Url of your database
+# Пул соединений asyncpg
+DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_MAX_INACTIVE_CONN_LIFETIME_SEC: float = float(os.getenv("DB_MAX_INACTIVE_CONN_LIFETIME_SEC", 300))
+DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256))  # 0 — за pgbouncer (transaction)
+DB_COMMAND_TIMEOUT_SEC: float = float(os.getenv("DB_COMMAND_TIMEOUT_SEC", 30))
+DB_CONNECT_TIMEOUT_SEC: float = float(os.getenv("DB_CONNECT_TIMEOUT_SEC", 10))
 
 RATE_LIMIT_PER_MIN: int = int(os.getenv("RATE_LIMIT_PER_MIN", 20))  # Rate limit per minute
 
+# Кэш статуса подписки в памяти процесса (меню обработки видео не ходит в БД)
+SUBSCRIPTION_CACHE_TTL_SEC: int = int(os.getenv("SUBSCRIPTION_CACHE_TTL_SEC", 30))
+SUBSCRIPTION_CACHE_SIZE: int = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", 10000))   # Пользователей
+# username / last_seen пишутся в БД пачкой раз в N секунд
+USER_ACTIVITY_FLUSH_SEC: float = float(os.getenv("USER_ACTIVITY_FLUSH_SEC", 5))
+
+# Напоминания об окончании подписки
+SUBSCRIPTION_REMINDER_HOURS = [                                            # За сколько часов напоминать
+    int(h) for h in os.getenv("SUBSCRIPTION_REMINDER_HOURS", "72,24").split(",") if h.strip()
+]
+SUBSCRIPTION_EXPIRED_LOOKBACK_HOURS: int = int(os.getenv("SUBSCRIPTION_EXPIRED_LOOKBACK_HOURS", 24))  # Давно истекшим не пишем
+SUBSCRIPTION_SWEEP_INTERVAL_SEC: int = int(os.getenv("SUBSCRIPTION_SWEEP_INTERVAL_SEC", 600))
+SUBSCRIPTION_SWEEP_BATCH: int = int(os.getenv("SUBSCRIPTION_SWEEP_BATCH", 500))
+
+# Режим получения апдейтов: polling (один процесс) или webhook (несколько воркеров)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")             # Публичный https://адрес бота
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")                 # Пусто — выводится из BOT_TOKEN
+WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", 1))      # Процессов на одном порту (SO_REUSEPORT)
+# Общие FSM и антифлуд для всех воркеров (нужен при WEBHOOK_WORKERS > 1)
+REDIS_URL = os.getenv("REDIS_URL", "")
+
 # CryptoBot API Token
 CRYPTO_BOT_TOKEN = os.getenv("CRYPTO_BOT_TOKEN", "your_crypto_bot_token_here")
 
+# Проверка оплаты инвойсов CryptoBot
+INVOICE_POLL_INTERVAL_SEC: float = float(os.getenv("INVOICE_POLL_INTERVAL_SEC", 10))  # Один запрос на пачку
+INVOICE_TIMEOUT_SEC: float = float(os.getenv("INVOICE_TIMEOUT_SEC", 300))             # 5 минут на оплату
+
+# Вебхук Crypto Pay (invoice_paid); опрос тогда — только редкая сверка
+CRYPTO_WEBHOOK_ENABLED = os.getenv("CRYPTO_WEBHOOK_ENABLED", "0").lower() in ("1", "true", "yes")
+CRYPTO_WEBHOOK_HOST = os.getenv("CRYPTO_WEBHOOK_HOST", "0.0.0.0")
+CRYPTO_WEBHOOK_PORT: int = int(os.getenv("CRYPTO_WEBHOOK_PORT", 8081))
+CRYPTO_WEBHOOK_PATH = os.getenv("CRYPTO_WEBHOOK_PATH", "/cryptobot/webhook")
+INVOICE_RECONCILE_INTERVAL_SEC: float = float(os.getenv("INVOICE_RECONCILE_INTERVAL_SEC", 60))
+
+# Общий HTTP-клиент для внешних API (services/http_client.py)
+HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", 100))             # Соединений всего
+HTTP_LIMIT_PER_HOST: int = int(os.getenv("HTTP_LIMIT_PER_HOST", 10))      # Соединений на один хост
+HTTP_TIMEOUT_SEC: float = float(os.getenv("HTTP_TIMEOUT_SEC", 15))        # Весь запрос
+HTTP_CONNECT_TIMEOUT_SEC: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SEC", 5))
+HTTP_RETRIES: int = int(os.getenv("HTTP_RETRIES", 3))                     # Повторов после первой попытки
+
+# Очередь исходящих сообщений (лимиты Telegram: ~30/с на бота, ~1/с в чат, 20/мин в группу)
+SEND_GLOBAL_RATE: float = float(os.getenv("SEND_GLOBAL_RATE", 25))        # Сообщений/с, запас под прямые ответы
+SEND_CHAT_RATE: float = float(os.getenv("SEND_CHAT_RATE", 1))             # Сообщений/с в один чат
+SEND_CHAT_BURST: int = int(os.getenv("SEND_CHAT_BURST", 3))               # Допустимая пачка подряд в чат
+SEND_GROUP_RATE_PER_MIN: int = int(os.getenv("SEND_GROUP_RATE_PER_MIN", 20))
+SEND_MAX_RETRIES: int = int(os.getenv("SEND_MAX_RETRIES", 3))             # Повторов после 429
+
+# Рассылка от админа
+BROADCAST_CHUNK_SIZE: int = int(os.getenv("BROADCAST_CHUNK_SIZE", 200))           # Получателей за одну выборку
+BROADCAST_PROGRESS_INTERVAL_SEC: int = int(os.getenv("BROADCAST_PROGRESS_INTERVAL_SEC", 5))
+
+# Поиск почти одинаковых видео: макс. средняя дистанция Хэмминга (из 64 бит на кадр)
+FINGERPRINT_MAX_DISTANCE: float = float(os.getenv("FINGERPRINT_MAX_DISTANCE", 10))
+
+# Обработка видео: пул ffmpeg (0 = по числу ядер) и бюджеты допуска (в секундах оценки)
+ENCODE_WORKERS: int = int(os.getenv("ENCODE_WORKERS", 0))                # Одновременных ffmpeg
+ENCODE_THREADS: int = int(os.getenv("ENCODE_THREADS", 0))                # Потоков на один ffmpeg
+ENCODE_RESERVED_CORES: int = int(os.getenv("ENCODE_RESERVED_CORES", 1))  # Ядер только для бота
+ENCODE_NICE: int = int(os.getenv("ENCODE_NICE", 10))                     # Приоритет энкодеров
+ADMISSION_MAX_JOB_SEC: float = float(os.getenv("ADMISSION_MAX_JOB_SEC", 900))          # Одна задача
+ADMISSION_USER_BUDGET_SEC: float = float(os.getenv("ADMISSION_USER_BUDGET_SEC", 900))  # Все задачи пользователя
+ADMISSION_GLOBAL_BUDGET_SEC: float = float(os.getenv("ADMISSION_GLOBAL_BUDGET_SEC", 3600))  # Очередь целиком
+
+# Дисковый кэш исходников и нормализованных файлов (по file_unique_id)
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "cache/media")
+MEDIA_CACHE_MAX_BYTES: int = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # 2 ГБ
+MEDIA_CACHE_TTL_SEC: int = int(os.getenv("MEDIA_CACHE_TTL_SEC", 24 * 3600))         # Сутки без обращений
+
+# Контентно-адресуемое хранилище шрифтов/музыки/оверлеев (по SHA-256)
+MEDIA_STORE_DIR = os.getenv("MEDIA_STORE_DIR", "media_store")
+
+# Хранилище файлов: local (папка на диске / общая сетевая папка) или s3 (AWS, MinIO)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "storage")
+STORAGE_PRESIGN_TTL_SEC: int = int(os.getenv("STORAGE_PRESIGN_TTL_SEC", 3600))
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # Например http://localhost:9000 для MinIO
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PREFIX = os.getenv("S3_PREFIX", "botunik")
+S3_MULTIPART_CHUNK_MB: int = int(os.getenv("S3_MULTIPART_CHUNK_MB", 16))
+S3_MAX_CONCURRENCY: int = int(os.getenv("S3_MAX_CONCURRENCY", 8))
+
+# Профили libx264 по эффекту и разрешению (генерирует scripts/encoder_autotune.py)
+ENCODER_PROFILES_PATH = os.getenv("ENCODER_PROFILES_PATH", "encoder_profiles.json")
+
+# Рабочие папки задач обработки видео (переживают рестарт бота)
+VIDEO_JOBS_DIR = os.getenv("VIDEO_JOBS_DIR", "cache/jobs")
+VIDEO_JOB_MAX_ATTEMPTS: int = int(os.getenv("VIDEO_JOB_MAX_ATTEMPTS", 3))  # Перезапусков до отказа
+# Аренда задачи: владелец продлевает ее, пока жив; чужую задачу забираем после истечения
+VIDEO_JOB_LEASE_SEC: int = int(os.getenv("VIDEO_JOB_LEASE_SEC", 120))
+INSTANCE_ID = os.getenv("INSTANCE_ID") or socket.gethostname()          # Имя узла (стабильное между рестартами)
+
+# Шрифт для эмодзи в подписях (например NotoColorEmoji.ttf), необязательно
+EMOJI_FONT_PATH = os.getenv("EMOJI_FONT_PATH", "fonts/NotoColorEmoji.ttf")
+
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set. Put it into .env or environment.")
 
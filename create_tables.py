@@ -67,9 +67,13 @@ class DB:
                 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id
                 ON public.subscriptions(user_id);
             """)
+            # (дата окончания, user_id) — постраничный обход по дате (services/subscription_reminders.py)
             cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_subscriptions_end_date
-                ON public.subscriptions(subscription_end_date);
+                DROP INDEX IF EXISTS public.idx_subscriptions_end_date;
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_subscriptions_end_date_user
+                ON public.subscriptions(subscription_end_date, user_id);
             """)
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS public.fonts (
@@ -100,6 +104,141 @@ class DB:
                 CREATE INDEX IF NOT EXISTS idx_music_file_id
                 ON public.music(file_id);
             """)
+            # Канонический формат трека (см. services/music_library.py)
+            cur.execute("""
+                ALTER TABLE public.music
+                    ADD COLUMN IF NOT EXISTS sample_rate INTEGER,
+                    ADD COLUMN IF NOT EXISTS channels SMALLINT,
+                    ADD COLUMN IF NOT EXISTS loudness_lufs DOUBLE PRECISION;
+            """)
+            # Хеш содержимого файла в services/media_store.py (строки — ссылки на файл)
+            cur.execute("""
+                ALTER TABLE public.fonts ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+            """)
+            cur.execute("""
+                ALTER TABLE public.music ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_fonts_content_hash
+                ON public.fonts(content_hash);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_music_content_hash
+                ON public.music(content_hash);
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.video_fingerprints (
+                    id SERIAL PRIMARY KEY,
+                    file_unique_id VARCHAR(255) NOT NULL,
+                    effect VARCHAR(50) NOT NULL,
+                    fingerprint BYTEA NOT NULL,
+                    result_file_id VARCHAR(255) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (file_unique_id, effect)
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.video_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    chat_id BIGINT NOT NULL,
+                    effect VARCHAR(50) NOT NULL,
+                    source JSONB NOT NULL,
+                    stage VARCHAR(32) NOT NULL DEFAULT 'queued',
+                    scratch JSONB NOT NULL DEFAULT '{}'::jsonb,
+                    status VARCHAR(16) NOT NULL DEFAULT 'active',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_video_jobs_active
+                ON public.video_jobs(id) WHERE status = 'active';
+            """)
+            # Владелец задачи ("узел:воркер") и его последний сигнал жизни
+            cur.execute("""
+                ALTER TABLE public.video_jobs
+                    ADD COLUMN IF NOT EXISTS owner VARCHAR(128),
+                    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+            """)
+            # Пользователь заблокировал бота (ставится рассылкой, снимается при /start)
+            cur.execute("""
+                ALTER TABLE public.users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMP;
+            """)
+            # Последняя активность (пишется пачками, см. services/user_activity.py)
+            cur.execute("""
+                ALTER TABLE public.users ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP;
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.broadcasts (
+                    id BIGSERIAL PRIMARY KEY,
+                    from_chat_id BIGINT NOT NULL,
+                    message_id BIGINT NOT NULL,
+                    status VARCHAR(16) NOT NULL DEFAULT 'active',
+                    last_user_id BIGINT NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    blocked INTEGER NOT NULL DEFAULT 0,
+                    status_chat_id BIGINT,
+                    status_message_id BIGINT,
+                    created_by BIGINT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.broadcast_deliveries (
+                    broadcast_id BIGINT NOT NULL REFERENCES public.broadcasts(id) ON DELETE CASCADE,
+                    user_id BIGINT NOT NULL,
+                    status VARCHAR(16) NOT NULL,
+                    error TEXT,
+                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (broadcast_id, user_id)
+                );
+            """)
+            # Отправленные напоминания: одно на (пользователь, вид, дата окончания)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.subscription_notifications (
+                    user_id BIGINT NOT NULL,
+                    kind VARCHAR(16) NOT NULL,
+                    end_date TIMESTAMP NOT NULL,
+                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, kind, end_date)
+                );
+            """)
+            # Изменения fonts/music рассылаются процессам бота (services/media_catalog.py):
+            # payload "таблица:операция:id"
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION public.notify_media_catalog() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'TRUNCATE' THEN
+                        PERFORM pg_notify('media_catalog', TG_TABLE_NAME || ':TRUNCATE:');
+                    ELSIF TG_OP = 'DELETE' THEN
+                        PERFORM pg_notify('media_catalog', TG_TABLE_NAME || ':DELETE:' || OLD.id);
+                    ELSE
+                        PERFORM pg_notify('media_catalog', TG_TABLE_NAME || ':' || TG_OP || ':' || NEW.id);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+            """)
+            for table in ("fonts", "music"):
+                cur.execute(f"""
+                    DROP TRIGGER IF EXISTS {table}_catalog_notify ON public.{table};
+                    CREATE TRIGGER {table}_catalog_notify
+                    AFTER INSERT OR UPDATE OR DELETE ON public.{table}
+                    FOR EACH ROW EXECUTE PROCEDURE public.notify_media_catalog();
+                """)
+                cur.execute(f"""
+                    DROP TRIGGER IF EXISTS {table}_catalog_truncate ON public.{table};
+                    CREATE TRIGGER {table}_catalog_truncate
+                    AFTER TRUNCATE ON public.{table}
+                    FOR EACH STATEMENT EXECUTE PROCEDURE public.notify_media_catalog();
+                """)
         print("✅ Все таблицы созданы/проверены")
 
     def close(self) -> None:
@@ -1,7 +1,87 @@
 # database/user.py
 import os
+import json
+import time
+import asyncio
 import asyncpg
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
+
+from config import (
+    SUBSCRIPTION_CACHE_TTL_SEC, SUBSCRIPTION_CACHE_SIZE,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_MAX_INACTIVE_CONN_LIFETIME_SEC,
+    DB_STATEMENT_CACHE_SIZE, DB_COMMAND_TIMEOUT_SEC, DB_CONNECT_TIMEOUT_SEC,
+)
+from services.utils import TTLCache
+
+# Запросы, которые выполняются почти на каждый апдейт: готовятся один раз
+# при открытии соединения и дальше выполняются без разбора и планирования
+HOT_STATEMENTS = {
+    # xmax = 0 только у только что вставленной строки — так узнаем, новый ли пользователь
+    "upsert_user": """
+        INSERT INTO public.users (user_id, username, balance, last_seen)
+        VALUES ($1, $2, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id) DO UPDATE
+        SET username = EXCLUDED.username,
+            last_seen = EXCLUDED.last_seen,
+            blocked_at = NULL
+        RETURNING (xmax = 0) AS inserted
+    """,
+    "get_balance": "SELECT balance FROM public.users WHERE user_id = $1",
+    # Сколько осталось, считает БД — кэш не зависит от часового пояса бота
+    "subscription_status": """
+        SELECT subscription_end_date,
+               EXTRACT(EPOCH FROM subscription_end_date - LOCALTIMESTAMP) AS remaining
+        FROM public.subscriptions
+        WHERE user_id = $1
+    """,
+    # Зачисление оплаченного инвойса: отметка и баланс в одном выражении (см. credit_invoice)
+    "credit_invoice": """
+        WITH claimed AS (
+            INSERT INTO public.processed_invoices (invoice_id, user_id, amount, asset)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (invoice_id) DO NOTHING
+            RETURNING user_id, amount
+        ), credited AS (
+            INSERT INTO public.users (user_id, balance)
+            SELECT user_id, amount FROM claimed
+            ON CONFLICT (user_id) DO UPDATE
+            SET balance = users.balance + EXCLUDED.balance
+            RETURNING balance
+        )
+        SELECT balance FROM credited
+    """,
+    "update_video_job": """
+        UPDATE public.video_jobs
+        SET stage = $2,
+            scratch = COALESCE($3::jsonb, scratch),
+            updated_at = CURRENT_TIMESTAMP,
+            heartbeat_at = CURRENT_TIMESTAMP
+        WHERE id = $1
+    """,
+}
+
+
+class HotConnection(asyncpg.Connection):
+    """Соединение пула с заранее подготовленными HOT_STATEMENTS"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hot: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+    async def prepare_hot(self) -> None:
+        for name in HOT_STATEMENTS:
+            try:
+                await self.hot(name)
+            except asyncpg.PostgresError as e:
+                # Например, не применена миграция create_tables.py — подготовим при первом вызове
+                print(f"❌ Не удалось подготовить запрос {name}: {e}")
+
+    async def hot(self, name: str, refresh: bool = False):
+        stmt = self._hot.get(name)
+        if stmt is None or refresh:
+            stmt = self._hot[name] = await self.prepare(HOT_STATEMENTS[name])
+        return stmt
+
 
 class AsyncDB:
     def __init__(self, dbname: str, user: str, password: str, host: str, port: int = 5432):
@@ -11,114 +91,151 @@ class AsyncDB:
         self.host = host
         self.port = port
         self.pool: Optional[asyncpg.Pool] = None
+        # user_id -> (дата окончания, monotonic-момент окончания); сбрасывается при изменении подписки
+        self._subscriptions = TTLCache(SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL_SEC)
+        self._subscription_writes = 0
+        # Несколько первых запросов одновременно не должны создать несколько пулов
+        self._connect_lock = asyncio.Lock()
+        # Без кэша выражений (pgbouncer в режиме transaction) не готовим и горячие запросы
+        self._prepare_hot = DB_STATEMENT_CACHE_SIZE > 0
 
     async def connect(self):
-        self.pool = await asyncpg.create_pool(
-            database=self.dbname, user=self.user, password=self.password,
-            host=self.host, port=self.port,
-        )
+        async with self._connect_lock:
+            if self.pool is not None:
+                return
+            self.pool = await asyncpg.create_pool(
+                database=self.dbname, user=self.user, password=self.password,
+                host=self.host, port=self.port,
+                min_size=min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+                max_size=DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONN_LIFETIME_SEC,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                command_timeout=DB_COMMAND_TIMEOUT_SEC,
+                timeout=DB_CONNECT_TIMEOUT_SEC,
+                connection_class=HotConnection,
+                init=self._init_connection,
+            )
+
+    async def _init_connection(self, conn: HotConnection) -> None:
+        if self._prepare_hot:
+            await conn.prepare_hot()
 
     async def close(self):
         if self.pool:
             await self.pool.close()
+            self.pool = None
+
+    async def listen(self, channel: str, callback) -> asyncpg.Connection:
+        """
+        Отдельное соединение (вне пула), подписанное на LISTEN channel
+        
+        Args:
+            channel: Канал NOTIFY
+            callback: callback(connection, pid, channel, payload) из asyncpg
+            
+        Returns:
+            Соединение — закрывает вызывающий
+        """
+        conn = await asyncpg.connect(
+            database=self.dbname, user=self.user, password=self.password,
+            host=self.host, port=self.port, timeout=DB_CONNECT_TIMEOUT_SEC,
+        )
+        try:
+            await conn.add_listener(channel, callback)
+        except Exception:
+            await conn.close()
+            raise
+        return conn
 
     async def _ensure_pool(self):
         if self.pool is None:
             await self.connect()
-            
-    # --- методы ---
-    async def user_exists(self, user_id: int) -> bool:
-        query = "SELECT 1 FROM public.users WHERE user_id = $1 LIMIT 1"
-        async with self.pool.acquire() as conn:
-            return bool(await conn.fetchrow(query, user_id))
 
-    async def add_user(self, user_id: int, username: Optional[str]) -> None:
-        if self.pool is None:
-            raise RuntimeError("DB pool is not initialized. Call connect() first.")
-        query = """
-            INSERT INTO public.users (user_id, username, balance)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (user_id) DO NOTHING
+    async def _hot(self, method: str, name: str, *args) -> Any:
         """
-        async with self.pool.acquire() as conn:
-            await conn.execute(query, user_id, username, 0.0)
+        Выполняет горячий запрос из HOT_STATEMENTS
 
-    async def delete_user(self, user_id: int) -> None:
-        async with self.pool.acquire() as conn:
-            await conn.execute("DELETE FROM public.users WHERE user_id = $1", user_id)
-    
-    async def get_balance(self, user_id: int) -> float:
-        # Подстраховка: если забыли вызвать connect()
+        Args:
+            method: fetch / fetchrow / fetchval
+            name: Ключ HOT_STATEMENTS
+        """
         if self.pool is None:
             await self.connect()
 
-        query = "SELECT balance FROM public.users WHERE user_id = $1"
         async with self.pool.acquire() as conn:
-            val = await conn.fetchval(query, user_id)
-            return float(val) if val is not None else 0.0
-    
-    async def add_balance(self, user_id: int, amount: float) -> float:
-        """
-        Добавляет сумму к балансу пользователя
-        
-        Args:
-            user_id: ID пользователя
-            amount: Сумма для добавления
+            if not self._prepare_hot:
+                return await getattr(conn, method)(HOT_STATEMENTS[name], *args)
+            stmt = await conn.hot(name)
+            try:
+                return await getattr(stmt, method)(*args)
+            except (asyncpg.exceptions.InvalidCachedStatementError,
+                    asyncpg.exceptions.OutdatedSchemaCacheError):
+                # Схема изменилась (ALTER TABLE) — запрос не выполнялся, готовим заново
+                stmt = await conn.hot(name, refresh=True)
+                return await getattr(stmt, method)(*args)
             
-        Returns:
-            Новый баланс пользователя
+    # --- методы ---
+    async def upsert_user(self, user_id: int, username: Optional[str]) -> bool:
         """
-        if self.pool is None:
-            await self.connect()
-        
-        query = """
-            UPDATE public.users 
-            SET balance = balance + $2 
-            WHERE user_id = $1
-            RETURNING balance
+        Добавляет пользователя или обновляет его username (один запрос)
+
+        Заодно снимает отметку о блокировке бота — пользователь снова получает рассылки.
+
+        Returns:
+            True, если пользователь новый
         """
-        async with self.pool.acquire() as conn:
-            new_balance = await conn.fetchval(query, user_id, amount)
-            return float(new_balance) if new_balance is not None else 0.0
-    
-    async def is_invoice_processed(self, invoice_id: int) -> bool:
+        return bool(await self._hot("fetchval", "upsert_user", user_id, username))
+
+    async def touch_users(self, users: list) -> None:
         """
-        Проверяет, был ли инвойс уже обработан
-        
+        Пакетно обновляет username и время последней активности
+
         Args:
-            invoice_id: ID инвойса
-            
-        Returns:
-            True если инвойс уже был обработан
+            users: [(user_id, username, секунд назад)] — время отсчитывает БД,
+                   как и CURRENT_TIMESTAMP в upsert_user
         """
         if self.pool is None:
             await self.connect()
-        
-        query = "SELECT 1 FROM public.processed_invoices WHERE invoice_id = $1 LIMIT 1"
+
+        query = """
+            UPDATE public.users u
+            SET username = v.username,
+                last_seen = GREATEST(u.last_seen, LOCALTIMESTAMP - v.age * INTERVAL '1 second')
+            FROM unnest($1::bigint[], $2::varchar[], $3::float8[]) AS v(user_id, username, age)
+            WHERE u.user_id = v.user_id
+        """
+        user_ids, usernames, ages = zip(*users)
         async with self.pool.acquire() as conn:
-            result = await conn.fetchrow(query, invoice_id)
-            return result is not None
+            await conn.execute(query, list(user_ids), list(usernames), list(ages))
+
+    async def delete_user(self, user_id: int) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute("DELETE FROM public.users WHERE user_id = $1", user_id)
+    
+    async def get_balance(self, user_id: int) -> float:
+        val = await self._hot("fetchval", "get_balance", user_id)
+        return float(val) if val is not None else 0.0
     
-    async def mark_invoice_processed(self, invoice_id: int, user_id: int, amount: float, asset: str) -> None:
+    async def credit_invoice(self, invoice_id: int, user_id: int, amount: float, asset: str) -> Optional[float]:
         """
-        Помечает инвойс как обработанный
+        Атомарно зачисляет оплаченный инвойс (один запрос)
+        
+        Отметка в processed_invoices и пополнение баланса — одно выражение:
+        при одновременном зачислении из опроса и вебхука второй вызов ждет
+        уникальный индекс invoice_id и ничего не меняет, а сбой между шагами
+        невозможен.
         
         Args:
             invoice_id: ID инвойса
             user_id: ID пользователя
-            amount: Сумма платежа
+            amount: Сумма
             asset: Криптовалюта
+            
+        Returns:
+            Новый баланс или None, если инвойс уже был зачислен
         """
-        if self.pool is None:
-            await self.connect()
-        
-        query = """
-            INSERT INTO public.processed_invoices (invoice_id, user_id, amount, asset)
-            VALUES ($1, $2, $3, $4)
-            ON CONFLICT (invoice_id) DO NOTHING
-        """
-        async with self.pool.acquire() as conn:
-            await conn.execute(query, invoice_id, user_id, amount, asset)
+        balance = await self._hot("fetchval", "credit_invoice", invoice_id, user_id, amount, asset)
+        return float(balance) if balance is not None else None
     
     # --- Методы для работы с подписками ---
     
@@ -143,6 +260,7 @@ class AsyncDB:
         """
         async with self.pool.acquire() as conn:
             await conn.execute(query, user_id, end_date)
+        self._invalidate_subscription(user_id)
     
     async def remove_subscription(self, user_id: int) -> None:
         """
@@ -157,6 +275,7 @@ class AsyncDB:
         query = "DELETE FROM public.subscriptions WHERE user_id = $1"
         async with self.pool.acquire() as conn:
             await conn.execute(query, user_id)
+        self._invalidate_subscription(user_id)
     
     async def update_subscription_date(self, user_id: int, new_end_date) -> None:
         """
@@ -176,6 +295,41 @@ class AsyncDB:
         """
         async with self.pool.acquire() as conn:
             await conn.execute(query, user_id, new_end_date)
+        self._invalidate_subscription(user_id)
+    
+    def _invalidate_subscription(self, user_id: int) -> None:
+        self._subscription_writes += 1
+        self._subscriptions.pop(user_id)
+    
+    async def get_subscription_status(self, user_id: int) -> dict:
+        """
+        Статус подписки одним запросом (с кэшем в памяти процесса)
+        
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            dict: exists — есть ли запись о подписке, active — не истекла ли,
+                  end_date — дата окончания (datetime) или None
+        """
+        cached = self._subscriptions.get(user_id)
+        if cached is None:
+            writes = self._subscription_writes
+            row = await self._hot("fetchrow", "subscription_status", user_id)
+            if row is None:
+                cached = (None, None)
+            else:
+                cached = (row["subscription_end_date"], time.monotonic() + float(row["remaining"]))
+            # Подписку изменили, пока шел запрос — результат мог устареть
+            if writes == self._subscription_writes:
+                self._subscriptions.set(user_id, cached)
+        
+        end_date, ends_at = cached
+        return {
+            "exists": end_date is not None,
+            "active": ends_at is not None and time.monotonic() < ends_at,
+            "end_date": end_date,
+        }
     
     async def get_subscription_end_date(self, user_id: int):
         """
@@ -187,13 +341,7 @@ class AsyncDB:
         Returns:
             datetime объект или None если подписки нет
         """
-        if self.pool is None:
-            await self.connect()
-        
-        query = "SELECT subscription_end_date FROM public.subscriptions WHERE user_id = $1"
-        async with self.pool.acquire() as conn:
-            result = await conn.fetchval(query, user_id)
-            return result
+        return (await self.get_subscription_status(user_id))["end_date"]
     
     async def is_subscription_active(self, user_id: int) -> bool:
         """
@@ -205,17 +353,86 @@ class AsyncDB:
         Returns:
             True если подписка активна (не истекла)
         """
+        return (await self.get_subscription_status(user_id))["active"]
+    
+    async def get_db_time(self):
+        """Текущее время БД (LOCALTIMESTAMP) — в нем же хранятся даты подписок"""
+        if self.pool is None:
+            await self.connect()
+        
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval("SELECT LOCALTIMESTAMP")
+    
+    async def claim_subscription_notifications(self, kind: str, after: tuple, until, limit: int) -> list:
+        """
+        Следующая страница подписок с окончанием в (after, until], которым еще
+        не отправлено уведомление kind; выбранные сразу отмечаются отправленными
+        (не удалось отправить — release_subscription_notifications)
+        
+        Обход по индексу (subscription_end_date, user_id) с продолжением от
+        последней строки (keyset) — стоимость зависит от числа подписок в окне,
+        а не от числа пользователей. Заблокировавшие бота пропускаются.
+        
+        Args:
+            kind: Вид уведомления (remind_24h, expired, ...)
+            after: (subscription_end_date, user_id) последней строки прошлой страницы
+            until: Верхняя граница даты окончания (включительно)
+            limit: Размер страницы
+            
+        Returns:
+            Список dict(user_id, end_date), отсортированный по (end_date, user_id)
+        """
         if self.pool is None:
             await self.connect()
         
         query = """
-            SELECT subscription_end_date > CURRENT_TIMESTAMP 
-            FROM public.subscriptions 
-            WHERE user_id = $1
+            WITH due AS (
+                SELECT s.user_id, s.subscription_end_date
+                FROM public.subscriptions s
+                WHERE (s.subscription_end_date, s.user_id) > ($1, $2)
+                  AND s.subscription_end_date <= $3
+                  AND NOT EXISTS (
+                      SELECT 1 FROM public.subscription_notifications n
+                      WHERE n.user_id = s.user_id AND n.kind = $4
+                        AND n.end_date = s.subscription_end_date
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM public.users u
+                      WHERE u.user_id = s.user_id AND u.blocked_at IS NOT NULL
+                  )
+                ORDER BY s.subscription_end_date, s.user_id
+                LIMIT $5
+            )
+            INSERT INTO public.subscription_notifications (user_id, kind, end_date)
+            SELECT user_id, $4, subscription_end_date FROM due
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, end_date
         """
         async with self.pool.acquire() as conn:
-            result = await conn.fetchval(query, user_id)
-            return bool(result) if result is not None else False
+            rows = await conn.fetch(query, after[0], after[1], until, kind, limit)
+        return sorted((dict(row) for row in rows), key=lambda r: (r["end_date"], r["user_id"]))
+    
+    async def release_subscription_notifications(self, kind: str, rows: list) -> None:
+        """
+        Снимает отметки claim_subscription_notifications для неотправленных
+        уведомлений — следующий проход попробует отправить их снова
+        
+        Args:
+            kind: Вид уведомления
+            rows: [dict(user_id, end_date)] из claim_subscription_notifications
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            DELETE FROM public.subscription_notifications n
+            USING unnest($2::bigint[], $3::timestamp[]) AS v(user_id, end_date)
+            WHERE n.kind = $1 AND n.user_id = v.user_id AND n.end_date = v.end_date
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                query, kind, [row["user_id"] for row in rows], [row["end_date"] for row in rows]
+            )
     
     async def extend_subscription(self, user_id: int, days: int) -> None:
         """
@@ -245,6 +462,7 @@ class AsyncDB:
         
         async with self.pool.acquire() as conn:
             await conn.execute(query, user_id)
+        self._invalidate_subscription(user_id)
 
     
     async def has_subscription(self, user_id: int) -> bool:
@@ -257,51 +475,135 @@ class AsyncDB:
         Returns:
             True если запись о подписке есть, иначе False
         """
+        return (await self.get_subscription_status(user_id))["exists"]
+    
+    # --- Пакетные операции (импорт, промо-акции) ---
+    
+    @staticmethod
+    async def _copy_to_temp(conn, table: str, columns: str, records: list) -> None:
+        """
+        Временная таблица на время транзакции + COPY строк в нее
+        
+        Args:
+            table: Имя временной таблицы
+            columns: Описание колонок для CREATE TABLE ("user_id BIGINT, ...")
+            records: Строки (кортежи) в порядке колонок
+        """
+        await conn.execute(f"CREATE TEMP TABLE {table} ({columns}) ON COMMIT DROP")
+        names = [col.split()[0] for col in columns.split(",")]
+        await conn.copy_records_to_table(table, records=records, columns=names)
+    
+    async def add_users_bulk(self, users: list) -> dict:
+        """
+        Добавляет пользователей пачкой (существующие не меняются)
+        
+        Args:
+            users: [(user_id, username)]
+            
+        Returns:
+            {user_id: True — добавлен, False — уже был}
+        """
         if self.pool is None:
             await self.connect()
-        query = "SELECT 1 FROM public.subscriptions WHERE user_id = $1 LIMIT 1"
+        
         async with self.pool.acquire() as conn:
-            result = await conn.fetchrow(query, user_id)
-            return bool(result)
-    
+            async with conn.transaction():
+                await self._copy_to_temp(conn, "tmp_users", "user_id BIGINT, username VARCHAR", users)
+                rows = await conn.fetch("""
+                    INSERT INTO public.users (user_id, username, balance)
+                    SELECT DISTINCT ON (user_id) user_id, username, 0
+                    FROM tmp_users
+                    ORDER BY user_id
+                    ON CONFLICT (user_id) DO NOTHING
+                    RETURNING user_id
+                """)
+        inserted = {row["user_id"] for row in rows}
+        return {user_id: user_id in inserted for user_id, _ in users}
     
-    async def is_subscription_active(self, user_id: int) -> bool:
+    async def extend_subscriptions_bulk(self, extensions: list) -> dict:
         """
-        Проверяет, активна ли подписка пользователя (т.е. subscription_end_date > CURRENT_TIMESTAMP)
-
+        Продлевает подписки пачкой (как extend_subscription, одним запросом в одной транзакции)
+        
         Args:
-            user_id: ID пользователя
-
+            extensions: [(user_id, days)]; повторы одного пользователя суммируются
+            
         Returns:
-            True если подписка активна, иначе False
+            {user_id: новая дата окончания}
         """
         if self.pool is None:
             await self.connect()
-        query = """
-            SELECT 1 FROM public.subscriptions
-            WHERE user_id = $1 AND subscription_end_date > CURRENT_TIMESTAMP
-            LIMIT 1
+        
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_temp(conn, "tmp_subscriptions", "user_id BIGINT, days INTEGER", extensions)
+                rows = await conn.fetch("""
+                    INSERT INTO public.subscriptions (user_id, subscription_end_date)
+                    SELECT user_id, CURRENT_TIMESTAMP + make_interval(days => sum(days)::int)
+                    FROM tmp_subscriptions
+                    GROUP BY user_id
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET
+                        -- EXCLUDED - сейчас = суммарный срок продления из файла
+                        subscription_end_date = CASE
+                            WHEN subscriptions.subscription_end_date > CURRENT_TIMESTAMP
+                            THEN subscriptions.subscription_end_date
+                                 + (EXCLUDED.subscription_end_date - CURRENT_TIMESTAMP)
+                            ELSE EXCLUDED.subscription_end_date
+                        END,
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING user_id, subscription_end_date
+                """)
+        for user_id, _ in extensions:
+            self._invalidate_subscription(user_id)
+        return {row["user_id"]: row["subscription_end_date"] for row in rows}
+    
+    async def add_balance_bulk(self, amounts: list) -> dict:
+        """
+        Зачисляет суммы на балансы пачкой (повторы одного пользователя суммируются)
+        
+        Args:
+            amounts: [(user_id, amount)]
+            
+        Returns:
+            {user_id: новый баланс или None, если пользователя нет}
         """
+        if self.pool is None:
+            await self.connect()
+        
         async with self.pool.acquire() as conn:
-            result = await conn.fetchrow(query, user_id)
-            return bool(result)
+            async with conn.transaction():
+                await self._copy_to_temp(conn, "tmp_balances", "user_id BIGINT, amount DOUBLE PRECISION", amounts)
+                rows = await conn.fetch("""
+                    UPDATE public.users u
+                    SET balance = u.balance + t.amount
+                    FROM (
+                        SELECT user_id, sum(amount) AS amount
+                        FROM tmp_balances
+                        GROUP BY user_id
+                    ) t
+                    WHERE u.user_id = t.user_id
+                    RETURNING u.user_id, u.balance
+                """)
+        updated = {row["user_id"]: float(row["balance"]) for row in rows}
+        return {user_id: updated.get(user_id) for user_id, _ in amounts}
     
     # --- Методы для работы со шрифтами ---
     
-    async def add_font(self, file_id: str, file_name: str, file_path: str, added_by: int) -> int:
+    async def add_font(self, file_id: str, file_name: str, file_path: str, added_by: int,
+                       content_hash: Optional[str] = None) -> int:
         """Добавляет шрифт в базу данных"""
         if self.pool is None:
             await self.connect()
         
         query = """
-            INSERT INTO public.fonts (file_id, file_name, file_path, added_by)
-            VALUES ($1, $2, $3, $4)
+            INSERT INTO public.fonts (file_id, file_name, file_path, added_by, content_hash)
+            VALUES ($1, $2, $3, $4, $5)
             ON CONFLICT (file_id) DO UPDATE SET
-                file_name = $2, file_path = $3
+                file_name = $2, file_path = $3, content_hash = $5
             RETURNING id
         """
         async with self.pool.acquire() as conn:
-            font_id = await conn.fetchval(query, file_id, file_name, file_path, added_by)
+            font_id = await conn.fetchval(query, file_id, file_name, file_path, added_by, content_hash)
             return font_id
     
     async def get_all_fonts(self) -> list:
@@ -309,7 +611,7 @@ class AsyncDB:
         if self.pool is None:
             await self.connect()
         
-        query = "SELECT id, file_id, file_name, file_path, created_at FROM public.fonts ORDER BY created_at DESC"
+        query = "SELECT id, file_id, file_name, file_path, content_hash, created_at FROM public.fonts ORDER BY created_at DESC"
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(query)
             return [dict(row) for row in rows]
@@ -335,20 +637,27 @@ class AsyncDB:
     
     # --- Методы для работы с музыкой ---
     
-    async def add_music(self, file_id: str, file_name: str, file_path: str, duration: int, added_by: int) -> int:
-        """Добавляет музыку в базу данных"""
+    async def add_music(self, file_id: str, file_name: str, file_path: str, duration: int, added_by: int,
+                        sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                        loudness_lufs: Optional[float] = None, content_hash: Optional[str] = None) -> int:
+        """Добавляет музыку в базу данных (вместе с параметрами канонического файла)"""
         if self.pool is None:
             await self.connect()
         
         query = """
-            INSERT INTO public.music (file_id, file_name, file_path, duration, added_by)
-            VALUES ($1, $2, $3, $4, $5)
+            INSERT INTO public.music (file_id, file_name, file_path, duration, added_by,
+                                      sample_rate, channels, loudness_lufs, content_hash)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
             ON CONFLICT (file_id) DO UPDATE SET
-                file_name = $2, file_path = $3, duration = $4
+                file_name = $2, file_path = $3, duration = $4,
+                sample_rate = $6, channels = $7, loudness_lufs = $8, content_hash = $9
             RETURNING id
         """
         async with self.pool.acquire() as conn:
-            music_id = await conn.fetchval(query, file_id, file_name, file_path, duration, added_by)
+            music_id = await conn.fetchval(
+                query, file_id, file_name, file_path, duration, added_by,
+                sample_rate, channels, loudness_lufs, content_hash
+            )
             return music_id
     
     async def get_all_music(self) -> list:
@@ -356,7 +665,11 @@ class AsyncDB:
         if self.pool is None:
             await self.connect()
         
-        query = "SELECT id, file_id, file_name, file_path, duration, created_at FROM public.music ORDER BY created_at DESC"
+        query = """
+            SELECT id, file_id, file_name, file_path, duration, sample_rate, channels, loudness_lufs,
+                   content_hash, created_at
+            FROM public.music ORDER BY created_at DESC
+        """
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(query)
             return [dict(row) for row in rows]
@@ -380,15 +693,314 @@ class AsyncDB:
         async with self.pool.acquire() as conn:
             await conn.execute(query, music_id)
     
-    async def get_random_music(self):
-        """Получает случайную музыку"""
+    # --- Ссылки на файлы хранилища медиа ---
+    
+    async def count_content_refs(self, content_hash: str) -> int:
+        """Сколько строк fonts/music ссылаются на файл с этим хешем"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            SELECT (SELECT COUNT(*) FROM public.fonts WHERE content_hash = $1)
+                 + (SELECT COUNT(*) FROM public.music WHERE content_hash = $1)
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, content_hash)
+    
+    async def get_all_content_refs(self) -> list:
+        """Все файлы хранилища, на которые есть ссылки: [(content_hash, file_path), ...]"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            SELECT content_hash, file_path FROM public.fonts WHERE content_hash IS NOT NULL
+            UNION
+            SELECT content_hash, file_path FROM public.music WHERE content_hash IS NOT NULL
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query)
+            return [(row["content_hash"], row["file_path"]) for row in rows]
+    
+    # --- Методы для работы с отпечатками видео ---
+    
+    async def add_video_fingerprint(self, file_unique_id: str, effect: str, fingerprint: bytes, result_file_id: str) -> None:
+        """
+        Сохраняет отпечаток обработанного видео и file_id результата
+        
+        Args:
+            file_unique_id: Уникальный ID исходного файла Telegram
+            effect: Примененный эффект
+            fingerprint: Упакованная последовательность кадровых хешей
+            result_file_id: file_id отправленного результата
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            INSERT INTO public.video_fingerprints (file_unique_id, effect, fingerprint, result_file_id)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (file_unique_id, effect) DO UPDATE SET
+                fingerprint = $3, result_file_id = $4
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, file_unique_id, effect, fingerprint, result_file_id)
+    
+    async def get_all_video_fingerprints(self) -> list:
+        """Получает все отпечатки для построения in-memory индекса"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = "SELECT file_unique_id, effect, fingerprint, result_file_id FROM public.video_fingerprints"
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query)
+            return [dict(row) for row in rows]
+
+    # --- Журнал задач обработки видео ---
+    
+    async def create_video_job(self, user_id: int, chat_id: int, effect: str, source: dict, owner: str) -> int:
+        """
+        Создает запись о задаче обработки видео
+        
+        Args:
+            user_id: ID пользователя
+            chat_id: Чат, куда отправлять результат
+            effect: Выбранный эффект
+            source: Метаданные исходного видео (file_id, file_unique_id, ...)
+            owner: Процесс, который выполняет задачу ("узел:воркер")
+            
+        Returns:
+            ID задачи
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            INSERT INTO public.video_jobs (user_id, chat_id, effect, source, owner, heartbeat_at)
+            VALUES ($1, $2, $3, $4::jsonb, $5, CURRENT_TIMESTAMP)
+            RETURNING id
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, user_id, chat_id, effect, json.dumps(source), owner)
+    
+    async def heartbeat_video_jobs(self, owner: str) -> int:
+        """
+        Продлевает аренду всех активных задач владельца
+        
+        Returns:
+            Сколько задач продлено
+        """
         if self.pool is None:
             await self.connect()
         
-        query = "SELECT * FROM public.music ORDER BY RANDOM() LIMIT 1"
+        query = """
+            UPDATE public.video_jobs
+            SET heartbeat_at = CURRENT_TIMESTAMP
+            WHERE owner = $1 AND status = 'active'
+        """
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(query)
+            result = await conn.execute(query, owner)
+        return int(result.split()[-1])
+    
+    async def update_video_job(self, job_id: int, stage: str, scratch: Optional[dict] = None) -> None:
+        """
+        Фиксирует завершенный этап задачи (и данные для продолжения)
+        
+        Args:
+            job_id: ID задачи
+            stage: Новый этап (downloading, downloaded, encoding, encoded, uploading)
+            scratch: Пути к промежуточным файлам и прочее для продолжения после рестарта
+        """
+        await self._hot("fetchval", "update_video_job", job_id, stage,
+                        json.dumps(scratch) if scratch is not None else None)
+    
+    async def finish_video_job(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        """Закрывает задачу: status = done | failed"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            UPDATE public.video_jobs
+            SET status = $2, stage = $2, error = $3, updated_at = CURRENT_TIMESTAMP
+            WHERE id = $1
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, job_id, status, error)
+    
+    async def claim_unfinished_video_jobs(self, owner: str, lease_sec: int) -> list:
+        """
+        Забирает незавершенные задачи после рестарта (счетчик попыток увеличивается)
+        
+        Свои задачи (тот же "узел:воркер" — прошлый запуск этого процесса)
+        забираются сразу, чужие — только если владелец не продлевал аренду
+        дольше lease_sec: задачи живых процессов не трогаем.
+        
+        Args:
+            owner: Новый владелец ("узел:воркер")
+            lease_sec: Срок аренды
+            
+        Returns:
+            Список задач (dict) с source/scratch в виде dict
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            UPDATE public.video_jobs
+            SET attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP,
+                owner = $1, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE status = 'active'
+              AND (owner = $1 OR owner IS NULL OR heartbeat_at IS NULL
+                   OR heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $2))
+            RETURNING id, user_id, chat_id, effect, source, stage, scratch, attempts
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, owner, lease_sec)
+        jobs = []
+        for row in sorted(rows, key=lambda r: r["id"]):
+            job = dict(row)
+            job["source"] = json.loads(job["source"])
+            job["scratch"] = json.loads(job["scratch"])
+            jobs.append(job)
+        return jobs
+
+    # --- Рассылки ---
+    
+    async def create_broadcast(self, from_chat_id: int, message_id: int, created_by: int,
+                               status_chat_id: int, status_message_id: int) -> dict:
+        """
+        Создает рассылку (сообщение копируется из from_chat_id / message_id)
+        
+        Returns:
+            Запись рассылки (dict); total — число получателей на момент создания
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            INSERT INTO public.broadcasts
+                (from_chat_id, message_id, created_by, status_chat_id, status_message_id, total)
+            VALUES ($1, $2, $3, $4, $5,
+                    (SELECT count(*) FROM public.users WHERE blocked_at IS NULL))
+            RETURNING *
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(query, from_chat_id, message_id, created_by,
+                                      status_chat_id, status_message_id)
+            return dict(row)
+    
+    async def get_broadcast(self, broadcast_id: int) -> Optional[dict]:
+        if self.pool is None:
+            await self.connect()
+        
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM public.broadcasts WHERE id = $1", broadcast_id)
             return dict(row) if row else None
+    
+    async def get_recent_broadcasts(self, limit: int = 5) -> list:
+        if self.pool is None:
+            await self.connect()
+        
+        query = "SELECT * FROM public.broadcasts ORDER BY id DESC LIMIT $1"
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, limit)
+            return [dict(row) for row in rows]
+    
+    async def get_active_broadcasts(self) -> list:
+        """Рассылки, прерванные остановкой бота"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = "SELECT * FROM public.broadcasts WHERE status = 'active' ORDER BY id"
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query)
+            return [dict(row) for row in rows]
+    
+    async def iter_broadcast_recipients(self, broadcast_id: int, after_user_id: int, chunk_size: int):
+        """
+        Получатели рассылки пачками по возрастанию user_id
+        
+        Каждая пачка читается серверным курсором в короткой транзакции и
+        продолжается с последнего user_id (keyset), так что ни таблица целиком,
+        ни долгая транзакция на все время рассылки не нужны. Уже получившие
+        рассылку (после рестарта) и заблокировавшие бота пропускаются.
+        
+        Yields:
+            Список user_id (не больше chunk_size)
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            SELECT u.user_id FROM public.users u
+            WHERE u.user_id > $1
+              AND u.blocked_at IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM public.broadcast_deliveries d
+                  WHERE d.broadcast_id = $2 AND d.user_id = u.user_id
+              )
+            ORDER BY u.user_id
+        """
+        while True:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    cursor = await conn.cursor(query, after_user_id, broadcast_id)
+                    rows = await cursor.fetch(chunk_size)
+            if not rows:
+                return
+            user_ids = [row["user_id"] for row in rows]
+            after_user_id = user_ids[-1]
+            yield user_ids
+            if len(user_ids) < chunk_size:
+                return
+    
+    async def record_broadcast_chunk(self, broadcast_id: int, deliveries: list, last_user_id: int) -> None:
+        """
+        Сохраняет результат пачки: статусы доставки, заблокировавших и позицию рассылки
+        
+        Args:
+            deliveries: [(user_id, status, error)], status = sent | failed | blocked
+            last_user_id: Последний user_id пачки — отсюда продолжится рассылка
+        """
+        if self.pool is None:
+            await self.connect()
+        
+        counts = {"sent": 0, "failed": 0, "blocked": 0}
+        for _, status, _ in deliveries:
+            counts[status] += 1
+        blocked = [user_id for user_id, status, _ in deliveries if status == "blocked"]
+        
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    INSERT INTO public.broadcast_deliveries (broadcast_id, user_id, status, error)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (broadcast_id, user_id) DO NOTHING
+                """, [(broadcast_id, user_id, status, error) for user_id, status, error in deliveries])
+                if blocked:
+                    await conn.execute(
+                        "UPDATE public.users SET blocked_at = CURRENT_TIMESTAMP WHERE user_id = ANY($1::bigint[])",
+                        blocked
+                    )
+                await conn.execute("""
+                    UPDATE public.broadcasts
+                    SET last_user_id = GREATEST(last_user_id, $2),
+                        sent = sent + $3, failed = failed + $4, blocked = blocked + $5,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = $1
+                """, broadcast_id, last_user_id, counts["sent"], counts["failed"], counts["blocked"])
+    
+    async def finish_broadcast(self, broadcast_id: int, status: str) -> None:
+        """Закрывает рассылку: status = done | cancelled | failed"""
+        if self.pool is None:
+            await self.connect()
+        
+        query = """
+            UPDATE public.broadcasts
+            SET status = $2, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = $1 AND status = 'active'
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, broadcast_id, status)
 
 # ↓↓↓ создаём один общий экземпляр и берём параметры из ENV
 DBNAME = os.getenv("POSTGRES_DB", "botUnik")
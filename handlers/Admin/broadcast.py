@@ -0,0 +1,156 @@
+from aiogram import Router, types, F, Bot
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.context import FSMContext
+
+from database.user import db
+from handlers.Admin.states import BroadcastStates
+from config import ADMIN_ID
+from services.broadcast import (
+    broadcaster, BroadcastProgress, STATUS_TITLES, format_progress, progress_kb,
+)
+
+router = Router()
+
+
+def broadcast_menu_kb():
+    """Клавиатура раздела рассылок"""
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="➕ Новая рассылка", callback_data="new_broadcast")
+        ],
+        [
+            InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_broadcast")
+        ],
+        [
+            InlineKeyboardButton(text=" ⬅️ Назад", callback_data="admin_panel")
+        ]
+    ])
+    return kb
+
+
+def _progress_for(row: dict) -> BroadcastProgress:
+    """Живые счетчики, если рассылка идет в этом процессе, иначе — из БД"""
+    progress = broadcaster.progress(row["id"])
+    if progress is not None and row["status"] == "active":
+        return progress
+    return BroadcastProgress(
+        row["id"], row["total"], sent=row["sent"], failed=row["failed"],
+        blocked=row["blocked"], status=row["status"],
+    )
+
+
+@router.callback_query(F.data == "admin_broadcast")
+async def admin_broadcast_cb(callback: types.CallbackQuery, state: FSMContext):
+    """Раздел рассылок: последние рассылки и их ход"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    await state.clear()
+    broadcasts = await db.get_recent_broadcasts(5)
+
+    text = "📢 <b>Рассылка</b>\n\n"
+    if not broadcasts:
+        text += "Рассылок еще не было."
+    for row in broadcasts:
+        progress = _progress_for(row)
+        text += (
+            f"#{row['id']} от {row['created_at'].strftime('%d.%m.%Y %H:%M')} — "
+            f"{STATUS_TITLES.get(progress.status, progress.status)}\n"
+            f"   📊 {progress.done} / {max(progress.total, progress.done)}, "
+            f"✅ {progress.sent}, 🚫 {progress.blocked}, ❌ {progress.failed}"
+        )
+        if progress.status == "active" and progress.rate > 0:
+            text += f", ⚡ {progress.rate:.1f}/с"
+        text += "\n\n"
+
+    try:
+        await callback.message.edit_text(text, reply_markup=broadcast_menu_kb())
+    except Exception:
+        # Нажали «Обновить», а ничего не изменилось
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data == "new_broadcast")
+async def new_broadcast_cb(callback: types.CallbackQuery, state: FSMContext):
+    """Начало новой рассылки"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        "📢 <b>Новая рассылка</b>\n\n"
+        "Отправьте сообщение для рассылки — текст, фото, видео или файл.\n"
+        "Оно будет скопировано всем пользователям как есть.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_broadcast")]
+        ])
+    )
+    await state.set_state(BroadcastStates.waiting_for_message)
+    await callback.answer()
+
+
+@router.message(BroadcastStates.waiting_for_message)
+async def process_broadcast_message(message: types.Message, state: FSMContext):
+    """Сообщение для рассылки получено — показываем превью и просим подтверждение"""
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    await state.update_data(from_chat_id=message.chat.id, message_id=message.message_id)
+    await state.set_state(BroadcastStates.confirm)
+
+    await message.answer("👆 <b>Так сообщение увидят пользователи</b>")
+    await message.copy_to(message.chat.id)
+    await message.answer(
+        "Отправить всем пользователям?",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Отправить всем", callback_data="broadcast_confirm")],
+            [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_broadcast")]
+        ])
+    )
+
+
+@router.callback_query(BroadcastStates.confirm, F.data == "broadcast_confirm")
+async def broadcast_confirm_cb(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
+    """Запуск рассылки"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    data = await state.get_data()
+    await state.clear()
+
+    try:
+        # Это сообщение и будет показывать ход рассылки
+        status_msg = await callback.message.edit_text("📢 <b>Рассылка запускается...</b>")
+        broadcast = await db.create_broadcast(
+            data["from_chat_id"], data["message_id"], callback.from_user.id,
+            status_msg.chat.id, status_msg.message_id
+        )
+        broadcaster.start(bot, broadcast)
+
+        progress = broadcaster.progress(broadcast["id"])
+        await status_msg.edit_text(format_progress(progress), reply_markup=progress_kb(progress))
+        await callback.answer("✅ Рассылка запущена")
+
+    except Exception as e:
+        print(f"❌ Ошибка запуска рассылки: {e}")
+        await callback.answer(f"❌ Ошибка: {e}", show_alert=True)
+
+
+@router.callback_query(F.data.startswith("broadcast_cancel_"))
+async def broadcast_cancel_cb(callback: types.CallbackQuery, bot: Bot):
+    """Остановка рассылки"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    broadcast_id = int(callback.data.split("_")[-1])
+
+    try:
+        await broadcaster.cancel(bot, broadcast_id)
+        await callback.answer(f"⏹ Рассылка #{broadcast_id} остановлена", show_alert=True)
+    except Exception as e:
+        print(f"❌ Ошибка остановки рассылки: {e}")
+        await callback.answer(f"❌ Ошибка: {e}", show_alert=True)
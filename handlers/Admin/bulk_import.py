@@ -0,0 +1,211 @@
+from aiogram import Router, types, F, Bot
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
+from aiogram.fsm.context import FSMContext
+import csv
+import html
+import io
+from collections import defaultdict
+
+from database.user import db
+from handlers.Admin.states import BulkImportStates
+from config import ADMIN_ID
+
+router = Router()
+
+# Операция -> (название, формат строк CSV)
+BULK_OPERATIONS = {
+    "users": ("👥 Добавить пользователей", "user_id[,username]"),
+    "subscriptions": ("📅 Продлить подписки", "user_id,days"),
+    "balance": ("💰 Пополнить балансы", "user_id,amount"),
+}
+
+MAX_CSV_BYTES = 20 * 1024 * 1024  # Больше бот все равно не скачает
+
+
+def bulk_menu_kb():
+    """Клавиатура выбора пакетной операции"""
+    buttons = [
+        [InlineKeyboardButton(text=title, callback_data=f"bulk_{op}")]
+        for op, (title, _) in BULK_OPERATIONS.items()
+    ]
+    buttons.append([InlineKeyboardButton(text=" ⬅️ Назад", callback_data="admin_panel")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def _parse_csv(data: bytes, op: str) -> tuple:
+    """
+    Разбирает CSV: первая строка может быть заголовком
+
+    Returns:
+        (строки для операции, список ошибок "строка N: ...")
+    """
+    rows, errors = [], []
+    text = data.decode("utf-8-sig", errors="replace")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        # Одна колонка (только user_id) — разделитель не угадать
+        dialect = csv.excel
+    for line_no, row in enumerate(csv.reader(io.StringIO(text), dialect), 1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        try:
+            user_id = int(cells[0])
+        except ValueError:
+            if line_no == 1:
+                continue  # Заголовок
+            errors.append(f"строка {line_no}: неверный user_id {html.escape(cells[0][:30])}")
+            continue
+        try:
+            if op == "users":
+                rows.append((user_id, cells[1] if len(cells) > 1 and cells[1] else None))
+                continue
+            value = int(cells[1]) if op == "subscriptions" else float(cells[1].replace(",", "."))
+        except (IndexError, ValueError):
+            errors.append(f"строка {line_no}: ожидается {BULK_OPERATIONS[op][1]}")
+            continue
+        # Ноль и минус сократили бы подписку или списали бы баланс
+        if not 0 < value < float("inf"):
+            errors.append(f"строка {line_no}: значение должно быть больше нуля")
+            continue
+        rows.append((user_id, value))
+    return rows, errors
+
+
+async def _run_bulk(op: str, rows: list) -> list:
+    """
+    Выполняет операцию пачкой
+
+    Returns:
+        [(user_id, статус, значение)] для итогового CSV
+    """
+    if op == "users":
+        result = await db.add_users_bulk(rows)
+        return [(user_id, "added" if added else "exists", "") for user_id, added in result.items()]
+
+    if op == "subscriptions":
+        # Весь файл одним запросом: либо применен целиком, либо не применен вовсе
+        end_dates = await db.extend_subscriptions_bulk(rows)
+        return [
+            (user_id, "extended", end_dates[user_id].strftime("%Y-%m-%d %H:%M"))
+            for user_id in dict.fromkeys(user_id for user_id, _ in rows)
+        ]
+
+    balances = await db.add_balance_bulk(rows)
+    return [
+        (user_id, "credited" if balance is not None else "no_user", balance if balance is not None else "")
+        for user_id, balance in balances.items()
+    ]
+
+
+@router.callback_query(F.data == "admin_bulk")
+async def admin_bulk_cb(callback: types.CallbackQuery, state: FSMContext):
+    """Меню пакетного импорта"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    await state.clear()
+    await callback.message.edit_text(
+        "📥 <b>Импорт из CSV</b>\n\n"
+        "Операция выполняется для всего файла за несколько запросов к БД.\n"
+        "Выберите действие:",
+        reply_markup=bulk_menu_kb()
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("bulk_"))
+async def bulk_operation_cb(callback: types.CallbackQuery, state: FSMContext):
+    """Выбор операции — ждем CSV"""
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+
+    op = callback.data.replace("bulk_", "")
+    if op not in BULK_OPERATIONS:
+        await callback.answer("❌ Неизвестная операция", show_alert=True)
+        return
+
+    title, row_format = BULK_OPERATIONS[op]
+    await callback.message.edit_text(
+        f"{title}\n\n"
+        "Отправьте CSV-файл, по строке на пользователя:\n"
+        f"<code>{row_format}</code>\n\n"
+        "Заголовок в первой строке допускается.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_bulk")]
+        ])
+    )
+    await state.set_state(BulkImportStates.waiting_for_csv)
+    await state.update_data(op=op)
+    await callback.answer()
+
+
+@router.message(BulkImportStates.waiting_for_csv, F.document)
+async def process_bulk_csv(message: types.Message, state: FSMContext, bot: Bot):
+    """Обработка загруженного CSV"""
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    op = (await state.get_data()).get("op")
+    back_kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=" ⬅️ Назад", callback_data="admin_bulk")]
+    ])
+
+    if op not in BULK_OPERATIONS:
+        await state.clear()
+        return
+    if message.document.file_size and message.document.file_size > MAX_CSV_BYTES:
+        await message.answer("❌ Файл слишком большой (максимум 20 МБ)", reply_markup=back_kb)
+        return
+
+    try:
+        buffer = await bot.download(message.document, destination=io.BytesIO())
+        rows, errors = _parse_csv(buffer.getvalue(), op)
+        if not rows:
+            await message.answer(
+                "❌ В файле нет строк для обработки\n\n" + "\n".join(errors[:10]),
+                reply_markup=back_kb
+            )
+            return
+
+        results = await _run_bulk(op, rows)
+        await state.clear()
+
+        # Результат по каждой строке — файлом
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["user_id", "status", "value"])
+        writer.writerows(results)
+        statuses = defaultdict(int)
+        for _, status, _ in results:
+            statuses[status] += 1
+
+        summary = "\n".join(f"• {status}: {count}" for status, count in statuses.items())
+        if errors:
+            summary += f"\n\n⚠️ Пропущено строк с ошибками: {len(errors)}\n" + "\n".join(errors[:10])
+        await message.answer_document(
+            BufferedInputFile(out.getvalue().encode("utf-8"), filename=f"bulk_{op}_result.csv"),
+            caption=f"✅ <b>{BULK_OPERATIONS[op][0]}: готово</b>\n\n"
+                    f"Строк обработано: {len(rows)}\n{summary}"[:1024],
+            reply_markup=back_kb
+        )
+
+    except Exception as e:
+        print(f"❌ Ошибка пакетного импорта: {e}")
+        # Каждая операция — одна транзакция: при ошибке файл не применен ни для кого
+        await message.answer(f"❌ Ошибка: {e}\n\nИзменения из файла не применены.", reply_markup=back_kb)
+        await state.clear()
+
+
+@router.message(BulkImportStates.waiting_for_csv)
+async def invalid_bulk_file(message: types.Message):
+    """Прислали не файл"""
+    await message.answer(
+        "❌ Отправьте CSV-файл документом.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_bulk")]
+        ])
+    )
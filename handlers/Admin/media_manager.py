@@ -2,15 +2,30 @@ from aiogram import Router, types, F, Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 import os
+import tempfile
 from pathlib import Path
 
 from database.user import db
 from handlers.Admin.states import MediaManagementStates
 from config import ADMIN_ID
+from services.music_library import ingest_track, MUSIC_EXT
+from services.media_store import media_store
+from services.media_catalog import media_catalog
 
 router = Router()
 
 
+async def _release_media_file(row: dict) -> None:
+    """Удаляет файл шрифта/музыки после удаления строки из БД"""
+    file_path = row.get('file_path')
+    if row.get('content_hash'):
+        # Файл из хранилища может быть общим — удаляем, только если ссылок не осталось
+        refs = await db.count_content_refs(row['content_hash'])
+        await media_store.release(row['content_hash'], Path(file_path or "").suffix, refs)
+    elif file_path and os.path.exists(file_path):
+        os.remove(file_path)
+
+
 def admin_main_kb():
     """Главная клавиатура админки"""
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -20,6 +35,12 @@ def admin_main_kb():
         [
             InlineKeyboardButton(text="🎵 Управление музыкой", callback_data="admin_music")
         ],
+        [
+            InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")
+        ],
+        [
+            InlineKeyboardButton(text="📥 Импорт из CSV", callback_data="admin_bulk")
+        ],
         [
             InlineKeyboardButton(text=" ⬅️ Назад", callback_data="backstart")
         ]
@@ -83,7 +104,7 @@ async def admin_fonts_cb(callback: types.CallbackQuery):
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    fonts_count = len(await db.get_all_fonts())
+    fonts_count = media_catalog.count("fonts")
     
     await callback.message.edit_text(
         f"🔤 <b>Управление шрифтами</b>\n\n"
@@ -104,7 +125,7 @@ async def add_font_cb(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         "🔤 <b>Добавление шрифта</b>\n\n"
         "Отправьте файл шрифта (.ttf, .otf)\n\n"
-        "⚠️ Файл будет сохранен в папке `fonts/`",
+        "⚠️ Файл будет сохранен в хранилище медиа",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_fonts")]
         ])
@@ -130,22 +151,22 @@ async def process_font_upload(message: types.Message, state: FSMContext, bot: Bo
         return
     
     try:
-        # Создаем папку для шрифтов
-        fonts_dir = Path("fonts")
-        fonts_dir.mkdir(exist_ok=True)
-        
-        # Скачиваем файл
+        # Скачиваем файл прямо в хранилище (хеш считается во время загрузки)
         file = await bot.get_file(document.file_id)
-        file_path = fonts_dir / document.file_name
-        await bot.download_file(file.file_path, file_path)
+        suffix = Path(document.file_name).suffix
+        content_hash, file_path = await media_store.put_from_telegram(bot, file.file_path, suffix)
+        await media_store.publish(content_hash, suffix)
         
         # Сохраняем в БД
         font_id = await db.add_font(
             file_id=document.file_id,
             file_name=document.file_name,
-            file_path=str(file_path),
-            added_by=message.from_user.id
+            file_path=file_path,
+            added_by=message.from_user.id,
+            content_hash=content_hash
         )
+        # Сразу в каталог этого процесса, не дожидаясь уведомления
+        await media_catalog.refresh("fonts", font_id)
         
         await message.answer(
             f"✅ <b>Шрифт успешно добавлен!</b>\n\n"
@@ -177,7 +198,7 @@ async def list_fonts_cb(callback: types.CallbackQuery):
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    fonts = await db.get_all_fonts()
+    fonts = media_catalog.all("fonts")
     
     if not fonts:
         await callback.message.edit_text(
@@ -222,15 +243,13 @@ async def delete_font_cb(callback: types.CallbackQuery):
     
     try:
         # Получаем информацию о шрифте
-        font = await db.get_font_by_id(font_id)
+        font = media_catalog.get("fonts", font_id)
         
         if font:
-            # Удаляем файл
-            if font.get('file_path') and os.path.exists(font['file_path']):
-                os.remove(font['file_path'])
-            
-            # Удаляем из БД
+            # Удаляем из БД, затем файл (если на него больше никто не ссылается)
             await db.delete_font(font_id)
+            media_catalog.remove("fonts", font_id)
+            await _release_media_file(font)
             
             await callback.answer(f"✅ Шрифт {font['file_name']} удален", show_alert=True)
         else:
@@ -253,7 +272,7 @@ async def admin_music_cb(callback: types.CallbackQuery):
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    music_count = len(await db.get_all_music())
+    music_count = media_catalog.count("music")
     
     await callback.message.edit_text(
         f"🎵 <b>Управление музыкой</b>\n\n"
@@ -274,7 +293,7 @@ async def add_music_cb(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         "🎵 <b>Добавление музыки</b>\n\n"
         "Отправьте аудио файл (.mp3, .wav, .m4a)\n\n"
-        "⚠️ Файл будет сохранен в папке `music/`",
+        "⚠️ Файл будет сохранен в хранилище медиа",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_music")]
         ])
@@ -283,38 +302,63 @@ async def add_music_cb(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+def _temp_path(suffix: str) -> str:
+    """Пустой временный файл (mkstemp — без гонки за имя, в отличие от mktemp)"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+
 @router.message(MediaManagementStates.waiting_for_music, F.audio)
 async def process_music_upload(message: types.Message, state: FSMContext, bot: Bot):
     """Обработка загруженной музыки"""
     audio = message.audio
     
+    raw_path = None
+    track_path = None
+    
     try:
-        # Создаем папку для музыки
-        music_dir = Path("music")
-        music_dir.mkdir(exist_ok=True)
-        
         # Формируем имя файла
         file_name = audio.file_name or f"music_{audio.file_id[:8]}.mp3"
         
-        # Скачиваем файл
+        # Скачиваем исходный файл во временный
         file = await bot.get_file(audio.file_id)
-        file_path = music_dir / file_name
-        await bot.download_file(file.file_path, file_path)
+        raw_path = _temp_path(Path(file_name).suffix or ".mp3")
+        await bot.download_file(file.file_path, raw_path)
+        
+        progress_msg = await message.answer("⏳ Нормализуем громкость и формат трека...")
+        
+        # Один раз переводим в канонический формат и меряем громкость
+        track_path = _temp_path(MUSIC_EXT)
+        track = await ingest_track(raw_path, track_path)
+        await progress_msg.delete()
+        if track is None:
+            raise Exception("не удалось перекодировать трек")
+        
+        # Канонический файл — в хранилище по хешу содержимого
+        content_hash, file_path = media_store.put_file(track_path)
+        await media_store.publish(content_hash, MUSIC_EXT)
         
         # Сохраняем в БД
         music_id = await db.add_music(
             file_id=audio.file_id,
             file_name=file_name,
-            file_path=str(file_path),
-            duration=audio.duration or 0,
-            added_by=message.from_user.id
+            file_path=file_path,
+            duration=track["duration"] or audio.duration or 0,
+            added_by=message.from_user.id,
+            sample_rate=track["sample_rate"],
+            channels=track["channels"],
+            loudness_lufs=track["loudness_lufs"],
+            content_hash=content_hash
         )
+        await media_catalog.refresh("music", music_id)
         
         await message.answer(
             f"✅ <b>Музыка успешно добавлена!</b>\n\n"
             f"📁 Имя файла: {file_name}\n"
             f"📂 Путь: {file_path}\n"
-            f"⏱ Длительность: {audio.duration}с\n"
+            f"⏱ Длительность: {track['duration']}с\n"
+            f"🔊 Громкость: {track['loudness_lufs']:.1f} LUFS\n"
             f"🆔 ID в БД: {music_id}",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="➕ Добавить еще", callback_data="add_music")],
@@ -332,6 +376,11 @@ async def process_music_upload(message: types.Message, state: FSMContext, bot: B
             ])
         )
         await state.clear()
+    
+    finally:
+        for path in (raw_path, track_path):
+            if path and os.path.exists(path):
+                os.remove(path)
 
 
 @router.callback_query(F.data == "list_music")
@@ -341,7 +390,7 @@ async def list_music_cb(callback: types.CallbackQuery):
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    music_list = await db.get_all_music()
+    music_list = media_catalog.all("music")
     
     if not music_list:
         await callback.message.edit_text(
@@ -389,15 +438,13 @@ async def delete_music_cb(callback: types.CallbackQuery):
     
     try:
         # Получаем информацию о музыке
-        music = await db.get_music_by_id(music_id)
+        music = media_catalog.get("music", music_id)
         
         if music:
-            # Удаляем файл
-            if music.get('file_path') and os.path.exists(music['file_path']):
-                os.remove(music['file_path'])
-            
-            # Удаляем из БД
+            # Удаляем из БД, затем файл (если на него больше никто не ссылается)
             await db.delete_music(music_id)
+            media_catalog.remove("music", music_id)
+            await _release_media_file(music)
             
             await callback.answer(f"✅ Музыка {music['file_name']} удалена", show_alert=True)
         else:
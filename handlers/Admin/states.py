@@ -6,3 +6,14 @@ class MediaManagementStates(StatesGroup):
     waiting_for_font = State()  # Ожидание загрузки шрифта
     waiting_for_music = State()  # Ожидание загрузки музыки
 
+
+
+class BroadcastStates(StatesGroup):
+    """Состояния для рассылки"""
+    waiting_for_message = State()  # Ожидание сообщения для рассылки
+    confirm = State()  # Подтверждение рассылки
+
+
+class BulkImportStates(StatesGroup):
+    """Состояния для пакетного импорта из CSV"""
+    waiting_for_csv = State()  # Ожидание CSV-файла
@@ -1,7 +1,4 @@
-import aiohttp
-import asyncio
-
-from aiogram import Router, types, F, Bot
+from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
@@ -11,200 +8,11 @@ from datetime import datetime, timedelta
 from database.user import db
 from keyboards.kb_user import profile_reply_kb, main_reply_kb
 from handlers.User.states import PaymentStates
-from config import CRYPTO_BOT_TOKEN
+from services.cryptobot import create_crypto_invoice
+from services.invoices import invoice_scheduler
 
 router = Router()
 
-# Словарь для отслеживания активных задач проверки
-active_invoice_tasks = {}
-
-
-async def create_crypto_invoice(amount: float, user_id: int) -> dict:
-    """
-    Создает инвойс в CryptoBot API
-    
-    Args:
-        amount: Сумма в USD
-        user_id: ID пользователя Telegram
-        
-    Returns:
-        dict с данными инвойса или None при ошибке
-    """
-    url = "https://pay.crypt.bot/api/createInvoice"
-    headers = {
-        "Crypto-Pay-API-Token": CRYPTO_BOT_TOKEN,
-        "Content-Type": "application/json"
-    }
-    
-    # Параметры инвойса
-    payload = {
-        "asset": "USDT",  # Можно изменить на другую криптовалюту
-        "amount": str(amount),
-        "description": f"Пополнение баланса для пользователя {user_id}",
-        "paid_btn_name": "callback",  # Кнопка после оплаты
-        "paid_btn_url": f"https://t.me/YOUR_BOT_USERNAME",  # Замените на username вашего бота
-        "payload": str(user_id)  # Для идентификации пользователя при webhook
-    }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("ok"):
-                        return data.get("result")
-                return None
-    except Exception as e:
-        print(f"Ошибка при создании инвойса: {e}")
-        return None
-
-
-async def check_invoice_status(invoice_id: int) -> dict:
-    """
-    Проверяет статус инвойса в CryptoBot API
-    
-    Args:
-        invoice_id: ID инвойса для проверки
-        
-    Returns:
-        dict с данными инвойса или None при ошибке
-        Статусы: active, paid, expired
-    """
-    url = "https://pay.crypt.bot/api/getInvoices"
-    headers = {
-        "Crypto-Pay-API-Token": CRYPTO_BOT_TOKEN,
-        "Content-Type": "application/json"
-    }
-    
-    # Параметры для получения конкретного инвойса
-    params = {
-        "invoice_ids": str(invoice_id)
-    }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("ok") and data.get("result", {}).get("items"):
-                        # Возвращаем первый (и единственный) инвойс
-                        return data["result"]["items"][0]
-                return None
-    except Exception as e:
-        print(f"Ошибка при проверке статуса инвойса: {e}")
-        return None
-
-
-async def auto_check_invoice(bot: Bot, user_id: int, invoice_id: int, amount: float, asset: str):
-    """
-    Автоматически проверяет статус инвойса в фоне
-    
-    Args:
-        bot: Экземпляр бота для отправки сообщений
-        user_id: ID пользователя
-        invoice_id: ID инвойса
-        amount: Сумма платежа
-        asset: Криптовалюта
-    """
-    timeout = 300  # 5 минут = 300 секунд
-    check_interval = 10  # Проверять каждые 10 секунд
-    elapsed_time = 0
-    
-    try:
-        while elapsed_time < timeout:
-            await asyncio.sleep(check_interval)
-            elapsed_time += check_interval
-            
-            # Проверяем статус инвойса
-            invoice_data = await check_invoice_status(invoice_id)
-            
-            if not invoice_data:
-                continue
-            
-            status = invoice_data.get("status")
-            
-            if status == "paid":
-                # Проверяем, не был ли инвойс уже обработан
-                if await db.is_invoice_processed(invoice_id):
-                    # Уже обработан, завершаем задачу
-                    break
-                
-                try:
-                    # Помечаем инвойс как обработанный
-                    await db.mark_invoice_processed(invoice_id, user_id, amount, asset)
-                    
-                    # Зачисляем баланс
-                    new_balance = await db.add_balance(user_id, amount)
-                    
-                    # Отправляем уведомление пользователю
-                    await bot.send_message(
-                        user_id,
-                        "✅ <b>Платеж успешно получен!</b>\n\n"
-                        f"💰 Зачислено: {amount} {asset}\n"
-                        f"💳 Новый баланс: {new_balance} $\n\n"
-                        f"🆔 ID инвойса: <code>{invoice_id}</code>\n\n"
-                        "Спасибо за пополнение! 🎉",
-                        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                            [InlineKeyboardButton(text="🚹 Профиль", callback_data="profile")]
-                        ])
-                    )
-                    print(f"✅ Инвойс {invoice_id} оплачен и обработан для пользователя {user_id}")
-                except Exception as e:
-                    print(f"❌ Ошибка при обработке оплаченного инвойса {invoice_id}: {e}")
-                    await bot.send_message(
-                        user_id,
-                        "⚠️ <b>Платеж получен, но возникла ошибка</b>\n\n"
-                        "Обратитесь в поддержку для зачисления средств.\n\n"
-                        f"🆔 ID инвойса: <code>{invoice_id}</code>",
-                        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                            [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
-                        ])
-                    )
-                
-                # Платеж обработан, завершаем задачу
-                break
-                
-            elif status == "expired":
-                # Инвойс истек
-                await bot.send_message(
-                    user_id,
-                    "⌛ <b>Время оплаты истекло</b>\n\n"
-                    f"Инвойс на сумму {amount} {asset} был отменен.\n"
-                    f"🆔 ID инвойса: <code>{invoice_id}</code>\n\n"
-                    "Создайте новый инвойс для пополнения баланса.",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="💰 Пополнить снова", callback_data="cryptobotadd")]
-                    ])
-                )
-                print(f"⌛ Инвойс {invoice_id} истек для пользователя {user_id}")
-                break
-        
-        # Если прошло 5 минут и платеж не получен
-        if elapsed_time >= timeout:
-            invoice_data = await check_invoice_status(invoice_id)
-            if invoice_data and invoice_data.get("status") == "active":
-                await bot.send_message(
-                    user_id,
-                    "❌ <b>Заказ отменен</b>\n\n"
-                    f"Время ожидания оплаты истекло (5 минут).\n"
-                    f"Инвойс на сумму {amount} {asset} отменен.\n\n"
-                    f"🆔 ID инвойса: <code>{invoice_id}</code>\n\n"
-                    "Вы можете создать новый инвойс для пополнения.",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="💰 Пополнить снова", callback_data="cryptobotadd")]
-                    ])
-                )
-                print(f"❌ Инвойс {invoice_id} отменен по таймауту для пользователя {user_id}")
-                
-    except asyncio.CancelledError:
-        print(f"🔄 Задача проверки инвойса {invoice_id} была отменена")
-    except Exception as e:
-        print(f"❌ Ошибка в фоновой проверке инвойса {invoice_id}: {e}")
-    finally:
-        # Удаляем задачу из активных
-        if invoice_id in active_invoice_tasks:
-            del active_invoice_tasks[invoice_id]
-
 
 @router.callback_query(F.data == "profile")
 async def profile_cb(callback: types.CallbackQuery):
@@ -329,14 +137,8 @@ async def process_payment_amount(message: types.Message, state: FSMContext):
                 reply_markup=kb
             )
             
-            # Получаем экземпляр бота из сообщения
-            bot = message.bot
-            
-            # Запускаем фоновую задачу проверки инвойса
-            task = asyncio.create_task(
-                auto_check_invoice(bot, message.from_user.id, invoice_id, amount, asset)
-            )
-            active_invoice_tasks[invoice_id] = task
+            # Ставим инвойс на общую фоновую проверку
+            invoice_scheduler.add(invoice_id, message.from_user.id, amount, asset)
             
             print(f"🔄 Запущена автоматическая проверка инвойса {invoice_id} для пользователя {message.from_user.id}")
             
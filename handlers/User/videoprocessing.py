@@ -1,18 +1,30 @@
 from aiogram import Router, types, F, Bot
 from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, InputMediaVideo
 from aiogram.fsm.context import FSMContext
+import asyncio
 import os
-import subprocess
-import tempfile
 from datetime import datetime
 from pathlib import Path
-from PIL import Image, ImageDraw
+from PIL import Image
 
-from config import ADMIN_ID
+from config import ADMIN_ID, VIDEO_JOBS_DIR, VIDEO_JOB_MAX_ATTEMPTS, VIDEO_JOB_LEASE_SEC, INSTANCE_ID
 from database.user import db
 from keyboards.kb_user import main_reply_kb, video_effects_kb
 from handlers.User.states import VideoProcessingStates
+from services import filtergraph
+from services.encoder_pool import encoder_pool
+from services.admission import admission, estimate_cost, format_wait
+from services.album_buffer import album_buffer
+from services.media_cache import media_cache
+from services.encoder_profiles import encoder_profiles, EncoderProfile, DEFAULT_PROFILE
+from services.text_overlay import render_caption
+from services.music_library import (
+    has_audio_stream, MUSIC_BED_GAIN_DB, MUSIC_BITRATE, MUSIC_SAMPLE_RATE, MUSIC_TARGET_LUFS
+)
+from services.fingerprint import compute_fingerprint, fingerprint_index, pack_fingerprint
+from services.send_queue import send_queue, PRIORITY_RESULT, PRIORITY_PROGRESS
+from services.storage import storage
 
 router = Router()
 
@@ -21,19 +33,20 @@ class VideoProcessor:
     """Обработчик видео для Telegram бота"""
     
     @staticmethod
-    async def normalize_video(input_path: str, output_path: str) -> bool:
+    async def normalize_video(input_path: str, output_path: str,
+                             profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
         """Нормализация видео 16:9 → 9:16"""
         try:
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
-                '-c:v', 'libx264', '-crf', '23', '-preset', 'medium', '-pix_fmt', 'yuv420p',
+                '-vf', filtergraph.normalize_chain(),
+                *profile.args(),
                 '-c:a', 'copy',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
@@ -41,7 +54,8 @@ class VideoProcessor:
             return False
     
     @staticmethod
-    async def apply_ultra_unique(input_path: str, output_path: str) -> bool:
+    async def apply_ultra_unique(input_path: str, output_path: str,
+                                profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
         """Применить Ultra Unique"""
         try:
             brightness = 1.05  # +5%
@@ -50,18 +64,20 @@ class VideoProcessor:
             brightness_value = (brightness - 1.0) * 0.5
             speed_value = speed
             
+            # Один граф: сначала уменьшаем до холста 1080x1920, потом eq и setpts
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-vf', f'eq=brightness={brightness_value}',
-                '-filter_complex', f'[0:v]setpts=PTS/{speed_value}[v];[0:a]atempo={speed_value}[a]',
+                '-filter_complex',
+                f'[0:v]{filtergraph.ultra_unique_chain(brightness_value, speed_value)}[v];'
+                f'[0:a]atempo={speed_value}[a]',
                 '-map', '[v]', '-map', '[a]',
-                '-c:v', 'libx264', '-crf', '23', '-preset', 'medium', '-pix_fmt', 'yuv420p',
+                *profile.args(),
                 '-c:a', 'aac',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
@@ -69,51 +85,24 @@ class VideoProcessor:
             return False
     
     @staticmethod
-    async def apply_trending_frame(input_path: str, output_path: str) -> bool:
+    async def apply_trending_frame(input_path: str, output_path: str,
+                                  profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
         """Применить Trending Frame с округлением"""
         try:
-            # Параметры
-            total_w, total_h = 1080, 1920
-            frame_w, frame_h = 1000, 1380
-            top_offset = 165
-            side_margin = 40
-            corner_radius = 50
-            
-            # Создаем маску
-            mask_path = tempfile.mktemp(suffix='.png')
-            mask_img = Image.new("RGBA", (frame_w, frame_h), (0, 0, 0, 255))
-            draw = ImageDraw.Draw(mask_img)
-            draw.rounded_rectangle((0, 0, frame_w, frame_h), radius=corner_radius, fill=(0, 0, 0, 0))
-            mask_img.save(mask_path)
-            
-            # FFmpeg команда
-            fc = (
-                f"[0:v]scale={frame_w}:{frame_h}:force_original_aspect_ratio=increase,crop={frame_w}:{frame_h},format=rgba[sv];"
-                f"[1:v][sv]scale2ref=w=iw:h=ih[mask][sv2];"
-                f"[sv2][mask]overlay=0:0:format=auto[rounded];"
-                f"[rounded]pad={total_w}:{total_h}:{side_margin}:{top_offset}:black,format=yuv420p[v]"
-            )
-            
+            # Угловая плашка создается один раз и переиспользуется
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-i', mask_path,
-                '-filter_complex', fc,
+                '-i', filtergraph.corner_mask_path(),
+                '-filter_complex', filtergraph.trending_frame_graph('0:v', '1:v', 'v'),
                 '-map', '[v]',
                 '-map', '0:a?',
-                '-c:v', 'libx264', '-crf', '23', '-preset', 'medium', '-pix_fmt', 'yuv420p',
+                *profile.args(),
                 '-c:a', 'copy',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            
-            # Удаляем временную маску
-            try:
-                os.unlink(mask_path)
-            except:
-                pass
-            
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
@@ -121,36 +110,37 @@ class VideoProcessor:
             return False
     
     @staticmethod
-    async def apply_subscribe_bait(input_path: str, output_path: str) -> bool:
+    def _subscribe_image() -> str:
+        """Путь к картинке подписки, уже уменьшенной под оверлей"""
+        subscribe_image_path = Path(__file__).parent.parent.parent / "images" / "1.jpg"
+        
+        # Если картинки нет, создаем простую
+        if not subscribe_image_path.exists():
+            subscribe_image_path.parent.mkdir(parents=True, exist_ok=True)
+            img = Image.new('RGB', (400, 100), color=(255, 0, 0))
+            # Просто красный прямоугольник без текста (текст требует шрифт)
+            img.save(subscribe_image_path)
+        
+        return filtergraph.bait_image_path(subscribe_image_path)
+    
+    @staticmethod
+    async def apply_subscribe_bait(input_path: str, output_path: str,
+                                  profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
         """Применить Subscribe Bait"""
         try:
-            # Путь к картинке (создаем простую картинку если нет)
-            subscribe_image_path = Path(__file__).parent.parent.parent / "images" / "1.jpg"
-            
-            # Если картинки нет, создаем простую
-            if not subscribe_image_path.exists():
-                subscribe_image_path.parent.mkdir(parents=True, exist_ok=True)
-                img = Image.new('RGB', (400, 100), color=(255, 0, 0))
-                draw = ImageDraw.Draw(img)
-                # Просто красный прямоугольник без текста (текст требует шрифт)
-                img.save(subscribe_image_path)
-            
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-i', str(subscribe_image_path),
-                '-filter_complex',
-                '[0:v]scale=1080:1920[video];'
-                '[1:v]scale=200:50[subscribe_img];'
-                '[video][subscribe_img]overlay=(W-w)/2:H-h-250:format=auto[final]',
+                '-i', VideoProcessor._subscribe_image(),
+                '-filter_complex', filtergraph.subscribe_bait_graph('0:v', '1:v', 'final'),
                 '-map', '[final]',
                 '-map', '0:a?',
-                '-c:v', 'libx264', '-crf', '23', '-preset', 'medium', '-pix_fmt', 'yuv420p',
+                *profile.args(),
                 '-c:a', 'copy',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
@@ -158,44 +148,98 @@ class VideoProcessor:
             return False
     
     @staticmethod
-    async def apply_subtitles(input_path: str, output_path: str, text: str, font_path: str) -> bool:
-        """Применить субтитры с выбранным шрифтом"""
+    async def apply_all(input_path: str, output_path: str,
+                       profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
+        """Все эффекты одним проходом ffmpeg вместо трёх перекодирований"""
         try:
-            # Экранируем спецсимволы в тексте
-            text = text.replace("'", "'\\\\\\''").replace(":", "\\:")
-            font_path = font_path.replace("\\", "/").replace(":", "\\:")
+            brightness = 1.05  # +5%
+            speed = 1.03  # +3%
+            
+            brightness_value = (brightness - 1.0) * 0.5
             
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-vf', f"drawtext=fontfile='{font_path}':text='{text}':fontsize=60:fontcolor=white:x=(w-text_w)/2:y=h-150:box=1:boxcolor=black@0.5:boxborderw=10",
-                '-c:v', 'libx264', '-crf', '23', '-preset', 'medium', '-pix_fmt', 'yuv420p',
-                '-c:a', 'copy',
+                '-i', filtergraph.corner_mask_path(),
+                '-i', VideoProcessor._subscribe_image(),
+                '-filter_complex', filtergraph.all_effects_graph(brightness_value, speed),
+                '-map', '[v]', '-map', '[a]',
+                *profile.args(),
+                '-c:a', 'aac',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
-            print(f"❌ Ошибка Subtitles: {e}")
+            print(f"❌ Ошибка всех эффектов: {e}")
             return False
     
     @staticmethod
-    async def apply_music(input_path: str, output_path: str, music_path: str) -> bool:
-        """Добавить фоновую музыку"""
+    async def apply_subtitles(input_path: str, output_path: str, text: str, font_path: str,
+                              profile: EncoderProfile = DEFAULT_PROFILE) -> bool:
+        """Применить субтитры с выбранным шрифтом"""
         try:
+            # Подпись растеризуется один раз (и кэшируется), дальше — дешевый overlay
+            caption_path = await asyncio.to_thread(render_caption, text, font_path, 60)
+            
             cmd = [
                 'ffmpeg', '-y',
                 '-i', input_path,
-                '-i', music_path,
-                '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=first:dropout_transition=2',
-                '-c:v', 'copy',
-                '-c:a', 'aac',
+                '-i', caption_path,
+                '-filter_complex', '[0:v][1:v]overlay=(W-w)/2:H-h-140:format=yuv420[v]',
+                '-map', '[v]',
+                '-map', '0:a?',
+                *profile.args(),
+                '-c:a', 'copy',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = await encoder_pool.run(cmd, timeout=600)
+            return result.returncode == 0
+                
+        except Exception as e:
+            print(f"❌ Ошибка Subtitles: {e}")
+            return False
+    
+    @staticmethod
+    async def apply_music(input_path: str, output_path: str, music_path: str,
+                          loudness_lufs: float = None) -> bool:
+        """Добавить фоновую музыку (трек уже в каноническом формате библиотеки)"""
+        try:
+            if await has_audio_stream(input_path):
+                # Подкладываем музыку под исходный звук; видео не перекодируем
+                gain = MUSIC_BED_GAIN_DB
+                if loudness_lufs is not None:
+                    gain += MUSIC_TARGET_LUFS - loudness_lufs
+                cmd = [
+                    'ffmpeg', '-y',
+                    '-i', input_path,
+                    '-stream_loop', '-1', '-i', music_path,
+                    '-filter_complex',
+                    f'[0:a]aresample={MUSIC_SAMPLE_RATE},aformat=channel_layouts=stereo[va];'
+                    f'[1:a]volume={gain:.2f}dB[ma];'
+                    '[va][ma]amix=inputs=2:duration=first:dropout_transition=2:normalize=0[a]',
+                    '-map', '0:v', '-map', '[a]',
+                    '-c:v', 'copy',
+                    '-c:a', 'aac', '-b:a', MUSIC_BITRATE,
+                    output_path
+                ]
+            else:
+                # Видео без звука: amix не нужен, трек уже AAC — копируем как есть
+                cmd = [
+                    'ffmpeg', '-y',
+                    '-i', input_path,
+                    '-stream_loop', '-1', '-i', music_path,
+                    '-map', '0:v', '-map', '1:a',
+                    '-c:v', 'copy',
+                    '-c:a', 'copy',
+                    '-shortest',
+                    output_path
+                ]
+            
+            result = await encoder_pool.run(cmd, timeout=600)
             return result.returncode == 0
                 
         except Exception as e:
@@ -220,8 +264,9 @@ async def videoprcess_cb(callback: types.CallbackQuery):
             )
             return
         
-        # Проверка подписки
-        if not await db.has_subscription(user_id):
+        # Проверка подписки — один запрос (обычно из кэша)
+        subscription = await db.get_subscription_status(user_id)
+        if not subscription["exists"]:
             await callback.message.answer(
                 "🚫 <b>У вас нет подписки</b>\n\n"
                 "Для обработки видео необходима активная подписка.\n"
@@ -233,7 +278,7 @@ async def videoprcess_cb(callback: types.CallbackQuery):
             )
             return
         
-        if not await db.is_subscription_active(user_id):
+        if not subscription["active"]:
             await callback.message.answer(
                 "⌛ <b>Ваша подписка истекла</b>\n\n"
                 "Пожалуйста, продлите подписку для обработки видео.",
@@ -245,10 +290,9 @@ async def videoprcess_cb(callback: types.CallbackQuery):
             return
         
         # Подписка активна - показываем меню эффектов
-        end_date = await db.get_subscription_end_date(user_id)
         await callback.message.answer(
             f"✅ <b>Подписка активна</b>\n"
-            f"📅 Действует до: {end_date.strftime('%d.%m.%Y %H:%M')}\n\n"
+            f"📅 Действует до: {subscription['end_date'].strftime('%d.%m.%Y %H:%M')}\n\n"
             "🎬 Выберите эффект для обработки видео:",
             reply_markup=video_effects_kb()
         )
@@ -272,7 +316,7 @@ async def select_effect_cb(callback: types.CallbackQuery, state: FSMContext):
     # ВРЕМЕННО ОТКЛЮЧЕНО - ждем правильный код от пользователя
     # # Если выбраны субтитры - предлагаем выбрать шрифт
     # if effect == "subtitles":
-    #     fonts = await db.get_all_fonts()
+    #     fonts = media_catalog.all("fonts")
     #     
     #     if not fonts:
     #         await callback.message.answer(
@@ -309,7 +353,7 @@ async def select_effect_cb(callback: types.CallbackQuery, state: FSMContext):
     # 
     # # Если выбрана музыка - предлагаем выбрать трек
     # if effect == "music":
-    #     music_list = await db.get_all_music()
+    #     music_list = media_catalog.all("music")
     #     
     #     if not music_list:
     #         await callback.message.answer(
@@ -362,7 +406,8 @@ async def select_effect_cb(callback: types.CallbackQuery, state: FSMContext):
     
     await callback.message.answer(
         f"✅ Выбран эффект: <b>{effect_names.get(effect, effect)}</b>\n\n"
-        "📹 Отправьте видео для обработки\n\n"
+        "📹 Отправьте видео для обработки\n"
+        "📎 Можно отправить альбом — до 10 видео за раз\n\n"
         "⚠️ Максимальный размер: 50 МБ\n"
         "⏱ Обработка может занять несколько минут",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -392,7 +437,7 @@ async def cancel_video_cb(callback: types.CallbackQuery, state: FSMContext):
 #     font_id = int(callback.data.split("_")[-1])
 #     
 #     # Получаем информацию о шрифте
-#     font = await db.get_font_by_id(font_id)
+#     font = media_catalog.get("fonts", font_id)
 #     
 #     if not font:
 #         await callback.answer("❌ Шрифт не найден", show_alert=True)
@@ -445,10 +490,10 @@ async def cancel_video_cb(callback: types.CallbackQuery, state: FSMContext):
 #     
 #     # Если выбрана случайная музыка
 #     if music_id_str == "random":
-#         music = await db.get_random_music()
+#         music = media_catalog.random("music")
 #     else:
 #         music_id = int(music_id_str)
-#         music = await db.get_music_by_id(music_id)
+#         music = media_catalog.get("music", music_id)
 #     
 #     if not music:
 #         await callback.answer("❌ Музыка не найдена", show_alert=True)
@@ -458,7 +503,8 @@ async def cancel_video_cb(callback: types.CallbackQuery, state: FSMContext):
 #     await state.update_data(
 #         music_id=music['id'],
 #         music_path=music['file_path'],
-#         music_name=music['file_name']
+#         music_name=music['file_name'],
+#         music_loudness=music.get('loudness_lufs')
 #     )
 #     
 #     # Просим отправить видео
@@ -479,153 +525,733 @@ async def cancel_video_cb(callback: types.CallbackQuery, state: FSMContext):
 #     await callback.answer()
 
 
-@router.message(VideoProcessingStates.waiting_for_video, F.video)
-async def process_video_handler(message: types.Message, state: FSMContext, bot: Bot):
-    """Обработка загруженного видео"""
-    user_data = await state.get_data()
-    effect = user_data.get("effect")
+def _result_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎬 Обработать еще", callback_data="videoprcess")],
+        [InlineKeyboardButton(text=" ⬅️ Главное меню", callback_data="backstart")]
+    ])
+
+
+async def _send_cached_result(message: types.Message, state: FSMContext, result_file_id: str,
+                              effect: str, source: dict) -> None:
+    """Отправляет ранее обработанный результат и предлагает обработать заново"""
+    await send_queue.answer_video(
+        message,
+        video=result_file_id,
+        caption="♻️ <b>Это видео уже обрабатывалось</b>\n\n"
+               f"Эффект: {effect}\n"
+               "Отправляем готовый результат без повторной обработки.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Обработать заново", callback_data="reprocess_fresh")],
+            [InlineKeyboardButton(text="🎬 Обработать еще", callback_data="videoprcess")],
+            [InlineKeyboardButton(text=" ⬅️ Главное меню", callback_data="backstart")]
+        ])
+    )
+    # Оставляем данные об исходнике, чтобы можно было обработать заново
+    await state.set_state(None)
+    await state.update_data(cached_source=source)
+
+
+async def _normalized_input(processor: VideoProcessor, source: dict, input_path: str, temp_dir: str) -> str:
+    """Нормализованный 1080x1920 файл: из кэша или нормализуем и кладем в кэш"""
+    unique_id = source["file_unique_id"]
+    cached = media_cache.get_into(unique_id, "normalized", temp_dir)
+    if cached:
+        return cached
     
-    # Проверка размера файла
-    if message.video.file_size > 50 * 1024 * 1024:  # 50 МБ
-        await message.answer(
-            "❌ <b>Файл слишком большой</b>\n\n"
-            "Максимальный размер: 50 МБ\n"
-            "Попробуйте загрузить меньшее видео."
+    output_path = os.path.join(temp_dir, 'normalized.mp4')
+    profile = encoder_profiles.get("normalize", source.get("width"), source.get("height"))
+    if not await processor.normalize_video(input_path, output_path, profile):
+        raise Exception("Ошибка нормализации")
+    media_cache.put(unique_id, "normalized", output_path)
+    return output_path
+
+
+async def _remember_result(source: dict, effect: str, fingerprint, result_file_id: str) -> None:
+    """Сохраняет отпечаток исходника и file_id результата для повторных загрузок"""
+    if not fingerprint:
+        return
+    try:
+        await db.add_video_fingerprint(
+            source["file_unique_id"], effect, pack_fingerprint(fingerprint), result_file_id
         )
+        fingerprint_index.add(source["file_unique_id"], effect, fingerprint, result_file_id)
+    except Exception as e:
+        print(f"❌ Ошибка сохранения отпечатка: {e}")
+
+
+def _video_source(video: types.Video) -> dict:
+    """Метаданные видео, достаточные для допуска и обработки"""
+    return {
+        "file_id": video.file_id,
+        "file_unique_id": video.file_unique_id,
+        "duration": video.duration,
+        "width": video.width,
+        "height": video.height,
+        "file_size": video.file_size,
+    }
+
+
+async def _fetch_input(bot: Bot, source: dict, temp_dir: str) -> str:
+    """Исходное видео: из кэша (та же загрузка уже обрабатывалась) или скачиваем"""
+    unique_id = source["file_unique_id"]
+    input_path = media_cache.get_into(unique_id, "original", temp_dir)
+    if input_path is None:
+        # Скачиваем видео
+        file = await bot.get_file(source["file_id"])
+        input_path = os.path.join(temp_dir, f"input{Path(file.file_path).suffix}")
+        await bot.download_file(file.file_path, input_path)
+        media_cache.put(unique_id, "original", input_path)
+    return input_path
+
+
+async def _apply_effect(processor: VideoProcessor, effect: str, source: dict,
+                        current_file: str, temp_dir: str) -> str:
+    """
+    Применяет эффект к файлу
+    
+    Returns:
+        Путь к результату внутри temp_dir
+    """
+    # Настройки кодирования, подобранные scripts/encoder_autotune.py
+    profile = encoder_profiles.get(effect, source.get("width"), source.get("height"))
+    
+    # Применяем эффекты последовательно
+    if effect == "normalize":
+        current_file = await _normalized_input(processor, source, current_file, temp_dir)
+        
+    elif effect == "ultra_unique":
+        output_path = os.path.join(temp_dir, 'result.mp4')
+        if not await processor.apply_ultra_unique(current_file, output_path, profile):
+            raise Exception("Ошибка Ultra Unique")
+        current_file = output_path
+        
+    elif effect == "trending_frame":
+        output_path = os.path.join(temp_dir, 'result.mp4')
+        if not await processor.apply_trending_frame(current_file, output_path, profile):
+            raise Exception("Ошибка Trending Frame")
+        current_file = output_path
+        
+    elif effect == "subscribe_bait":
+        # Subscribe Bait сам вписывает кадр в холст 1080x1920 — отдельный энкод
+        # нормализации не нужен; готовый нормализованный файл из кэша берем, если есть
+        current_file = media_cache.get_into(source["file_unique_id"], "normalized", temp_dir) or current_file
+        output_path = os.path.join(temp_dir, 'result.mp4')
+        if not await processor.apply_subscribe_bait(current_file, output_path, profile):
+            raise Exception("Ошибка Subscribe Bait")
+        current_file = output_path
+    
+    # ВРЕМЕННО ОТКЛЮЧЕНО - ждем правильный код от пользователя
+    # elif effect == "subtitles":
+    #     # Применяем субтитры с выбранным шрифтом
+    #     subtitle_text = user_data.get("subtitle_text")
+    #     font_path = user_data.get("font_path")
+    #     
+    #     if not subtitle_text or not font_path:
+    #         raise Exception("Не указан текст субтитров или шрифт")
+    #     
+    #     output_path = os.path.join(temp_dir, 'result.mp4')
+    #     if not await processor.apply_subtitles(current_file, output_path, subtitle_text, font_path, profile):
+    #         raise Exception("Ошибка Subtitles")
+    #     current_file = output_path
+    # 
+    # elif effect == "music":
+    #     # Применяем музыку
+    #     music_path = user_data.get("music_path")
+    #     
+    #     if not music_path:
+    #         raise Exception("Не указана музыка")
+    #     
+    #     output_path = os.path.join(temp_dir, 'result.mp4')
+    #     if not await processor.apply_music(current_file, output_path, music_path, user_data.get("music_loudness")):
+    #         raise Exception("Ошибка Music")
+    #     current_file = output_path
+        
+    elif effect == "all":
+        # Все эффекты одним графом: без промежуточных файлов и перекодирований
+        output_path = os.path.join(temp_dir, 'result.mp4')
+        if not await processor.apply_all(current_file, output_path, profile):
+            raise Exception("Ошибка всех эффектов")
+        current_file = output_path
+    
+    return current_file
+
+
+# ==================== ЖУРНАЛ ЗАДАЧ ====================
+
+# Этапы задачи: queued → downloading → downloaded → encoding → encoded → uploading → done | failed.
+# Этап и пути к промежуточным файлам пишутся в public.video_jobs, рабочая папка задачи
+# лежит в VIDEO_JOBS_DIR/<id> — после рестарта задача продолжается с последнего этапа.
+_DOWNLOADED_STAGES = ("downloaded", "encoding", "encoded", "uploading")
+_ENCODED_STAGES = ("encoded", "uploading")
+
+# Владелец задач этого процесса: "узел:воркер" — одинаковый у прошлого и
+# нового запуска, поэтому свои прерванные задачи забираем без ожидания аренды
+_job_owner = f"{INSTANCE_ID}:0"
+
+
+def set_job_owner(worker_index: int) -> None:
+    global _job_owner
+    _job_owner = f"{INSTANCE_ID}:{worker_index}"
+
+
+def _job_dir(job_id: int) -> str:
+    return os.path.join(VIDEO_JOBS_DIR, str(job_id))
+
+
+def _cleanup_job(job_id: int) -> None:
+    """Удаляет рабочую папку завершенной задачи"""
+    import shutil
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+
+def _result_key(job_id: int) -> str:
+    """Ключ готового результата в общем хранилище"""
+    return f"jobs/{job_id}/result.mp4"
+
+
+async def _publish_result(job_id: int, result_path: str) -> None:
+    """
+    Кладет результат в общее хранилище (только удаленное, S3): задачу, чей
+    узел умер между энкодом и отправкой, другой узел продолжит без энкода
+    """
+    if not storage.remote:
         return
+    try:
+        await storage.put_file(_result_key(job_id), result_path)
+    except Exception as e:
+        # Не критично: при продолжении на другом узле просто перекодируем
+        print(f"❌ Ошибка сохранения результата задачи {job_id} в хранилище: {e}")
+
+
+async def _fetch_result(job_id: int, result_path: str) -> bool:
+    """Забирает результат, закодированный на другом узле"""
+    if not storage.remote:
+        return False
+    try:
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+        return await storage.get_file(_result_key(job_id), result_path)
+    except Exception as e:
+        print(f"❌ Ошибка загрузки результата задачи {job_id} из хранилища: {e}")
+        return False
+
+
+async def _drop_result(job_id: int) -> None:
+    if not storage.remote:
+        return
+    try:
+        await storage.delete(_result_key(job_id))
+    except Exception as e:
+        print(f"❌ Ошибка удаления результата задачи {job_id} из хранилища: {e}")
+
+
+async def _start_job(user_id: int, chat_id: int, source: dict, effect: str) -> dict:
+    """Создает задачу в журнале"""
+    job_id = await db.create_video_job(user_id, chat_id, effect, source, _job_owner)
+    return {
+        "id": job_id, "user_id": user_id, "chat_id": chat_id, "effect": effect,
+        "source": source, "stage": "queued", "scratch": {},
+    }
+
+
+async def _run_job(bot: Bot, job: dict, use_cache: bool = True, on_downloaded=None) -> dict:
+    """
+    Выполняет этапы задачи, пропуская уже завершенные (если их файлы на месте)
+    
+    Args:
+        bot: Экземпляр бота
+        job: Задача из журнала
+        use_cache: Искать ли готовый результат для похожего видео
+        on_downloaded: Корутина-колбэк после скачивания (для статуса в чате)
+    
+    Returns:
+        {"media": file_id, "cached": True} — готовый результат похожего видео
+        {"media": путь, "cached": False, "fingerprint": ...} — новый результат
+    """
+    job_id, source, effect = job["id"], job["source"], job["effect"]
+    scratch = dict(job.get("scratch") or {})
+    stage = job.get("stage", "queued")
+    work_dir = _job_dir(job_id)
+    os.makedirs(work_dir, exist_ok=True)
+    
+    # Результат уже готов (здесь или, если узел сменился, в общем хранилище) —
+    # исходник не нужен
+    fingerprint = tuple(scratch["fingerprint"]) if scratch.get("fingerprint") else None
+    result_path = scratch.get("result_path")
+    if stage in _ENCODED_STAGES and result_path and (
+        os.path.exists(result_path) or await _fetch_result(job_id, result_path)
+    ):
+        return {"media": result_path, "cached": False, "fingerprint": fingerprint}
     
-    # Отправляем сообщение о начале обработки
-    processing_msg = await message.answer(
-        "⏳ <b>Обработка началась...</b>\n\n"
-        "Пожалуйста, подождите. Это может занять несколько минут."
+    input_path = scratch.get("input_path")
+    if stage not in _DOWNLOADED_STAGES or not input_path or not os.path.exists(input_path):
+        await db.update_video_job(job_id, "downloading")
+        input_path = await _fetch_input(bot, source, work_dir)
+        scratch["input_path"] = input_path
+        await db.update_video_job(job_id, "downloaded", scratch)
+        stage = "downloaded"
+    
+    # Ищем почти идентичное видео (перезалив / реэкспорт того же клипа)
+    if fingerprint is None:
+        fingerprint = await compute_fingerprint(input_path, source.get("duration"))
+    if use_cache and fingerprint:
+        similar = fingerprint_index.find_similar(fingerprint, effect)
+        if similar:
+            return {"media": similar.result_file_id, "cached": True}
+    
+    if on_downloaded:
+        await on_downloaded()
+    
+    await db.update_video_job(job_id, "encoding")
+    result_path = await _apply_effect(VideoProcessor(), effect, source, input_path, work_dir)
+    scratch["result_path"] = result_path
+    scratch["fingerprint"] = list(fingerprint) if fingerprint else None
+    await _publish_result(job_id, result_path)
+    await db.update_video_job(job_id, "encoded", scratch)
+    return {"media": result_path, "cached": False, "fingerprint": fingerprint}
+
+
+async def _fail_job(job, error: Exception) -> None:
+    """Помечает задачу проваленной и удаляет ее файлы"""
+    if job is None:
+        return
+    try:
+        await db.finish_video_job(job["id"], "failed", str(error))
+    except Exception as e:
+        print(f"❌ Ошибка записи в журнал задач: {e}")
+    _cleanup_job(job["id"])
+    await _drop_result(job["id"])
+
+
+async def _finish_job(job: dict) -> None:
+    await db.finish_video_job(job["id"], "done")
+    _cleanup_job(job["id"])
+    await _drop_result(job["id"])
+
+
+async def _process_video(message: types.Message, state: FSMContext, bot: Bot, user_id: int,
+                         source: dict, effect: str, use_cache: bool = True) -> None:
+    """
+    Скачивает, обрабатывает и отправляет видео
+    
+    Args:
+        message: Сообщение, в чат которого отвечаем
+        state: FSM контекст пользователя
+        bot: Экземпляр бота
+        user_id: ID пользователя (для бюджета допуска)
+        source: file_id / file_unique_id / метаданные исходного видео
+        effect: Выбранный эффект
+        use_cache: Искать ли готовый результат для такого же видео
+    """
+    # Тот же файл Telegram уже обрабатывался этим эффектом — даже не скачиваем
+    if use_cache:
+        cached_file_id = fingerprint_index.lookup_exact(source["file_unique_id"], effect)
+        if cached_file_id:
+            await _send_cached_result(message, state, cached_file_id, effect, source)
+            return
+    
+    # Допуск по оценке стоимости — до скачивания, только по метаданным
+    cost = estimate_cost(
+        effect, source.get("duration"), source.get("width"), source.get("height"), source.get("file_size")
     )
+    decision = admission.reserve(user_id, cost)
+    if decision.rejected:
+        reasons = {
+            "too_expensive": "Видео слишком длинное или тяжелое для обработки.\n"
+                             "Попробуйте обрезать его или уменьшить разрешение.",
+            "user_budget": "У вас уже есть видео в обработке.\n"
+                           "Дождитесь результата и отправьте следующее.",
+            "global_budget": "Сейчас очередь переполнена.\n"
+                             f"Попробуйте через {format_wait(decision.wait_sec)}.",
+        }
+        await message.answer(
+            "🚫 <b>Не удается принять видео</b>\n\n" + reasons[decision.reason],
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_video")]
+            ])
+        )
+        return
     
-    temp_dir = None
+    processing_msg = None
+    job = None
     
+    # Билет уже в очереди допуска: все, что может упасть, — внутри try,
+    # иначе неосвобожденный билет навсегда задержит очередь
     try:
-        # Создаем временную директорию
-        temp_dir = tempfile.mkdtemp()
+        # Отправляем сообщение о начале обработки
+        if decision.status == "defer":
+            processing_msg = await send_queue.answer(
+                message,
+                "🕒 <b>Видео в очереди</b>\n\n"
+                f"Ожидание: {format_wait(decision.wait_sec)}\n"
+                f"Обработка: {format_wait(cost)}"
+            )
+        else:
+            processing_msg = await send_queue.answer(
+                message,
+                "⏳ <b>Обработка началась...</b>\n\n"
+                f"Примерное время: {format_wait(cost)}"
+            )
         
-        # Скачиваем видео
-        file = await bot.get_file(message.video.file_id)
-        input_path = os.path.join(temp_dir, f"input{Path(file.file_path).suffix}")
-        await bot.download_file(file.file_path, input_path)
+        job = await _start_job(user_id, message.chat.id, source, effect)
         
-        await processing_msg.edit_text(
-            "⏳ <b>Видео загружено</b>\n\n"
-            f"Применяем эффект: {effect}..."
-        )
+        await admission.acquire(decision.ticket)
+        if decision.status == "defer":
+            await send_queue.edit_text(
+                processing_msg,
+                "⏳ <b>Обработка началась...</b>\n\n"
+                f"Примерное время: {format_wait(cost)}"
+            )
         
-        # Обрабатываем видео
-        current_file = input_path
-        processor = VideoProcessor()
+        async def on_downloaded():
+            await send_queue.edit_text(
+                processing_msg,
+                "⏳ <b>Видео загружено</b>\n\n"
+                f"Применяем эффект: {effect}..."
+            )
         
-        # Применяем эффекты последовательно
-        if effect == "normalize":
-            output_path = os.path.join(temp_dir, 'result.mp4')
-            if not await processor.normalize_video(current_file, output_path):
-                raise Exception("Ошибка нормализации")
-            current_file = output_path
-            
-        elif effect == "ultra_unique":
-            output_path = os.path.join(temp_dir, 'result.mp4')
-            if not await processor.apply_ultra_unique(current_file, output_path):
-                raise Exception("Ошибка Ultra Unique")
-            current_file = output_path
-            
-        elif effect == "trending_frame":
-            output_path = os.path.join(temp_dir, 'result.mp4')
-            if not await processor.apply_trending_frame(current_file, output_path):
-                raise Exception("Ошибка Trending Frame")
-            current_file = output_path
-            
-        elif effect == "subscribe_bait":
-            output_path = os.path.join(temp_dir, 'result.mp4')
-            if not await processor.apply_subscribe_bait(current_file, output_path):
-                raise Exception("Ошибка Subscribe Bait")
-            current_file = output_path
-        
-        # ВРЕМЕННО ОТКЛЮЧЕНО - ждем правильный код от пользователя
-        # elif effect == "subtitles":
-        #     # Применяем субтитры с выбранным шрифтом
-        #     subtitle_text = user_data.get("subtitle_text")
-        #     font_path = user_data.get("font_path")
-        #     
-        #     if not subtitle_text or not font_path:
-        #         raise Exception("Не указан текст субтитров или шрифт")
-        #     
-        #     output_path = os.path.join(temp_dir, 'result.mp4')
-        #     if not await processor.apply_subtitles(current_file, output_path, subtitle_text, font_path):
-        #         raise Exception("Ошибка Subtitles")
-        #     current_file = output_path
-        # 
-        # elif effect == "music":
-        #     # Применяем музыку
-        #     music_path = user_data.get("music_path")
-        #     
-        #     if not music_path:
-        #         raise Exception("Не указана музыка")
-        #     
-        #     output_path = os.path.join(temp_dir, 'result.mp4')
-        #     if not await processor.apply_music(current_file, output_path, music_path):
-        #         raise Exception("Ошибка Music")
-        #     current_file = output_path
-            
-        elif effect == "all":
-            # Применяем все эффекты последовательно
-            temp_ultra = os.path.join(temp_dir, 'ultra.mp4')
-            if not await processor.apply_ultra_unique(current_file, temp_ultra):
-                raise Exception("Ошибка Ultra Unique")
-            
-            temp_trending = os.path.join(temp_dir, 'trending.mp4')
-            if not await processor.apply_trending_frame(temp_ultra, temp_trending):
-                raise Exception("Ошибка Trending Frame")
-            
-            output_path = os.path.join(temp_dir, 'result.mp4')
-            if not await processor.apply_subscribe_bait(temp_trending, output_path):
-                raise Exception("Ошибка Subscribe Bait")
-            
-            current_file = output_path
+        outcome = await _run_job(bot, job, use_cache, on_downloaded)
+        
+        if outcome["cached"]:
+            await processing_msg.delete()
+            await _send_cached_result(message, state, outcome["media"], effect, source)
+            await _finish_job(job)
+            return
         
         # Отправляем результат
-        await processing_msg.edit_text(
+        await send_queue.edit_text(
+            processing_msg,
             "📤 <b>Отправляем результат...</b>"
         )
+        await db.update_video_job(job["id"], "uploading")
         
-        video_file = FSInputFile(current_file)
-        await message.answer_video(
+        video_file = FSInputFile(outcome["media"])
+        sent = await send_queue.answer_video(
+            message,
             video=video_file,
             caption="✅ <b>Обработка завершена!</b>\n\n"
                    f"Эффект: {effect}",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🎬 Обработать еще", callback_data="videoprcess")],
-                [InlineKeyboardButton(text=" ⬅️ Главное меню", callback_data="backstart")]
-            ])
+            reply_markup=_result_kb()
         )
         
+        # Запоминаем результат для повторных загрузок того же клипа
+        if sent.video:
+            await _remember_result(source, effect, outcome["fingerprint"], sent.video.file_id)
+        
+        await _finish_job(job)
         await processing_msg.delete()
         await state.clear()
         
     except Exception as e:
         print(f"❌ Ошибка обработки видео: {e}")
-        await processing_msg.edit_text(
-            "❌ <b>Ошибка при обработке видео</b>\n\n"
-            "Попробуйте еще раз или обратитесь в поддержку.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="videoprcess")],
-                [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
-            ])
+        await _fail_job(job, e)
+        if processing_msg:
+            await send_queue.edit_text(
+                processing_msg,
+                "❌ <b>Ошибка при обработке видео</b>\n\n"
+                "Попробуйте еще раз или обратитесь в поддержку.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="videoprcess")],
+                    [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
+                ]),
+                priority=PRIORITY_RESULT
+            )
+        await state.clear()
+        
+    finally:
+        # Рабочая папка не удаляется здесь: при остановке бота посреди обработки
+        # задача остается в журнале и продолжится после рестарта
+        await admission.release(decision.ticket)
+
+
+async def _resume_job(bot: Bot, job: dict) -> None:
+    """Продолжает одну прерванную задачу и отправляет результат в чат"""
+    chat_id, source, effect = job["chat_id"], job["source"], job["effect"]
+    
+    if job["attempts"] > VIDEO_JOB_MAX_ATTEMPTS:
+        await _fail_job(job, Exception("Превышено число перезапусков"))
+        try:
+            await send_queue.send_message(
+                bot, chat_id,
+                "❌ <b>Не удалось обработать видео</b>\n\n"
+                "Обработка прерывалась несколько раз. Отправьте видео еще раз.",
+                reply_markup=_result_kb()
+            )
+        except Exception as e:
+            print(f"❌ Ошибка уведомления о задаче {job['id']}: {e}")
+        return
+    
+    cost = estimate_cost(
+        effect, source.get("duration"), source.get("width"), source.get("height"), source.get("file_size")
+    )
+    decision = admission.reserve(job["user_id"], cost)
+    if decision.rejected:
+        await _fail_job(job, Exception(f"Отклонено при перезапуске: {decision.reason}"))
+        try:
+            await send_queue.send_message(
+                bot, chat_id,
+                "❌ <b>Бот был перезапущен</b>\n\n"
+                "Сейчас очередь переполнена — отправьте видео еще раз позже.",
+                reply_markup=_result_kb()
+            )
+        except Exception as e:
+            print(f"❌ Ошибка уведомления о задаче {job['id']}: {e}")
+        return
+    
+    processing_msg = None
+    try:
+        processing_msg = await send_queue.send_message(
+            bot, chat_id,
+            "🔄 <b>Бот был перезапущен</b>\n\n"
+            f"Продолжаем обработку вашего видео ({effect})...",
+            priority=PRIORITY_PROGRESS
+        )
+        await admission.acquire(decision.ticket)
+        
+        outcome = await _run_job(bot, job)
+        
+        if not outcome["cached"]:
+            await db.update_video_job(job["id"], "uploading")
+        sent = await send_queue.send_video(
+            bot, chat_id,
+            video=outcome["media"] if outcome["cached"] else FSInputFile(outcome["media"]),
+            caption="✅ <b>Обработка завершена!</b>\n\n"
+                   f"Эффект: {effect}",
+            reply_markup=_result_kb()
         )
+        if not outcome["cached"] and sent.video:
+            await _remember_result(source, effect, outcome["fingerprint"], sent.video.file_id)
+        
+        await _finish_job(job)
+        await processing_msg.delete()
+        
+    except Exception as e:
+        print(f"❌ Ошибка продолжения задачи {job['id']}: {e}")
+        await _fail_job(job, e)
+        if processing_msg:
+            await send_queue.edit_text(
+                processing_msg,
+                "❌ <b>Ошибка при обработке видео</b>\n\n"
+                "Попробуйте еще раз или обратитесь в поддержку.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="videoprcess")],
+                    [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
+                ]),
+                priority=PRIORITY_RESULT
+            )
+        
+    finally:
+        await admission.release(decision.ticket)
+
+
+async def resume_video_jobs(bot: Bot) -> None:
+    """
+    Продолжает задачи, прерванные остановкой бота (вызывается при старте).
+    Видео из альбомов продолжаются и отправляются по отдельности.
+    """
+    try:
+        jobs = await db.claim_unfinished_video_jobs(_job_owner, VIDEO_JOB_LEASE_SEC)
+    except Exception as e:
+        print(f"❌ Ошибка чтения журнала задач: {e}")
+        return
+    
+    if jobs:
+        print(f"🔄 Продолжаем прерванные задачи: {len(jobs)}")
+    await asyncio.gather(*[_resume_job(bot, job) for job in jobs], return_exceptions=True)
+
+
+async def heartbeat_video_jobs() -> None:
+    """Продлевает аренду задач этого процесса, пока он жив (фоновая задача)"""
+    while True:
+        await asyncio.sleep(VIDEO_JOB_LEASE_SEC / 3)
+        try:
+            await db.heartbeat_video_jobs(_job_owner)
+        except Exception as e:
+            print(f"❌ Ошибка продления задач: {e}")
+
+
+# ==================== АЛЬБОМЫ (MEDIA GROUP) ====================
+
+# Видео из альбома приходят отдельными апдейтами с общим media_group_id:
+# собираем их в album_buffer и запускаем одну пакетную задачу после паузы
+ALBUM_MAX_VIDEOS = 10      # больше не влезет в один media group
+
+
+async def _process_album_item(bot: Bot, job: dict, ticket) -> dict:
+    """Обрабатывает одно видео альбома в своем воркере"""
+    try:
+        await admission.acquire(ticket)
+        
+        cached_file_id = fingerprint_index.lookup_exact(job["source"]["file_unique_id"], job["effect"])
+        if cached_file_id:
+            return {"media": cached_file_id, "cached": True}
+        
+        return await _run_job(bot, job)
+    except Exception as e:
+        await _fail_job(job, e)
+        raise
+    finally:
+        await admission.release(ticket)
+
+
+async def _process_album(message: types.Message, state: FSMContext, bot: Bot, user_id: int,
+                         sources: list, effect: str) -> None:
+    """
+    Пакетная обработка альбома: один допуск, общие ассеты, параллельные воркеры,
+    результат одним media group
+    """
+    sources = sources[:ALBUM_MAX_VIDEOS]
+    
+    # Допуск всего пакета разом: либо принимаем все видео, либо ни одного
+    costs = [
+        estimate_cost(effect, src.get("duration"), src.get("width"), src.get("height"), src.get("file_size"))
+        for src in sources
+    ]
+    decisions = []
+    for cost in costs:
+        decision = admission.reserve(user_id, cost)
+        if decision.rejected:
+            for d in decisions:
+                await admission.release(d.ticket)
+            await message.answer(
+                "🚫 <b>Не удается принять альбом</b>\n\n"
+                "Видео слишком много или они слишком тяжелые.\n"
+                "Попробуйте отправить меньше видео за раз.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_video")]
+                ])
+            )
+            return
+        decisions.append(decision)
+    
+    wait = decisions[0].wait_sec
+    total = wait + sum(costs) / admission.workers
+    processing_msg = None
+    jobs = []
+    
+    # Билеты уже в очереди допуска — дальше все внутри try/finally
+    try:
+        processing_msg = await send_queue.answer(
+            message,
+            f"⏳ <b>Альбом принят: {len(sources)} видео</b>\n\n"
+            f"Примерное время: {format_wait(total)}"
+        )
+        
+        # Каждое видео альбома — отдельная задача в журнале
+        for src in sources:
+            jobs.append(await _start_job(user_id, message.chat.id, src, effect))
+        
+        # Общая подготовка ассетов — один раз на весь пакет
+        if effect in ("trending_frame", "all"):
+            filtergraph.corner_mask_path()
+        if effect in ("subscribe_bait", "all"):
+            VideoProcessor._subscribe_image()
+        
+        results = await asyncio.gather(*[
+            _process_album_item(bot, job, d.ticket)
+            for job, d in zip(jobs, decisions)
+        ], return_exceptions=True)
+        
+        done = [(job, r) for job, r in zip(jobs, results) if not isinstance(r, BaseException)]
+        for r in results:
+            if isinstance(r, BaseException):
+                print(f"❌ Ошибка обработки видео из альбома: {r}")
+        if not done:
+            raise Exception("Ни одно видео альбома не обработано")
+        
+        await send_queue.edit_text(processing_msg, "📤 <b>Отправляем результат...</b>")
+        
+        media = []
+        for i, (job, r) in enumerate(done):
+            if not r["cached"]:
+                await db.update_video_job(job["id"], "uploading")
+            media.append(InputMediaVideo(
+                media=r["media"] if r["cached"] else FSInputFile(r["media"]),
+                caption=f"✅ <b>Обработка завершена!</b>\n\nЭффект: {effect}" if i == 0 else None
+            ))
+        sent = await send_queue.send_media_group(bot, message.chat.id, media)
+        
+        for (job, r), sent_msg in zip(done, sent):
+            if not r["cached"] and sent_msg.video:
+                await _remember_result(job["source"], effect, r["fingerprint"], sent_msg.video.file_id)
+            await _finish_job(job)
+        
+        failed = len(sources) - len(done)
+        await send_queue.answer(
+            message,
+            f"✅ Обработано видео: {len(done)} из {len(sources)}"
+            + (f"\n⚠️ С ошибкой: {failed}" if failed else ""),
+            reply_markup=_result_kb(),
+            priority=PRIORITY_RESULT
+        )
+        await processing_msg.delete()
+        await state.clear()
+        
+    except Exception as e:
+        print(f"❌ Ошибка обработки альбома: {e}")
+        for job in jobs:
+            await _fail_job(job, e)
+        if processing_msg:
+            await send_queue.edit_text(
+                processing_msg,
+                "❌ <b>Ошибка при обработке видео</b>\n\n"
+                "Попробуйте еще раз или обратитесь в поддержку.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="videoprcess")],
+                    [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
+                ]),
+                priority=PRIORITY_RESULT
+            )
         await state.clear()
         
     finally:
-        # Очищаем временные файлы
-        if temp_dir and os.path.exists(temp_dir):
-            import shutil
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+        # Билеты видео, которые так и не дошли до _process_album_item
+        # (повторное освобождение безопасно)
+        for d in decisions:
+            await admission.release(d.ticket)
+
+
+@router.message(VideoProcessingStates.waiting_for_video, F.video)
+async def process_video_handler(message: types.Message, state: FSMContext, bot: Bot):
+    """Обработка загруженного видео"""
+    user_data = await state.get_data()
+    effect = user_data.get("effect")
+    
+    # Проверка размера файла
+    if message.video.file_size > 50 * 1024 * 1024:  # 50 МБ
+        await message.answer(
+            "❌ <b>Файл слишком большой</b>\n\n"
+            "Максимальный размер: 50 МБ\n"
+            "Попробуйте загрузить меньшее видео."
+        )
+        return
+    
+    # Видео из альбома — копим в общем буфере; обрабатывает альбом тот апдейт,
+    # после которого больше ничего не пришло (в любом воркере)
+    if message.media_group_id:
+        sources = await album_buffer.add(
+            message.media_group_id, message.message_id, _video_source(message.video)
+        )
+        if sources:
+            await _process_album(message, state, bot, message.from_user.id, sources, effect)
+        return
+    
+    await _process_video(message, state, bot, message.from_user.id, _video_source(message.video), effect)
+
+
+@router.callback_query(F.data == "reprocess_fresh")
+async def reprocess_fresh_cb(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
+    """Повторная обработка видео без использования готового результата"""
+    user_data = await state.get_data()
+    source = user_data.get("cached_source")
+    effect = user_data.get("effect")
+    
+    if not source or not effect:
+        await callback.answer("❌ Исходное видео не найдено, отправьте его снова", show_alert=True)
+        return
+    
+    await callback.answer()
+    await _process_video(callback.message, state, bot, callback.from_user.id, source, effect, use_cache=False)
 
 
 @router.message(VideoProcessingStates.waiting_for_video)
@@ -13,10 +13,10 @@ router = Router()
 @router.message(CommandStart())
 async def cmd_start(message: types.Message):
     
-    user_exists = await db.user_exists(message.from_user.id)
+    # Один запрос: добавляет нового или обновляет username (и снимает блокировку рассылок)
+    is_new = await db.upsert_user(message.from_user.id, message.from_user.username)
     
-    if user_exists == False:
-        await db.add_user(message.from_user.id, message.from_user.username)
+    if is_new:
         logger.info(f"User {message.from_user.id} - {message.from_user.username} добавлен в базу данных")
     else:
         logger.info(f"{message.from_user.id} - {message.from_user.username} уже есть в базе данных")
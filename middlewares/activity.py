@@ -0,0 +1,23 @@
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from typing import Any, Callable, Dict, Awaitable
+
+from services.user_activity import user_activity
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Отмечает автора каждого апдейта (username / last_seen пишутся пачкой)."""
+
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            user_activity.touch(user.id, user.username)
+
+        return await handler(event, data)
@@ -1,21 +1,60 @@
 import time
+import uuid
 
 from aiogram.types import Message
 from aiogram import BaseMiddleware
 
 from collections import defaultdict, deque
-from typing import Any, Callable, Deque, Dict, Awaitable
+from typing import Any, Callable, Deque, Dict, Awaitable, Optional
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    """Простой антифлуд: ограничение N сообщений/минуту на пользователя."""
+    """
+    Простой антифлуд: ограничение N сообщений/минуту на пользователя.
 
+    С redis счетчики общие для всех процессов бота (режим вебхука с
+    несколькими воркерами), без него — в памяти процесса.
+    """
 
-    def __init__(self, rate_per_min: int = 20) -> None:
+
+    def __init__(self, rate_per_min: int = 20, redis: Optional[Any] = None) -> None:
         self.rate_per_min = max(1, rate_per_min)
+        self.redis = redis
         self._hits: Dict[int, Deque[float]] = defaultdict(deque)
 
 
+    def _allow_local(self, uid: int, now: float, window: float) -> bool:
+        q = self._hits[uid]
+
+        # Очистка устаревших обращений
+        while q and (now - q[0]) > window:
+            q.popleft()
+
+        if len(q) >= self.rate_per_min:
+            return False
+
+        q.append(now)
+        return True
+
+
+    async def _allow_redis(self, uid: int, now: float, window: float) -> bool:
+        # Скользящее окно в sorted set: score — время обращения
+        key = f"throttle:{uid}"
+        member = f"{now}:{uuid.uuid4().hex[:8]}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, 0, now - window)
+            pipe.zadd(key, {member: now})
+            pipe.zcard(key)
+            pipe.expire(key, int(window) + 1)
+            _, _, count, _ = await pipe.execute()
+
+        if count > self.rate_per_min:
+            # Отклоненное обращение в окно не засчитываем
+            await self.redis.zrem(key, member)
+            return False
+        return True
+
+
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
@@ -25,19 +64,18 @@ class ThrottlingMiddleware(BaseMiddleware):
         now = time.time()
         uid = event.from_user.id if event.from_user else 0
         window = 60.0
-        q = self._hits[uid]
 
 
-        # Очистка устаревших обращений
-        while q and (now - q[0]) > window:
-            q.popleft()
+        if self.redis is not None:
+            allowed = await self._allow_redis(uid, now, window)
+        else:
+            allowed = self._allow_local(uid, now, window)
 
 
-        if len(q) >= self.rate_per_min:
+        if not allowed:
             # Превышен лимит — мягко сообщаем и глотаем событие
             await event.answer("⏳ Слишком часто. Попробуй через пару секунд…")
             return
 
 
-        q.append(now)
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
@@ -1,20 +1,27 @@
 import os
 import asyncio
+import hashlib
+import multiprocessing
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums.parse_mode import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN, RATE_LIMIT_PER_MIN, ADMIN_ID
+from config import (
+    BOT_TOKEN, RATE_LIMIT_PER_MIN, ADMIN_ID, CRYPTO_WEBHOOK_ENABLED,
+    BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_SECRET, WEBHOOK_WORKERS, REDIS_URL, ADMISSION_GLOBAL_BUDGET_SEC,
+)
 from handlers import start, help, echo
 from handlers.User import profile, videoprocessing
-from handlers.Admin import media_manager
+from handlers.Admin import media_manager, broadcast, bulk_import
 
 from services.commands import setup_bot_commands
 from middlewares.logging import LoggingMiddleware
 from middlewares.throttling import ThrottlingMiddleware
+from middlewares.activity import ActivityMiddleware
 
-# Отдельный роутер для админских хендлеров 
+# Отдельный роутер для админских хендлеров
 from aiogram import Router
 from middlewares.admin_gate import AdminGateMiddleware
 
@@ -22,6 +29,20 @@ from aiogram.filters import Command
 from aiogram import types
 from services.logger import setup_logging
 from database.user import db
+from services.fingerprint import fingerprint_index
+from services.encoder_pool import encoder_pool
+from services.album_buffer import album_buffer
+from services.admission import admission
+from services.media_cache import media_cache
+from services.media_store import media_store
+from services.http_client import http_client
+from services.invoices import invoice_scheduler
+from services.send_queue import send_queue
+from services.broadcast import broadcaster
+from services.subscription_reminders import subscription_sweeper
+from services.media_catalog import media_catalog
+from services.user_activity import user_activity
+from services.cryptobot_webhook import start_webhook_server
 
 from dotenv import load_dotenv
 
@@ -42,24 +63,43 @@ async def on_startup(bot: Bot):
 
 
 async def on_shutdown(bot: Bot):
+    await invoice_scheduler.stop()
+    await broadcaster.stop()
+    await subscription_sweeper.stop()
+    await media_catalog.stop()
+    await user_activity.stop()
+    await send_queue.stop()
+    await http_client.close()
     await db.close()
 
 
-async def main():
-    setup_logging()
-    
-    # 1) Подключаемся к БД заранее
-    await db.connect()
-    
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+def create_redis():
+    """Клиент Redis для общих FSM и антифлуда (None, если REDIS_URL не задан)"""
+    if not REDIS_URL:
+        return None
+    # redis нужен только для нескольких воркеров — импортируем лениво
+    from redis.asyncio import Redis
+    return Redis.from_url(REDIS_URL)
+
+
+def build_dispatcher(redis=None) -> Dispatcher:
+    """Диспетчер с middleware и роутерами"""
     # Добавляем хранилище состояний для FSM
-    storage = MemoryStorage()
+    if redis is not None:
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage(redis=redis)
+    else:
+        storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
+    dp.shutdown.register(on_shutdown)
+    # Части альбома могут прийти в разные воркеры — буфер общий через Redis
+    album_buffer.bind(redis)
 
 
     # Подключаем глобальные middleware
+    dp.update.outer_middleware(ActivityMiddleware())
     dp.message.middleware(LoggingMiddleware())
-    dp.message.middleware(ThrottlingMiddleware(rate_per_min=RATE_LIMIT_PER_MIN))
+    dp.message.middleware(ThrottlingMiddleware(rate_per_min=RATE_LIMIT_PER_MIN, redis=redis))
 
 
     # Роутер админа — защищаем миддлварью
@@ -71,20 +111,212 @@ async def main():
     dp.include_router(help.router)
     dp.include_router(admin_router)
     dp.include_router(media_manager.router)  # Админская панель медиа
+    dp.include_router(broadcast.router)  # Рассылка от админа
+    dp.include_router(bulk_import.router)  # Импорт из CSV
     dp.include_router(echo.router)
     dp.include_router(profile.router)
     dp.include_router(videoprocessing.router)
-    
+    return dp
+
+
+async def prepare_services(primary: bool) -> None:
+    """
+    Подключения и кэши процесса
+
+    Args:
+        primary: Главный процесс — выполняет разовые задачи узла
+    """
+    # 1) Подключаемся к БД заранее
+    await db.connect()
+
+    # Индекс отпечатков обработанных видео (поиск повторных загрузок)
+    fingerprint_index.load(await db.get_all_video_fingerprints())
+
+    # Пул соединений для CryptoBot и других внешних API
+    await http_client.start()
+
+    # Кэш исходников и нормализованных файлов переживает перезапуск
+    media_cache.scan()
+
+    if primary:
+        # Докачиваем из общего хранилища шрифты/музыку, которых нет на этом узле
+        content_refs = await db.get_all_content_refs()
+        missing = media_store.missing(content_refs)
+        if missing:
+            fetched = await media_store.fetch_missing(content_refs)
+            print(f"📦 Скачано из хранилища медиа: {fetched} из {len(missing)}")
+
+
+async def start_background(bot: Bot, primary: bool) -> tuple:
+    """
+    Фоновые задачи процесса
+
+    Returns:
+        (список asyncio-задач, runner вебхука CryptoBot или None)
+    """
+    # Одна фоновая проверка всех ожидающих оплаты инвойсов
+    # (каждый процесс опрашивает инвойсы, созданные в нем)
+    invoice_scheduler.start(bot)
+
+    # Пакетная запись username / last_seen
+    user_activity.start()
+
+    # Шрифты и музыка в памяти, изменения — через LISTEN/NOTIFY (в каждом процессе)
+    await media_catalog.start()
+
+    # Продлеваем аренду своих задач обработки видео и продолжаем задачи,
+    # прерванные прошлой остановкой этого воркера (или брошенные умершими)
+    tasks = [
+        asyncio.create_task(videoprocessing.heartbeat_video_jobs()),
+        asyncio.create_task(videoprocessing.resume_video_jobs(bot)),
+    ]
+
+    if not primary:
+        return tasks, None
+
+    # Вебхук CryptoBot: оплаты зачисляются сразу, без ожидания опроса
+    webhook_runner = await start_webhook_server(bot) if CRYPTO_WEBHOOK_ENABLED else None
+
+    # И рассылки — с последнего доставленного пользователя
+    await broadcaster.resume(bot)
+
+    # Напоминания об окончании подписки (одним процессом — иначе дубли)
+    subscription_sweeper.start(bot)
+    return tasks, webhook_runner
+
+
+async def stop_background(tasks, webhook_runner) -> None:
+    for task in tasks:
+        task.cancel()
+    if webhook_runner:
+        await webhook_runner.cleanup()
+
+
+def create_bot() -> Bot:
+    return Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+
+async def main():
+    setup_logging()
+    encoder_pool.pin_bot()
+
+    await prepare_services(primary=True)
+
+    bot = create_bot()
+    dp = build_dispatcher(create_redis())
+
     # Устанавливаем меню-команды в Telegram (видны в боковом меню)
     await setup_bot_commands(bot)
 
+    tasks, webhook_runner = await start_background(bot, primary=True)
+
     print("🤖 Бот запущен…")
     try:
+        # Апдейты приходили вебхуком — снимаем его, иначе getUpdates не работает
+        await bot.delete_webhook()
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
-        # 2) Корректно закрываем пул
-        await db.close()
+        # Пул БД и остальное закрывает on_shutdown (dp.shutdown)
+        await stop_background(tasks, webhook_runner)
+
+
+# ==================== РЕЖИМ ВЕБХУКА ====================
+
+def webhook_secret() -> str:
+    # Один и тот же секрет во всех воркерах, даже если он не задан явно
+    return WEBHOOK_SECRET or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+
+
+async def webhook_worker(index: int) -> None:
+    """
+    Один процесс-воркер вебхука
+
+    Все воркеры слушают один порт (SO_REUSEPORT), ядро раздает им соединения.
+    Разовые задачи (setWebhook, команды, продолжение рассылок, вебхук
+    CryptoBot) выполняет воркер 0. Прерванные задачи видео каждый воркер
+    продолжает сам (свои и брошенные — по аренде в video_jobs).
+    """
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    setup_logging()
+    # Ядра энкодеров, CPU event loop'ов и общий бюджет очереди делим между воркерами узла
+    encoder_pool.partition(index, WEBHOOK_WORKERS)
+    admission.resize(encoder_pool.workers, ADMISSION_GLOBAL_BUDGET_SEC / max(1, WEBHOOK_WORKERS))
+    # Каталог кэша медиа общий — каждый воркер вытесняет в пределах своей доли
+    media_cache.share(WEBHOOK_WORKERS)
+    encoder_pool.pin_bot()
+    videoprocessing.set_job_owner(index)
+    primary = index == 0
+
+    await prepare_services(primary)
+
+    bot = create_bot()
+    dp = build_dispatcher(create_redis())
+
+    if primary:
+        await setup_bot_commands(bot)
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=webhook_secret(),
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    tasks, webhook_runner = await start_background(bot, primary)
+
+    app = web.Application()
+    # Запросы без X-Telegram-Bot-Api-Secret-Token отклоняются
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=webhook_secret()).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=True)
+    await site.start()
+
+    print(f"🤖 Воркер {index} принимает вебхуки на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_background(tasks, webhook_runner)
+        await runner.cleanup()
+
+
+def _run_webhook_worker(index: int) -> None:
+    try:
+        asyncio.run(webhook_worker(index))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_webhook() -> None:
+    if not WEBHOOK_BASE_URL:
+        raise RuntimeError("BOT_MODE=webhook, но WEBHOOK_BASE_URL не задан")
+    if WEBHOOK_WORKERS > 1 and not REDIS_URL:
+        print("⚠️ Несколько воркеров без REDIS_URL: FSM и антифлуд не будут общими")
+
+    if WEBHOOK_WORKERS <= 1:
+        _run_webhook_worker(0)
+        return
+
+    # Каждый воркер — отдельный процесс со своим event loop
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_run_webhook_worker, args=(i,), name=f"webhook-{i}")
+               for i in range(WEBHOOK_WORKERS)]
+    for proc in workers:
+        proc.start()
+    try:
+        for proc in workers:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
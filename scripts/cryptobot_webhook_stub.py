@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔔 Локальная проверка вебхука CryptoBot
+Отправляет подписанное (как это делает Crypto Pay) обновление invoice_paid
+на вебхук бота. Подпись считается от CRYPTO_BOT_TOKEN из .env
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Добавляем родительскую папку в путь для импорта модулей
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import aiohttp
+
+from config import CRYPTO_WEBHOOK_PORT, CRYPTO_WEBHOOK_PATH
+from services.cryptobot_webhook import SIGNATURE_HEADER, sign_body
+
+
+def build_update(invoice_id: int, user_id: int, amount: str, asset: str) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "update_id": invoice_id,
+        "update_type": "invoice_paid",
+        "request_date": now,
+        "payload": {
+            "invoice_id": invoice_id,
+            "status": "paid",
+            "asset": asset,
+            "amount": amount,
+            "payload": str(user_id),
+            "created_at": now,
+            "paid_at": now,
+        },
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Отправка тестового вебхука invoice_paid")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{CRYPTO_WEBHOOK_PORT}{CRYPTO_WEBHOOK_PATH}")
+    parser.add_argument("--invoice-id", type=int, required=True)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--amount", default="1")
+    parser.add_argument("--asset", default="USDT")
+    parser.add_argument("--bad-signature", action="store_true", help="Проверить, что неверная подпись отклоняется")
+    args = parser.parse_args()
+
+    body = json.dumps(build_update(args.invoice_id, args.user_id, args.amount, args.asset)).encode()
+    signature = "0" * 64 if args.bad_signature else sign_body(body)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            args.url, data=body,
+            headers={"Content-Type": "application/json", SIGNATURE_HEADER: signature}
+        ) as response:
+            text = await response.text()
+            print(f"{'✅' if response.status == 200 else '❌'} HTTP {response.status}: {text}")
+            return 0 if response.status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
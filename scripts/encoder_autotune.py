@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🎛 Автоподбор настроек кодирования (preset / crf / tune)
+Прогоняет корпус видео через те же эффекты, что и бот, по сетке настроек
+libx264, меряет время, размер и качество (SSIM / PSNR против lossless-эталона)
+и сохраняет рекомендованный профиль для каждого эффекта и группы разрешения
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from statistics import mean
+
+# Добавляем родительскую папку в путь для импорта модулей
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import ENCODER_PROFILES_PATH
+from handlers.User.videoprocessing import VideoProcessor
+from services.encoder_pool import encoder_pool
+from services.encoder_profiles import (
+    EncoderProfile,
+    LOSSLESS_PROFILE,
+    resolution_bucket,
+    save_profiles,
+)
+
+VIDEO_EXTS = {".mp4", ".mov", ".mkv", ".webm", ".avi", ".m4v"}
+EFFECTS = ["normalize", "ultra_unique", "trending_frame", "subscribe_bait", "all"]
+# Эффекты, которые в боте получают на вход уже нормализованный файл
+NEEDS_NORMALIZED = {"subscribe_bait"}
+
+
+async def probe_video(path: str) -> dict:
+    """Размер кадра и длительность исходника"""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height:format=duration',
+        '-of', 'json', path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    info = json.loads(out.decode() or "{}")
+    stream = (info.get("streams") or [{}])[0]
+    return {
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "duration": float(info.get("format", {}).get("duration") or 0),
+    }
+
+
+async def measure_quality(candidate: str, reference: str) -> dict:
+    """SSIM и PSNR кандидата относительно эталона (фильтры ssim/psnr ffmpeg)"""
+    result = await encoder_pool.run([
+        'ffmpeg', '-hide_banner', '-nostats',
+        '-i', candidate,
+        '-i', reference,
+        '-lavfi', '[0:v]split[c0][c1];[1:v]split[r0][r1];[c0][r0]ssim;[c1][r1]psnr',
+        '-f', 'null', '-'
+    ], timeout=1800)
+    ssim = re.search(r"SSIM .*All:([\d.]+)", result.stderr)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", result.stderr)
+    return {
+        "ssim": float(ssim.group(1)) if ssim else None,
+        "psnr": float(psnr.group(1)) if psnr else None,
+    }
+
+
+async def render(effect: str, input_path: str, output_path: str, profile: EncoderProfile) -> float:
+    """Прогоняет эффект бота с заданным профилем, возвращает время кодирования"""
+    method = {
+        "normalize": VideoProcessor.normalize_video,
+        "ultra_unique": VideoProcessor.apply_ultra_unique,
+        "trending_frame": VideoProcessor.apply_trending_frame,
+        "subscribe_bait": VideoProcessor.apply_subscribe_bait,
+        "all": VideoProcessor.apply_all,
+    }[effect]
+    started = time.monotonic()
+    if not await method(input_path, output_path, profile):
+        raise RuntimeError(f"ffmpeg завершился с ошибкой ({effect}, {profile})")
+    return time.monotonic() - started
+
+
+def pareto_front(points: list) -> list:
+    """Точки, которые не хуже других сразу по времени, размеру и SSIM"""
+    def dominates(a, b):
+        no_worse = a["time_per_sec"] <= b["time_per_sec"] and a["kbps"] <= b["kbps"] and a["ssim"] >= b["ssim"]
+        better = a["time_per_sec"] < b["time_per_sec"] or a["kbps"] < b["kbps"] or a["ssim"] > b["ssim"]
+        return no_worse and better
+    return [p for p in points if not any(dominates(q, p) for q in points if q is not p)]
+
+
+def recommend(front: list, min_ssim: float) -> dict:
+    """Самый быстрый профиль на фронте с SSIM не ниже порога (иначе — самый качественный)"""
+    good = [p for p in front if p["ssim"] >= min_ssim]
+    if good:
+        return min(good, key=lambda p: (p["time_per_sec"], p["kbps"]))
+    return max(front, key=lambda p: p["ssim"])
+
+
+async def run_clip(clip: Path, effects: list, grid: list, work_dir: Path) -> list:
+    """Все замеры по одному видео"""
+    info = await probe_video(str(clip))
+    duration = info["duration"] or 1.0
+    bucket = resolution_bucket(info["width"], info["height"])
+    print(f"\n📁 {clip.name}: {info['width']}x{info['height']}, {duration:.1f}с → группа {bucket}")
+
+    clip_dir = work_dir / clip.stem
+    clip_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+
+    normalized = None
+    if NEEDS_NORMALIZED & set(effects):
+        normalized = str(clip_dir / "normalized_ref.mkv")
+        await render("normalize", str(clip), normalized, LOSSLESS_PROFILE)
+
+    for effect in effects:
+        source = normalized if effect in NEEDS_NORMALIZED else str(clip)
+        reference = str(clip_dir / f"{effect}_ref.mkv")
+        await render(effect, source, reference, LOSSLESS_PROFILE)
+
+        for profile in grid:
+            out = str(clip_dir / f"{effect}_{profile.preset}_{profile.crf}_{profile.tune or 'none'}.mp4")
+            try:
+                elapsed = await render(effect, source, out, profile)
+                quality = await measure_quality(out, reference)
+            except Exception as e:
+                print(f"❌ {effect} {profile}: {e}")
+                continue
+            if quality["ssim"] is None:
+                print(f"❌ {effect} {profile}: не удалось измерить SSIM")
+                continue
+            size = os.path.getsize(out)
+            row = {
+                "clip": clip.name,
+                "bucket": bucket,
+                "effect": effect,
+                **profile.to_dict(),
+                "encode_sec": round(elapsed, 3),
+                "time_per_sec": elapsed / duration,
+                "size_bytes": size,
+                "kbps": size * 8 / 1000 / duration,
+                **quality,
+            }
+            rows.append(row)
+            print(f"   {effect:15} {profile.preset:9} crf={profile.crf:<3} tune={profile.tune or '-':10} "
+                  f"{elapsed:6.1f}с {row['kbps']:7.0f} кбит/с SSIM={quality['ssim']:.4f} PSNR={quality['psnr']}")
+            os.remove(out)
+        os.remove(reference)
+
+    shutil.rmtree(clip_dir, ignore_errors=True)
+    return rows
+
+
+def summarize(rows: list, min_ssim: float) -> tuple:
+    """Средние по (эффект, группа, профиль) → фронт Парето и рекомендация"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row["effect"], row["bucket"], row["preset"], row["crf"], row["tune"])].append(row)
+
+    by_target = defaultdict(list)
+    for (effect, bucket, preset, crf, tune), items in groups.items():
+        by_target[(effect, bucket)].append({
+            "preset": preset, "crf": crf, "tune": tune,
+            "time_per_sec": mean(r["time_per_sec"] for r in items),
+            "kbps": mean(r["kbps"] for r in items),
+            "ssim": mean(r["ssim"] for r in items),
+            "psnr": mean(r["psnr"] for r in items if r["psnr"] is not None) if any(
+                r["psnr"] is not None for r in items) else None,
+            "clips": len(items),
+        })
+
+    fronts, profiles = {}, defaultdict(dict)
+    for (effect, bucket), points in sorted(by_target.items()):
+        front = sorted(pareto_front(points), key=lambda p: p["time_per_sec"])
+        best = recommend(front, min_ssim)
+        fronts[f"{effect}/{bucket}"] = front
+        profiles[effect][bucket] = EncoderProfile(best["preset"], best["crf"], best["tune"])
+    return fronts, profiles
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Автоподбор preset/crf/tune для эффектов бота")
+    parser.add_argument("corpus", help="Папка с тестовыми видео")
+    parser.add_argument("--effects", default=",".join(EFFECTS), help="Эффекты через запятую")
+    parser.add_argument("--presets", default="veryfast,faster,fast,medium,slow")
+    parser.add_argument("--crfs", default="20,23,26,28")
+    parser.add_argument("--tunes", default="none,film", help="none — без -tune")
+    parser.add_argument("--min-ssim", type=float, default=0.98, help="Минимальный средний SSIM для рекомендации")
+    parser.add_argument("--output", default=ENCODER_PROFILES_PATH, help="Куда сохранить профили для бота")
+    parser.add_argument("--report", default="encoder_autotune_report.json", help="Все замеры и фронты Парето")
+    args = parser.parse_args()
+
+    clips = sorted(p for p in Path(args.corpus).iterdir() if p.suffix.lower() in VIDEO_EXTS)
+    if not clips:
+        print(f"❌ В папке {args.corpus} нет видео")
+        return 1
+
+    effects = [e.strip() for e in args.effects.split(",") if e.strip()]
+    unknown = set(effects) - set(EFFECTS)
+    if unknown:
+        print(f"❌ Неизвестные эффекты: {', '.join(sorted(unknown))}")
+        return 2
+
+    grid = [
+        EncoderProfile(preset, int(crf), None if tune == "none" else tune)
+        for preset, crf, tune in itertools.product(
+            args.presets.split(","), args.crfs.split(","), args.tunes.split(",")
+        )
+    ]
+    print(f"🎛 Видео: {len(clips)}, эффекты: {len(effects)}, вариантов настроек: {len(grid)}")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="autotune_"))
+    rows = []
+    try:
+        for clip in clips:
+            rows += await run_clip(clip, effects, grid, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not rows:
+        print("❌ Нет ни одного успешного замера")
+        return 1
+
+    fronts, profiles = summarize(rows, args.min_ssim)
+
+    print("\n" + "=" * 60)
+    print("✅ РЕКОМЕНДОВАННЫЕ ПРОФИЛИ")
+    print("=" * 60)
+    for effect, buckets in profiles.items():
+        for bucket, profile in buckets.items():
+            print(f"  {effect:15} {bucket:8} → -preset {profile.preset} -crf {profile.crf}"
+                  + (f" -tune {profile.tune}" if profile.tune else ""))
+
+    meta = {"generated_at": datetime.now().isoformat(timespec="seconds"), "min_ssim": args.min_ssim}
+    save_profiles(args.output, profiles, meta)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({**meta, "measurements": rows, "pareto": fronts}, f, ensure_ascii=False, indent=2)
+
+    print(f"\n💾 Профили: {args.output}")
+    print(f"📊 Отчет: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
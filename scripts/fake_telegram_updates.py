@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📨 Нагрузочная проверка вебхука Telegram
+Шлет на локальный вебхук бота синтетические апдейты (/start от разных
+пользователей) параллельно — как их присылает Telegram — и считает
+коды ответов и пропускную способность
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Добавляем родительскую папку в путь для импорта модулей
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import aiohttp
+
+from config import WEBHOOK_PORT, WEBHOOK_PATH
+from run import webhook_secret
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Load {user_id}", "username": f"load_{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            if text.startswith("/") else [],
+        },
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Отправка синтетических апдейтов на вебхук бота")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--updates", type=int, default=1000, help="Сколько апдейтов отправить")
+    parser.add_argument("--users", type=int, default=100, help="Сколько разных пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных запросов")
+    parser.add_argument("--user-id-base", type=int, default=9_000_000_000)
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--bad-secret", action="store_true", help="Проверить, что чужой секрет отклоняется")
+    args = parser.parse_args()
+
+    secret = "wrong-secret" if args.bad_secret else webhook_secret()
+    statuses = Counter()
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(args.updates):
+        queue.put_nowait(i)
+
+    async def sender(session: aiohttp.ClientSession):
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            update = build_update(i + 1, args.user_id_base + i % max(1, args.users), args.text)
+            started = time.perf_counter()
+            try:
+                async with session.post(args.url, json=update, headers={SECRET_HEADER: secret}) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(sender(session) for _ in range(max(1, args.concurrency))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"📨 Отправлено: {args.updates} за {elapsed:.2f} с ({args.updates / elapsed:.0f} апдейтов/с)")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"⏱ Задержка: p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс")
+    for status, count in sorted(statuses.items(), key=lambda x: str(x[0])):
+        print(f"{'✅' if status == 200 else '❌'} {status}: {count}")
+
+    if args.bad_secret:
+        return 0 if statuses.get(200, 0) == 0 else 1
+    return 0 if statuses.get(200, 0) == args.updates else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
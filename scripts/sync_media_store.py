@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔄 Синхронизация хранилища медиа между узлами
+Копирует файлы шрифтов/музыки, на которые ссылается БД, из общего
+хранилища (STORAGE_BACKEND) или из папки хранилища другого узла
+(общая папка, rsync-зеркало) с проверкой SHA-256
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional
+
+# Добавляем родительскую папку в путь для импорта модулей
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.user import db
+from services.media_store import media_store
+
+
+async def main(source_root: Optional[str]) -> int:
+    await db.connect()
+    try:
+        refs = await db.get_all_content_refs()
+    finally:
+        await db.close()
+    
+    missing = media_store.missing(refs)
+    print(f"📦 Файлов в БД: {len(refs)}, не хватает локально: {len(missing)}")
+    if not missing:
+        return 0
+    
+    if source_root:
+        copied = media_store.sync_from(source_root, refs)
+    else:
+        copied = await media_store.fetch_missing(refs)
+    print(f"✅ Скопировано: {copied} из {len(missing)}")
+    return 0 if copied == len(missing) else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Использование: python3 scripts/sync_media_store.py [/путь/к/media_store/другого/узла]")
+        print("Без аргумента файлы берутся из общего хранилища (STORAGE_BACKEND)")
+        sys.exit(2)
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) == 2 else None)))
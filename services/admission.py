@@ -0,0 +1,182 @@
+# services/admission.py
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from config import (
+    ADMISSION_MAX_JOB_SEC,
+    ADMISSION_USER_BUDGET_SEC,
+    ADMISSION_GLOBAL_BUDGET_SEC,
+)
+from services.encoder_pool import encoder_pool
+
+# Коэффициенты стоимости из замеров (libx264 -preset medium):
+# секунды работы на мегапиксель-секунду выходного видео для каждого эффекта
+EFFECT_ENCODE_COEF: Dict[str, float] = {
+    "normalize": 0.12,
+    "ultra_unique": 0.14,
+    "trending_frame": 0.13,
+    "subscribe_bait": 0.13,
+    "subtitles": 0.13,
+    "music": 0.01,  # видео копируется, кодируется только звук
+    "all": 0.16,
+}
+DEFAULT_ENCODE_COEF = 0.15
+# Декодирование исходника: секунды на мегапиксель-секунду входа
+DECODE_COEF = 0.01
+# Скачивание с серверов Telegram, байт/сек
+DOWNLOAD_BYTES_PER_SEC = 8 * 1024 * 1024
+# Фиксированные накладные расходы на задачу (запуск ffmpeg, отправка)
+JOB_OVERHEAD_SEC = 3.0
+
+# Холст, в который попадают все эффекты
+OUT_PIXELS = 1080 * 1920
+
+
+def estimate_cost(effect: str, duration: int, width: int, height: int, file_size: int) -> float:
+    """
+    Оценка времени обработки по метаданным Telegram (без скачивания)
+
+    Args:
+        effect: Выбранный эффект
+        duration: Длительность в секундах
+        width, height: Размер кадра исходника
+        file_size: Размер файла в байтах
+
+    Returns:
+        Ожидаемое время обработки в секундах
+    """
+    duration = max(1, duration or 1)
+    in_mpx_s = (width or 1080) * (height or 1920) / 1e6 * duration
+    out_mpx_s = OUT_PIXELS / 1e6 * duration
+    coef = EFFECT_ENCODE_COEF.get(effect, DEFAULT_ENCODE_COEF)
+    return (
+        JOB_OVERHEAD_SEC
+        + (file_size or 0) / DOWNLOAD_BYTES_PER_SEC
+        + DECODE_COEF * in_mpx_s
+        + coef * out_mpx_s
+    )
+
+
+def format_wait(seconds: float) -> str:
+    """Человекочитаемое время ожидания"""
+    if seconds < 60:
+        return f"~{max(5, int(round(seconds / 5.0)) * 5)} сек"
+    return f"~{int(round(seconds / 60.0))} мин"
+
+
+@dataclass
+class Ticket:
+    id: int
+    user_id: int
+    cost: float
+    started_at: Optional[float] = None
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class Decision:
+    status: str  # "admit" | "defer" | "reject"
+    wait_sec: float = 0.0
+    reason: str = ""
+    ticket: Optional[Ticket] = None
+
+    @property
+    def rejected(self) -> bool:
+        return self.status == "reject"
+
+
+class AdmissionController:
+    """
+    Допуск задач по оценке стоимости до скачивания.
+
+    Задачи выполняются в порядке очереди, одновременно не больше workers.
+    Слишком дорогие задачи и задачи сверх бюджета пользователя отклоняются,
+    задачи сверх свободных воркеров откладываются в очередь (пока общий
+    бюджет очереди не исчерпан).
+    """
+
+    def __init__(self, workers: int, max_job_sec: float, user_budget_sec: float, global_budget_sec: float):
+        self.workers = max(1, workers)
+        self.max_job_sec = max_job_sec
+        self.user_budget_sec = user_budget_sec
+        self.global_budget_sec = global_budget_sec
+        self._ids = itertools.count(1)
+        self._queue: Deque[Ticket] = deque()
+        self._running: Dict[int, Ticket] = {}
+        self._cond = asyncio.Condition()
+
+    def resize(self, workers: int, global_budget_sec: float) -> None:
+        """Доля процесса, когда узел обслуживают несколько воркеров вебхука"""
+        self.workers = max(1, workers)
+        self.global_budget_sec = global_budget_sec
+
+    def _remaining(self, ticket: Ticket, now: float) -> float:
+        if ticket.started_at is None:
+            return ticket.cost
+        return max(1.0, ticket.cost - (now - ticket.started_at))
+
+    def _user_load(self, user_id: int) -> float:
+        return sum(t.cost for t in itertools.chain(self._queue, self._running.values()) if t.user_id == user_id)
+
+    def expected_wait(self) -> float:
+        """Сколько ждать новой задаче до старта"""
+        now = time.monotonic()
+        backlog = sum(self._remaining(t, now) for t in self._running.values())
+        backlog += sum(t.cost for t in self._queue)
+        free = self.workers - len(self._running) - len(self._queue)
+        if free > 0:
+            return 0.0
+        return backlog / self.workers
+
+    def reserve(self, user_id: int, cost: float) -> Decision:
+        """Принимает решение по задаче и, если она допущена, ставит её в очередь"""
+        if cost > self.max_job_sec:
+            return Decision("reject", reason="too_expensive")
+
+        if self._user_load(user_id) + cost > self.user_budget_sec:
+            return Decision("reject", reason="user_budget")
+
+        wait = self.expected_wait()
+        if wait > 0 and wait + cost > self.global_budget_sec:
+            return Decision("reject", wait_sec=wait, reason="global_budget")
+
+        ticket = Ticket(id=next(self._ids), user_id=user_id, cost=cost)
+        self._queue.append(ticket)
+        return Decision("admit" if wait == 0 else "defer", wait_sec=wait, ticket=ticket)
+
+    async def acquire(self, ticket: Ticket) -> None:
+        """Ждёт, пока задача дойдёт до головы очереди и освободится воркер"""
+        async with self._cond:
+            try:
+                await self._cond.wait_for(
+                    lambda: self._queue and self._queue[0] is ticket and len(self._running) < self.workers
+                )
+            except BaseException:
+                # Отмена во время ожидания — убираем себя из очереди
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            ticket.started_at = time.monotonic()
+            self._running[ticket.id] = ticket
+
+    async def release(self, ticket: Ticket) -> None:
+        """Освобождает воркер (или убирает из очереди, если задача так и не стартовала)"""
+        async with self._cond:
+            self._running.pop(ticket.id, None)
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            self._cond.notify_all()
+
+
+admission = AdmissionController(
+    workers=encoder_pool.workers,
+    max_job_sec=ADMISSION_MAX_JOB_SEC,
+    user_budget_sec=ADMISSION_USER_BUDGET_SEC,
+    global_budget_sec=ADMISSION_GLOBAL_BUDGET_SEC,
+)
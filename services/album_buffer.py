@@ -0,0 +1,77 @@
+# services/album_buffer.py
+"""
+Сборка альбомов (media group) из отдельных апдейтов.
+
+Видео альбома приходят отдельными апдейтами с общим media_group_id, и при
+нескольких воркерах вебхука они попадают в разные процессы. Каждая часть
+кладется в общий буфер (Redis, без него — память процесса) и увеличивает
+счетчик альбома. Через collect_delay тишины альбом забирает тот вызов,
+чья часть пришла последней: счетчик с тех пор не менялся. Так альбом
+обрабатывается один раз целиком, каким бы процессом ни пришла каждая часть.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+# Ключи в Redis живут не дольше этого, даже если процесс упал посреди сборки
+KEY_TTL_SEC = 60
+
+
+class AlbumBuffer:
+    def __init__(self, collect_delay: float, redis: Optional[Any] = None):
+        self.collect_delay = collect_delay
+        self.redis = redis
+        self._items: Dict[str, List[tuple]] = {}
+        self._seq: Dict[str, int] = {}
+
+    def bind(self, redis: Optional[Any]) -> None:
+        """Общий буфер для всех процессов (вызывается при сборке диспетчера)"""
+        self.redis = redis
+
+    async def add(self, group_id: str, message_id: int, source: dict) -> Optional[List[dict]]:
+        """
+        Добавляет часть альбома и ждет, пока альбом догрузится
+
+        Returns:
+            Источники всего альбома по порядку сообщений — если этот вызов
+            должен обработать альбом, иначе None
+        """
+        if self.redis is not None:
+            return await self._add_redis(group_id, message_id, source)
+        return await self._add_local(group_id, message_id, source)
+
+    async def _add_local(self, group_id: str, message_id: int, source: dict) -> Optional[List[dict]]:
+        self._items.setdefault(group_id, []).append((message_id, source))
+        seq = self._seq[group_id] = self._seq.get(group_id, 0) + 1
+        await asyncio.sleep(self.collect_delay)
+        if self._seq.get(group_id) != seq:
+            return None
+        self._seq.pop(group_id, None)
+        items = self._items.pop(group_id, [])
+        return [source for _, source in sorted(items, key=lambda item: item[0])]
+
+    async def _add_redis(self, group_id: str, message_id: int, source: dict) -> Optional[List[dict]]:
+        key = f"album:{group_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, json.dumps([message_id, source]))
+            pipe.incr(f"{key}:seq")
+            pipe.expire(key, KEY_TTL_SEC)
+            pipe.expire(f"{key}:seq", KEY_TTL_SEC)
+            _, seq, _, _ = await pipe.execute()
+
+        await asyncio.sleep(self.collect_delay)
+        current = await self.redis.get(f"{key}:seq")
+        if current is None or int(current) != seq:
+            return None
+        # Два процесса с одинаковым seq невозможны, но забираем альбом атомарно
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key, f"{key}:seq")
+            raw, _ = await pipe.execute()
+        if not raw:
+            return None
+        items = [json.loads(item) for item in raw]
+        return [source for _, source in sorted(items, key=lambda item: item[0])]
+
+
+album_buffer = AlbumBuffer(collect_delay=1.5)
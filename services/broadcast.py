@@ -0,0 +1,210 @@
+# services/broadcast.py
+"""
+Рассылка сообщения админа всем пользователям.
+
+Получатели читаются из БД пачками (db.iter_broadcast_recipients),
+каждая пачка отправляется параллельно через send_queue с самым низким
+приоритетом — лимиты Telegram соблюдает очередь, а оплаты и результаты
+обработки видео идут вперед рассылки. После пачки в БД пишутся статусы
+доставки и позиция, поэтому после рестарта рассылка продолжается с места
+остановки. Ход рассылки раз в несколько секунд обновляется в сообщении
+у админа.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import BROADCAST_CHUNK_SIZE, BROADCAST_PROGRESS_INTERVAL_SEC
+from database.user import db
+from services.admission import format_wait
+from services.send_queue import send_queue, PRIORITY_BROADCAST
+
+STATUS_TITLES = {
+    "active": "⏳ идет",
+    "done": "✅ завершена",
+    "cancelled": "⏹ остановлена",
+    "failed": "❌ прервана с ошибкой",
+}
+
+
+@dataclass
+class BroadcastProgress:
+    """Счетчики рассылки и скорость в этом процессе"""
+    broadcast_id: int
+    total: int
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    status: str = "active"
+    started_at: float = field(default_factory=time.monotonic)
+    # Отправлено с момента запуска в этом процессе — для скорости
+    sent_here: int = 0
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.sent_here / elapsed if elapsed > 0 else 0.0
+
+
+def format_progress(p: BroadcastProgress) -> str:
+    total = max(p.total, p.done)
+    percent = p.done * 100 // total if total else 100
+    text = (
+        f"📢 <b>Рассылка #{p.broadcast_id}</b>\n\n"
+        f"Статус: {STATUS_TITLES.get(p.status, p.status)}\n"
+        f"📊 Прогресс: {p.done} / {total} ({percent}%)\n"
+        f"✅ Доставлено: {p.sent}\n"
+        f"🚫 Заблокировали бота: {p.blocked}\n"
+        f"❌ Ошибки: {p.failed}"
+    )
+    if p.status == "active":
+        text += f"\n⚡ Скорость: {p.rate:.1f} сообщ./с"
+        if p.rate > 0 and total > p.done:
+            text += f"\n⏱ Осталось: {format_wait((total - p.done) / p.rate)}"
+    return text
+
+
+def progress_kb(p: BroadcastProgress) -> Optional[InlineKeyboardMarkup]:
+    if p.status != "active":
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⏹ Остановить", callback_data=f"broadcast_cancel_{p.broadcast_id}")]
+    ])
+
+
+class Broadcaster:
+    """Запущенные рассылки процесса (одна задача на рассылку)"""
+
+    def __init__(self, chunk_size: int, progress_interval: float):
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._progress: Dict[int, BroadcastProgress] = {}
+
+    def progress(self, broadcast_id: int) -> Optional[BroadcastProgress]:
+        return self._progress.get(broadcast_id)
+
+    def start(self, bot: Bot, broadcast: dict) -> None:
+        broadcast_id = broadcast["id"]
+        task = self._tasks.get(broadcast_id)
+        if task is not None and not task.done():
+            return
+        self._progress[broadcast_id] = BroadcastProgress(
+            broadcast_id, broadcast["total"],
+            sent=broadcast["sent"], failed=broadcast["failed"], blocked=broadcast["blocked"],
+        )
+        self._tasks[broadcast_id] = asyncio.create_task(self._run(bot, broadcast))
+
+    async def resume(self, bot: Bot) -> None:
+        """Продолжает рассылки, прерванные остановкой бота (вызывается при старте)"""
+        try:
+            broadcasts = await db.get_active_broadcasts()
+        except Exception as e:
+            print(f"❌ Ошибка чтения рассылок: {e}")
+            return
+        for broadcast in broadcasts:
+            print(f"📢 Продолжаем рассылку #{broadcast['id']} с user_id > {broadcast['last_user_id']}")
+            self.start(bot, broadcast)
+
+    async def cancel(self, bot: Bot, broadcast_id: int) -> bool:
+        """Останавливает рассылку; недоставленным она больше не придет"""
+        await db.finish_broadcast(broadcast_id, "cancelled")
+        task = self._tasks.get(broadcast_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        progress = self._progress.get(broadcast_id)
+        if progress is not None:
+            progress.status = "cancelled"
+            broadcast = await db.get_broadcast(broadcast_id)
+            await self._report(bot, broadcast, progress)
+        return True
+
+    async def stop(self) -> None:
+        """Остановка бота: задачи отменяются, рассылки остаются active и продолжатся"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    async def _deliver(self, bot: Bot, broadcast: dict, user_id: int) -> tuple:
+        try:
+            await send_queue.copy_message(
+                bot, user_id, broadcast["from_chat_id"], broadcast["message_id"], priority=PRIORITY_BROADCAST
+            )
+            return user_id, "sent", None
+        except TelegramForbiddenError as e:
+            # Бот заблокирован или пользователь удален
+            return user_id, "blocked", str(e)[:200]
+        except Exception as e:
+            return user_id, "failed", str(e)[:200]
+
+    async def _run(self, bot: Bot, broadcast: dict) -> None:
+        broadcast_id = broadcast["id"]
+        progress = self._progress[broadcast_id]
+        reporter = asyncio.create_task(self._report_loop(bot, broadcast, progress))
+        try:
+            async for user_ids in db.iter_broadcast_recipients(
+                broadcast_id, broadcast["last_user_id"], self.chunk_size
+            ):
+                # Рассылку могли остановить из другого процесса бота
+                current = await db.get_broadcast(broadcast_id)
+                if current is None or current["status"] != "active":
+                    progress.status = current["status"] if current else "cancelled"
+                    break
+                deliveries = await asyncio.gather(*[
+                    self._deliver(bot, broadcast, user_id) for user_id in user_ids
+                ])
+                await db.record_broadcast_chunk(broadcast_id, deliveries, user_ids[-1])
+                for _, status, _ in deliveries:
+                    setattr(progress, status, getattr(progress, status) + 1)
+                progress.sent_here += len(deliveries)
+            else:
+                progress.status = "done"
+                await db.finish_broadcast(broadcast_id, "done")
+            print(f"📢 Рассылка #{broadcast_id} {STATUS_TITLES.get(progress.status, progress.status)}: "
+                  f"доставлено {progress.sent}, заблокировали {progress.blocked}, ошибок {progress.failed}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка рассылки #{broadcast_id}: {e}")
+            progress.status = "failed"
+            await db.finish_broadcast(broadcast_id, "failed")
+        finally:
+            reporter.cancel()
+        if progress.status != "active":
+            await self._report(bot, broadcast, progress)
+
+    async def _report_loop(self, bot: Bot, broadcast: dict, progress: BroadcastProgress) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._report(bot, broadcast, progress)
+
+    async def _report(self, bot: Bot, broadcast: dict, progress: BroadcastProgress) -> None:
+        if not broadcast or not broadcast.get("status_message_id"):
+            return
+        try:
+            await send_queue.edit_message_text(
+                bot, broadcast["status_chat_id"], broadcast["status_message_id"],
+                format_progress(progress), reply_markup=progress_kb(progress)
+            )
+        except Exception as e:
+            # "message is not modified" и т.п. — рассылку не прерываем
+            if "not modified" not in str(e):
+                print(f"❌ Ошибка обновления хода рассылки #{progress.broadcast_id}: {e}")
+
+
+broadcaster = Broadcaster(chunk_size=BROADCAST_CHUNK_SIZE, progress_interval=BROADCAST_PROGRESS_INTERVAL_SEC)
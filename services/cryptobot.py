@@ -0,0 +1,82 @@
+# services/cryptobot.py
+from typing import List, Optional
+
+from config import CRYPTO_BOT_TOKEN
+from services.http_client import http_client
+
+CRYPTO_API_URL = "https://pay.crypt.bot/api"
+
+
+def _headers() -> dict:
+    return {
+        "Crypto-Pay-API-Token": CRYPTO_BOT_TOKEN,
+        "Content-Type": "application/json"
+    }
+
+
+async def create_crypto_invoice(amount: float, user_id: int) -> Optional[dict]:
+    """
+    Создает инвойс в CryptoBot API
+
+    Args:
+        amount: Сумма в USD
+        user_id: ID пользователя Telegram
+
+    Returns:
+        dict с данными инвойса или None при ошибке
+    """
+    # Параметры инвойса
+    payload = {
+        "asset": "USDT",  # Можно изменить на другую криптовалюту
+        "amount": str(amount),
+        "description": f"Пополнение баланса для пользователя {user_id}",
+        "paid_btn_name": "callback",  # Кнопка после оплаты
+        "paid_btn_url": f"https://t.me/YOUR_BOT_USERNAME",  # Замените на username вашего бота
+        "payload": str(user_id)  # Для идентификации пользователя при webhook
+    }
+
+    # Повтор после отправки мог бы создать второй инвойс — повторяем только неудачное соединение
+    status, data = await http_client.request_json(
+        "POST", f"{CRYPTO_API_URL}/createInvoice", json=payload, headers=_headers(), idempotent=False
+    )
+    if status == 200 and data and data.get("ok"):
+        return data.get("result")
+    if status:
+        print(f"Ошибка при создании инвойса: HTTP {status} {data}")
+    return None
+
+
+async def get_invoices(invoice_ids: List[int]) -> Optional[List[dict]]:
+    """
+    Получает инвойсы из CryptoBot API по списку ID
+
+    Returns:
+        Список инвойсов (статусы: active, paid, expired) или None при ошибке
+    """
+    params = {
+        "invoice_ids": ",".join(str(i) for i in invoice_ids),
+        "count": len(invoice_ids)
+    }
+    status, data = await http_client.request_json(
+        "GET", f"{CRYPTO_API_URL}/getInvoices", params=params, headers=_headers()
+    )
+    if status == 200 and data and data.get("ok"):
+        return data.get("result", {}).get("items", [])
+    if status:
+        print(f"Ошибка при проверке статуса инвойсов: HTTP {status} {data}")
+    return None
+
+
+async def check_invoice_status(invoice_id: int) -> Optional[dict]:
+    """
+    Проверяет статус инвойса в CryptoBot API
+
+    Args:
+        invoice_id: ID инвойса для проверки
+
+    Returns:
+        dict с данными инвойса или None при ошибке
+        Статусы: active, paid, expired
+    """
+    items = await get_invoices([invoice_id])
+    return items[0] if items else None
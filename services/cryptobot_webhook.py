@@ -0,0 +1,88 @@
+# services/cryptobot_webhook.py
+"""
+Прием вебхуков Crypto Pay (invoice_paid) вместо ожидания очередного опроса.
+
+Подпись: заголовок crypto-pay-api-signature = HMAC-SHA256 от тела запроса,
+ключ — SHA-256 от токена CryptoBot. Фоновый опрос инвойсов при включенном
+вебхуке остается редкой сверкой на случай потерянных уведомлений.
+"""
+import hashlib
+import hmac
+import json
+from typing import Optional
+
+from aiogram import Bot
+from aiohttp import web
+
+from config import (
+    CRYPTO_BOT_TOKEN,
+    CRYPTO_WEBHOOK_HOST,
+    CRYPTO_WEBHOOK_PORT,
+    CRYPTO_WEBHOOK_PATH,
+)
+from services.invoices import CREDIT_FAILED, credit_paid_invoice, invoice_scheduler
+
+SIGNATURE_HEADER = "crypto-pay-api-signature"
+
+
+def sign_body(body: bytes, token: str = CRYPTO_BOT_TOKEN) -> str:
+    """Подпись тела запроса так, как ее считает Crypto Pay"""
+    secret = hashlib.sha256(token.encode()).digest()
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_body(body), signature)
+
+
+async def _handle_update(request: web.Request) -> web.Response:
+    body = await request.read()
+    if not verify_signature(body, request.headers.get(SIGNATURE_HEADER)):
+        print("❌ Вебхук CryptoBot: неверная подпись")
+        return web.Response(status=401)
+
+    try:
+        update = json.loads(body)
+    except ValueError:
+        return web.Response(status=400)
+
+    if update.get("update_type") != "invoice_paid":
+        return web.Response(text="ok")
+
+    invoice = update.get("payload") or {}
+    try:
+        invoice_id = int(invoice["invoice_id"])
+        # При создании инвойса в payload кладем ID пользователя
+        user_id = int(invoice["payload"])
+        amount = float(invoice["amount"])
+        asset = invoice.get("asset", "USDT")
+    except (KeyError, TypeError, ValueError):
+        print(f"❌ Вебхук CryptoBot: не удалось разобрать инвойс {invoice.get('invoice_id')}")
+        return web.Response(status=400)
+
+    bot: Bot = request.app["bot"]
+    if await credit_paid_invoice(bot, invoice_id, user_id, amount, asset) == CREDIT_FAILED:
+        # 5xx — CryptoBot пришлет уведомление снова, а опрос продолжит сверку
+        return web.Response(status=503)
+    # Инвойс зачислен — больше не нужно опрашивать
+    invoice_scheduler.discard(invoice_id)
+    return web.Response(text="ok")
+
+
+def create_app(bot: Bot) -> web.Application:
+    app = web.Application()
+    app["bot"] = bot
+    app.router.add_post(CRYPTO_WEBHOOK_PATH, _handle_update)
+    return app
+
+
+async def start_webhook_server(bot: Bot) -> web.AppRunner:
+    """Запускает HTTP-сервер вебхука; остановка — await runner.cleanup()"""
+    runner = web.AppRunner(create_app(bot))
+    await runner.setup()
+    site = web.TCPSite(runner, CRYPTO_WEBHOOK_HOST, CRYPTO_WEBHOOK_PORT)
+    await site.start()
+    print(f"🔔 Вебхук CryptoBot: http://{CRYPTO_WEBHOOK_HOST}:{CRYPTO_WEBHOOK_PORT}{CRYPTO_WEBHOOK_PATH}")
+    return runner
@@ -0,0 +1,194 @@
+# services/encoder_pool.py
+import asyncio
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import ENCODE_WORKERS, ENCODE_THREADS, ENCODE_RESERVED_CORES, ENCODE_NICE
+
+# Сколько потоков x264 эффективно использует на 1080p без заметной потери на синхронизации
+AUTO_THREADS_PER_JOB = 4
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(cpus: List[int]) -> List[List[int]]:
+    """
+    Группирует логические CPU по физическим ядрам (SMT-соседи вместе)
+
+    Returns:
+        Список групп CPU, упорядоченный по (package, core)
+    """
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for cpu in cpus:
+        topo = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology")
+        try:
+            key = (
+                int((topo / "physical_package_id").read_text()),
+                int((topo / "core_id").read_text()),
+            )
+        except (OSError, ValueError):
+            key = (0, cpu)
+        groups.setdefault(key, []).append(cpu)
+    return [groups[k] for k in sorted(groups)]
+
+
+class EncoderPool:
+    """
+    Пул слотов для ffmpeg с раскладкой по ядрам.
+
+    Первые reserved_cores физических ядер остаются боту (event loop),
+    остальные делятся между слотами. Каждый ffmpeg запускается с явным
+    числом потоков, привязкой к своему набору CPU и пониженным приоритетом
+    (nice/ionice), поэтому обычные апдейты не ждут энкодеров.
+    """
+
+    def __init__(self, workers: int = 0, threads: int = 0, reserved_cores: int = 1, nice: int = 10):
+        cores = physical_cores(_available_cpus())
+        reserved = min(reserved_cores, len(cores) - 1) if len(cores) > 1 else 0
+        self.bot_cpus = [cpu for group in cores[:reserved] for cpu in group]
+        self._reserved_cpus = list(self.bot_cpus)
+        self._encode_cores = cores[reserved:]
+        self._requested_workers = workers
+        self._requested_threads = threads
+        self.nice = nice
+        self._ionice = shutil.which("ionice")
+        self._slots: Optional[asyncio.Queue] = None
+        self._layout(self._encode_cores, workers)
+
+    def _layout(self, encode_cores: List[List[int]], workers: int) -> None:
+        """Слоты и их наборы CPU на заданных физических ядрах"""
+        encode_cpus = [cpu for group in encode_cores for cpu in group]
+
+        if workers <= 0:
+            workers = max(1, len(encode_cpus) // AUTO_THREADS_PER_JOB)
+        self.workers = workers
+
+        # Делим физические ядра между слотами непрерывными кусками
+        self.cpu_sets: List[List[int]] = []
+        for i in range(workers):
+            chunk = encode_cores[i * len(encode_cores) // workers:(i + 1) * len(encode_cores) // workers]
+            cpus = [cpu for group in chunk for cpu in group]
+            # Слотов больше, чем ядер — делим ядра по кругу
+            self.cpu_sets.append(cpus or [encode_cpus[i % len(encode_cpus)]])
+
+        threads = self._requested_threads
+        self.threads = threads if threads > 0 else max(1, min(len(s) for s in self.cpu_sets))
+
+    def partition(self, index: int, count: int) -> None:
+        """
+        Оставляет процессу index из count его долю узла: свои физические ядра,
+        свою часть ENCODE_WORKERS и свои CPU из зарезервированных под бота.
+        Вызывается до первого энкода и pin_bot — иначе каждый воркер вебхука
+        занял бы все ядра, а их event loop'ы делили бы одни и те же CPU.
+        """
+        if count <= 1:
+            return
+        reserved = self._reserved_cpus
+        if reserved:
+            # Зарезервированных CPU меньше, чем процессов — делим их по кругу
+            self.bot_cpus = (
+                reserved[index * len(reserved) // count:(index + 1) * len(reserved) // count]
+                or [reserved[index % len(reserved)]]
+            )
+        cores = self._encode_cores
+        share = cores[index * len(cores) // count:(index + 1) * len(cores) // count]
+        if not share:
+            # Процессов больше, чем ядер — делим ядра по кругу
+            share = [cores[index % len(cores)]]
+        workers = self._requested_workers
+        if workers > 0:
+            # Минимум один слот: иначе видео, попавшие в этот процесс, не обработаются
+            workers = max(1, workers * (index + 1) // count - workers * index // count)
+        self._layout(share, workers)
+
+    def pin_bot(self) -> None:
+        """
+        Привязывает процесс бота к зарезервированным ядрам — на ядра энкодеров
+        event loop не выходит (ffmpeg получают свои наборы CPU в _preexec)
+        """
+        if self.bot_cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.bot_cpus)
+
+    def _slot_queue(self) -> asyncio.Queue:
+        # Очередь создаем лениво, уже внутри работающего event loop
+        if self._slots is None:
+            self._slots = asyncio.Queue()
+            for slot in range(self.workers):
+                self._slots.put_nowait(slot)
+        return self._slots
+
+    def _with_threads(self, cmd: List[str]) -> List[str]:
+        """Явное число потоков для декодера, фильтров и энкодера"""
+        if not cmd or Path(cmd[0]).name != "ffmpeg":
+            return cmd
+        t = str(self.threads)
+        cmd = [cmd[0], '-filter_threads', t, '-filter_complex_threads', t] + cmd[1:]
+        if '-i' in cmd:
+            i = cmd.index('-i')
+            cmd = cmd[:i] + ['-threads', t] + cmd[i:]
+        # Перед выходным файлом — потоки энкодера
+        return cmd[:-1] + ['-threads', t, cmd[-1]]
+
+    def _preexec(self, cpus: List[int]):
+        nice = self.nice
+
+        def setup() -> None:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, cpus)
+            if nice:
+                os.nice(nice)
+        return setup
+
+    async def run(self, cmd: List[str], timeout: float = 600, text: bool = True) -> subprocess.CompletedProcess:
+        """
+        Запускает команду в свободном слоте пула
+
+        Args:
+            text: Декодировать вывод в str (False — сырые байты, например rawvideo из пайпа)
+
+        Returns:
+            CompletedProcess (returncode -1 при таймауте)
+        """
+        slots = self._slot_queue()
+        slot = await slots.get()
+        try:
+            cmd = self._with_threads(cmd)
+            if self._ionice:
+                # best-effort, низший приоритет ввода-вывода
+                cmd = [self._ionice, '-c', '2', '-n', '7'] + cmd
+
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                preexec_fn=self._preexec(self.cpu_sets[slot]),
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                proc.kill()
+                await proc.wait()
+                raise
+            if text:
+                stdout, stderr = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+        except asyncio.TimeoutError:
+            print(f"❌ Таймаут ffmpeg ({timeout}s)")
+            return subprocess.CompletedProcess(cmd, -1, "" if text else b"", "timeout" if text else b"timeout")
+        finally:
+            slots.put_nowait(slot)
+
+
+encoder_pool = EncoderPool(
+    workers=ENCODE_WORKERS,
+    threads=ENCODE_THREADS,
+    reserved_cores=ENCODE_RESERVED_CORES,
+    nice=ENCODE_NICE,
+)
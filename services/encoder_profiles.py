@@ -0,0 +1,104 @@
+# services/encoder_profiles.py
+"""
+Настройки libx264 (preset / crf / tune) для каждого эффекта и размера исходника.
+
+Профили подбирает scripts/encoder_autotune.py на корпусе реальных видео
+и сохраняет в ENCODER_PROFILES_PATH. Если файла нет или в нем нет нужного
+эффекта — используется прежнее -crf 23 -preset medium.
+"""
+import json
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from config import ENCODER_PROFILES_PATH
+
+PROFILES_VERSION = 1
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    preset: str = "medium"
+    crf: int = 23
+    tune: Optional[str] = None
+
+    def args(self) -> List[str]:
+        """Аргументы ffmpeg для видеопотока"""
+        args = ['-c:v', 'libx264', '-crf', str(self.crf), '-preset', self.preset]
+        if self.tune:
+            args += ['-tune', self.tune]
+        return args + ['-pix_fmt', 'yuv420p']
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EncoderProfile":
+        return cls(preset=data["preset"], crf=int(data["crf"]), tune=data.get("tune") or None)
+
+
+DEFAULT_PROFILE = EncoderProfile()
+# Lossless — эталон для сравнения качества в автотюнинге
+LOSSLESS_PROFILE = EncoderProfile(preset="ultrafast", crf=0)
+
+
+def resolution_bucket(width: Optional[int], height: Optional[int]) -> str:
+    """Группа исходников по размеру кадра (по длинной стороне)"""
+    if not width or not height:
+        return "default"
+    long_side = max(width, height)
+    if long_side <= 1280:
+        return "720p"
+    if long_side <= 1920:
+        return "1080p"
+    return "4k"
+
+
+class EncoderProfiles:
+    """Профили кодирования по эффекту и группе разрешения"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._profiles: Dict[str, Dict[str, EncoderProfile]] = {}
+
+    def load(self) -> None:
+        """Читает файл профилей (молча оставляет значения по умолчанию, если его нет)"""
+        if not os.path.exists(self.path):
+            self._profiles = {}
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != PROFILES_VERSION:
+                raise ValueError(f"неизвестная версия {data.get('version')}")
+            self._profiles = {
+                effect: {bucket: EncoderProfile.from_dict(p) for bucket, p in buckets.items()}
+                for effect, buckets in data.get("profiles", {}).items()
+            }
+        except Exception as e:
+            print(f"❌ Ошибка чтения профилей кодирования {self.path}: {e}")
+            self._profiles = {}
+
+    def get(self, effect: str, width: Optional[int] = None, height: Optional[int] = None) -> EncoderProfile:
+        buckets = self._profiles.get(effect, {})
+        return buckets.get(resolution_bucket(width, height)) or buckets.get("default") or DEFAULT_PROFILE
+
+
+def save_profiles(path: str, profiles: Dict[str, Dict[str, EncoderProfile]], meta: Optional[dict] = None) -> None:
+    """Сохраняет профили в формате, который читает EncoderProfiles.load"""
+    data = {
+        "version": PROFILES_VERSION,
+        **(meta or {}),
+        "profiles": {
+            effect: {bucket: p.to_dict() for bucket, p in buckets.items()}
+            for effect, buckets in profiles.items()
+        },
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+encoder_profiles = EncoderProfiles(ENCODER_PROFILES_PATH)
+encoder_profiles.load()
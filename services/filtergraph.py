@@ -0,0 +1,138 @@
+# services/filtergraph.py
+"""
+Сборка filter_complex для эффектов.
+
+Правила, которых держимся во всех графах:
+  1. Сначала уменьшаем кадр до нужного размера, потом применяем попиксельные
+     фильтры (eq, overlay) — 4K-исходник не должен проходить eq в 4K.
+  2. Никогда не увеличиваем кадр раньше времени (scale только вниз).
+  3. Альфа-канал нужен только там, где он реально используется: скругление
+     углов делается маленькими RGBA-плашками в углах, а не переводом всего
+     кадра в rgba.
+"""
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+# Итоговый холст
+OUT_W, OUT_H = 1080, 1920
+
+# Trending Frame
+FRAME_W, FRAME_H = 1000, 1380
+FRAME_TOP = 165
+FRAME_SIDE = 40
+CORNER_RADIUS = 50
+
+# Subscribe Bait
+BAIT_W, BAIT_H = 200, 50
+BAIT_BOTTOM = 250
+
+ASSETS_DIR = Path(tempfile.gettempdir()) / "botunik_assets"
+
+
+def _scale_by(factor: str) -> str:
+    # round(x/2)*2 — чётные размеры для yuv420p без потери пикселя на float-погрешности
+    return f"scale=w='round(iw*{factor}/2)*2':h='round(ih*{factor}/2)*2'"
+
+
+def downscale_cover(w: int, h: int) -> str:
+    """Уменьшает кадр до минимального размера, который ещё покрывает w x h (без апскейла)"""
+    return _scale_by(f"min(1,max({w}/iw,{h}/ih))")
+
+
+def downscale_fit(w: int, h: int) -> str:
+    """Уменьшает кадр так, чтобы он вписался в w x h (без апскейла)"""
+    return _scale_by(f"min(1,min({w}/iw,{h}/ih))")
+
+
+def corner_mask_path() -> str:
+    """RGBA-плашка одного угла (верхний левый): чёрное вне четверти круга, прозрачное внутри"""
+    path = ASSETS_DIR / f"corner_{CORNER_RADIUS}.png"
+    if not path.exists():
+        ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+        r = CORNER_RADIUS
+        img = Image.new("RGBA", (r, r), (0, 0, 0, 255))
+        draw = ImageDraw.Draw(img)
+        draw.pieslice((0, 0, 2 * r, 2 * r), 180, 270, fill=(0, 0, 0, 0))
+        tmp = path.with_suffix(".tmp.png")
+        img.save(tmp)
+        tmp.replace(path)
+    return str(path)
+
+
+def bait_image_path(source_path: Path) -> str:
+    """Картинка Subscribe Bait, заранее уменьшенная до BAIT_W x BAIT_H"""
+    path = ASSETS_DIR / f"bait_{BAIT_W}x{BAIT_H}_{int(source_path.stat().st_mtime)}.png"
+    if not path.exists():
+        ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+        with Image.open(source_path) as img:
+            resized = img.convert("RGB").resize((BAIT_W, BAIT_H), Image.LANCZOS)
+        tmp = path.with_suffix(".tmp.png")
+        resized.save(tmp)
+        tmp.replace(path)
+    return str(path)
+
+
+def normalize_chain() -> str:
+    """16:9 → 9:16: вписываем в холст и добиваем чёрными полями"""
+    return (
+        f"scale={OUT_W}:{OUT_H}:force_original_aspect_ratio=decrease,"
+        f"pad={OUT_W}:{OUT_H}:(ow-iw)/2:(oh-ih)/2:black"
+    )
+
+
+def ultra_unique_chain(brightness_value: float, speed: float, cover_w: int = OUT_W, cover_h: int = OUT_H) -> str:
+    """Яркость + ускорение; кадр предварительно уменьшен до покрытия cover_w x cover_h"""
+    return (
+        f"{downscale_cover(cover_w, cover_h)},"
+        f"eq=brightness={brightness_value},"
+        f"setpts=PTS/{speed}"
+    )
+
+
+def trending_frame_graph(src: str, corner: str, out: str) -> str:
+    """Рамка со скруглёнными углами: crop → 4 угловые плашки → pad"""
+    return (
+        f"[{src}]scale={FRAME_W}:{FRAME_H}:force_original_aspect_ratio=increase,"
+        f"crop={FRAME_W}:{FRAME_H}[tf_sv];"
+        # Плашка — одиночный кадр, поэтому flip'ы выполняются один раз
+        f"[{corner}]split=4[tf_c0][tf_c1][tf_c2][tf_c3];"
+        f"[tf_c1]hflip[tf_tr];[tf_c2]vflip[tf_bl];[tf_c3]hflip,vflip[tf_br];"
+        f"[tf_sv][tf_c0]overlay=0:0:format=yuv420[tf_o0];"
+        f"[tf_o0][tf_tr]overlay=W-w:0:format=yuv420[tf_o1];"
+        f"[tf_o1][tf_bl]overlay=0:H-h:format=yuv420[tf_o2];"
+        f"[tf_o2][tf_br]overlay=W-w:H-h:format=yuv420[tf_o3];"
+        f"[tf_o3]pad={OUT_W}:{OUT_H}:{FRAME_SIDE}:{FRAME_TOP}:black,format=yuv420p[{out}]"
+    )
+
+
+def subscribe_bait_graph(src: str, image: str, out: str, fit_canvas: bool = True) -> str:
+    """
+    Наложение готовой (уже уменьшенной) картинки подписки
+
+    fit_canvas — вписать кадр в холст так же, как normalize (в том же энкоде);
+    на уже нормализованном входе scale и pad ничего не меняют
+    """
+    prefix = f"[{src}]{normalize_chain()}[sb_v];" if fit_canvas else f"[{src}]null[sb_v];"
+    return (
+        prefix +
+        f"[sb_v][{image}]overlay=(W-w)/2:H-h-{BAIT_BOTTOM}:format=yuv420[{out}]"
+    )
+
+
+def all_effects_graph(brightness_value: float, speed: float) -> str:
+    """
+    Ultra Unique → Trending Frame → Subscribe Bait одним графом (один энкод).
+
+    Входы: 0 — видео, 1 — угловая плашка, 2 — картинка подписки.
+    Выходы: [v] и [a].
+    """
+    return (
+        # Trending Frame всё равно обрежет до FRAME_W x FRAME_H — уменьшаем сразу до него
+        f"[0:v]{ultra_unique_chain(brightness_value, speed, FRAME_W, FRAME_H)}[uu];"
+        f"{trending_frame_graph('uu', '1:v', 'tf')};"
+        # После pad кадр уже OUT_W x OUT_H — scale в Subscribe Bait не нужен
+        f"{subscribe_bait_graph('tf', '2:v', 'v', fit_canvas=False)};"
+        f"[0:a]atempo={speed}[a]"
+    )
@@ -0,0 +1,209 @@
+# services/fingerprint.py
+import asyncio
+import struct
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from config import FINGERPRINT_MAX_DISTANCE
+from services.encoder_pool import encoder_pool
+
+# Сколько кадров берём из видео (равномерно по длительности)
+FRAMES_PER_VIDEO = 16
+# Размер кадра для dHash: 9x8 в оттенках серого → 64 бита
+HASH_W, HASH_H = 9, 8
+# LSH: делим 64-битный хеш на 4 полосы по 16 бит
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def dhash_frame(pixels: bytes) -> int:
+    """dHash одного кадра 9x8 (gray): 1 бит на сравнение соседних пикселей в строке"""
+    value = 0
+    for y in range(HASH_H):
+        row = pixels[y * HASH_W:(y + 1) * HASH_W]
+        for x in range(HASH_W - 1):
+            value = (value << 1) | (1 if row[x] < row[x + 1] else 0)
+    return value
+
+
+def pack_fingerprint(hashes: Sequence[int]) -> bytes:
+    """Упаковывает последовательность хешей в BYTEA (8 байт на кадр)"""
+    return struct.pack(f">{len(hashes)}Q", *hashes)
+
+
+def unpack_fingerprint(data: bytes) -> Tuple[int, ...]:
+    """Обратная операция к pack_fingerprint"""
+    return struct.unpack(f">{len(data) // 8}Q", data)
+
+
+def sequence_distance(a: Sequence[int], b: Sequence[int]) -> float:
+    """Средняя дистанция Хэмминга между кадрами двух отпечатков"""
+    n = min(len(a), len(b))
+    if n == 0:
+        return 64.0
+    total = sum(bin(x ^ y).count("1") for x, y in zip(a[:n], b[:n]))
+    # Штраф за разную длину, чтобы короткий клип не совпадал с длинным
+    total += 64 * abs(len(a) - len(b))
+    return total / max(len(a), len(b))
+
+
+async def _probe_duration(input_path: str) -> float:
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        input_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    try:
+        return float(out.decode().strip())
+    except ValueError:
+        return 0.0
+
+
+async def compute_fingerprint(input_path: str, duration: Optional[float] = None) -> Optional[Tuple[int, ...]]:
+    """
+    Считает перцептивный отпечаток видео
+
+    Args:
+        input_path: Путь к видео
+        duration: Длительность в секундах (если известна, например из Telegram)
+
+    Returns:
+        Кортеж 64-битных dHash по FRAMES_PER_VIDEO кадрам или None при ошибке
+    """
+    try:
+        if not duration:
+            duration = await _probe_duration(input_path)
+        if duration <= 0:
+            return None
+
+        # Берём кадры равномерно по длительности и сразу уменьшаем до 9x8,
+        # так что декодер отдаёт в пайп всего 72 байта на кадр.
+        # Через пул: те же nice/ядра, что у энкодов, и kill по таймауту
+        fps = FRAMES_PER_VIDEO / duration
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-i', input_path,
+            '-an',
+            '-vf', f'fps={fps:.6f},scale={HASH_W}:{HASH_H}:flags=area,format=gray',
+            '-frames:v', str(FRAMES_PER_VIDEO),
+            '-f', 'rawvideo', '-',
+        ]
+        result = await encoder_pool.run(cmd, timeout=120, text=False)
+        if result.returncode != 0:
+            return None
+        raw = result.stdout
+
+        frame_size = HASH_W * HASH_H
+        hashes = tuple(
+            dhash_frame(raw[i:i + frame_size])
+            for i in range(0, len(raw) - frame_size + 1, frame_size)
+        )
+        return hashes or None
+
+    except Exception as e:
+        print(f"❌ Ошибка вычисления отпечатка: {e}")
+        return None
+
+
+@dataclass
+class FingerprintEntry:
+    file_unique_id: str
+    effect: str
+    hashes: Tuple[int, ...]
+    result_file_id: str
+
+
+class VideoFingerprintIndex:
+    """
+    In-memory индекс отпечатков обработанных видео (banded LSH).
+
+    Каждый кадровый хеш режется на BANDS полос; видео попадает в корзины
+    (effect, номер полосы, значение полосы). Кандидаты — записи, у которых
+    совпало достаточно полос, затем проверяются точной дистанцией.
+    """
+
+    def __init__(self, max_distance: float = 10.0, min_band_hits: int = 4):
+        self.max_distance = max_distance
+        self.min_band_hits = min_band_hits
+        self._entries: List[FingerprintEntry] = []
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[Tuple[str, int, int], Set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _informative(h: int) -> bool:
+        # Почти однотонные кадры (чёрные заставки) дают вырожденные хеши
+        # и раздувают корзины — такие не индексируем
+        bits = bin(h).count("1")
+        return 4 <= bits <= 60
+
+    def _band_keys(self, effect: str, hashes: Sequence[int]):
+        for h in hashes:
+            if not self._informative(h):
+                continue
+            for band in range(BANDS):
+                yield (effect, band, (h >> (band * BAND_BITS)) & BAND_MASK)
+
+    def add(self, file_unique_id: str, effect: str, hashes: Sequence[int], result_file_id: str) -> None:
+        """Добавляет (или обновляет) запись в индексе"""
+        key = (file_unique_id, effect)
+        idx = self._exact.get(key)
+        if idx is not None:
+            # Отпечаток мог измениться (upsert в БД) — переносим запись по корзинам
+            entry = self._entries[idx]
+            for bucket in self._band_keys(effect, entry.hashes):
+                self._buckets[bucket].discard(idx)
+                if not self._buckets[bucket]:
+                    del self._buckets[bucket]
+            entry.hashes = tuple(hashes)
+            entry.result_file_id = result_file_id
+        else:
+            idx = len(self._entries)
+            self._entries.append(FingerprintEntry(file_unique_id, effect, tuple(hashes), result_file_id))
+            self._exact[key] = idx
+        for bucket in self._band_keys(effect, hashes):
+            self._buckets[bucket].add(idx)
+
+    def load(self, rows: List[dict]) -> None:
+        """Загружает индекс из строк public.video_fingerprints"""
+        for row in rows:
+            self.add(
+                row["file_unique_id"],
+                row["effect"],
+                unpack_fingerprint(bytes(row["fingerprint"])),
+                row["result_file_id"],
+            )
+
+    def lookup_exact(self, file_unique_id: str, effect: str) -> Optional[str]:
+        """Результат для того же файла Telegram (без скачивания)"""
+        idx = self._exact.get((file_unique_id, effect))
+        return self._entries[idx].result_file_id if idx is not None else None
+
+    def find_similar(self, hashes: Sequence[int], effect: str) -> Optional[FingerprintEntry]:
+        """Ищет почти идентичное видео, обработанное тем же эффектом"""
+        hits: Dict[int, int] = defaultdict(int)
+        for bucket in self._band_keys(effect, hashes):
+            for idx in self._buckets.get(bucket, ()):
+                hits[idx] += 1
+
+        best: Optional[FingerprintEntry] = None
+        best_distance = self.max_distance
+        for idx, count in hits.items():
+            if count < self.min_band_hits:
+                continue
+            entry = self._entries[idx]
+            distance = sequence_distance(hashes, entry.hashes)
+            if distance <= best_distance:
+                best, best_distance = entry, distance
+        return best
+
+
+fingerprint_index = VideoFingerprintIndex(max_distance=FINGERPRINT_MAX_DISTANCE)
@@ -0,0 +1,115 @@
+# services/http_client.py
+import asyncio
+import random
+from typing import Optional, Tuple
+
+import aiohttp
+
+from config import (
+    HTTP_POOL_LIMIT,
+    HTTP_LIMIT_PER_HOST,
+    HTTP_TIMEOUT_SEC,
+    HTTP_CONNECT_TIMEOUT_SEC,
+    HTTP_RETRIES,
+)
+
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 8.0
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для внешних API (CryptoBot и др.).
+
+    Одна aiohttp-сессия на весь процесс: пул keep-alive соединений, кэш DNS,
+    ограничение одновременных запросов на хост, таймауты и повторы с
+    экспоненциальной задержкой и джиттером.
+    """
+
+    def __init__(self, limit: int, limit_per_host: int, timeout_sec: float,
+                 connect_timeout_sec: float, retries: int):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout_sec, connect=connect_timeout_sec)
+        self.retries = retries
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SEC * 4)
+            except ValueError:
+                pass
+        # Full jitter: случайная задержка от 0 до base * 2^attempt
+        return random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** attempt))
+
+    async def request_json(self, method: str, url: str, *, idempotent: bool = True,
+                           **kwargs) -> Tuple[int, Optional[dict]]:
+        """
+        Выполняет запрос и разбирает JSON-ответ
+
+        Args:
+            method: GET / POST / ...
+            url: Адрес
+            idempotent: Можно ли повторять запрос, который мог дойти до сервера.
+                Неидемпотентные (например, создание инвойса) повторяются только
+                если соединение не удалось установить
+            **kwargs: Параметры aiohttp (params, json, headers, ...)
+
+        Returns:
+            (HTTP статус, JSON или None); статус 0 — запрос не удался
+        """
+        await self.start()
+        attempts = self.retries + 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                async with self._session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and idempotent and not last:
+                        delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                        await asyncio.sleep(delay)
+                        continue
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        data = None
+                    return response.status, data
+            except aiohttp.ClientConnectorError as e:
+                # Соединение не установлено — запрос точно не дошел, повторять безопасно
+                if last:
+                    print(f"❌ HTTP {method} {url}: {e}")
+                    return 0, None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not idempotent or last:
+                    print(f"❌ HTTP {method} {url}: {e!r}")
+                    return 0, None
+            await asyncio.sleep(self._backoff(attempt))
+        return 0, None
+
+
+http_client = HttpClient(
+    limit=HTTP_POOL_LIMIT,
+    limit_per_host=HTTP_LIMIT_PER_HOST,
+    timeout_sec=HTTP_TIMEOUT_SEC,
+    connect_timeout_sec=HTTP_CONNECT_TIMEOUT_SEC,
+    retries=HTTP_RETRIES,
+)
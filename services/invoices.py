@@ -0,0 +1,249 @@
+# services/invoices.py
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import (
+    INVOICE_POLL_INTERVAL_SEC,
+    INVOICE_TIMEOUT_SEC,
+    CRYPTO_WEBHOOK_ENABLED,
+    INVOICE_RECONCILE_INTERVAL_SEC,
+)
+from database.user import db
+from services.cryptobot import get_invoices
+from services.send_queue import send_queue, PRIORITY_PAYMENT
+
+# getInvoices отдает до 1000 инвойсов, но длинный query string лучше не раздувать
+INVOICE_BATCH_SIZE = 100
+
+
+# Результаты credit_paid_invoice
+CREDITED = "credited"
+ALREADY_CREDITED = "already_credited"
+CREDIT_FAILED = "failed"
+
+# Инвойсы, о задержке зачисления которых пользователь уже предупрежден
+# (повторные попытки вебхука и опроса не должны слать это снова)
+_delay_warned: set = set()
+
+
+async def credit_paid_invoice(bot: Bot, invoice_id: int, user_id: int, amount: float, asset: str) -> str:
+    """
+    Зачисляет оплаченный инвойс на баланс и уведомляет пользователя
+
+    Зачисление атомарно в БД (db.credit_invoice), поэтому вебхук, фоновый
+    опрос и другие процессы бота могут вызывать его одновременно.
+
+    Returns:
+        CREDITED — зачислен сейчас, ALREADY_CREDITED — уже был зачислен,
+        CREDIT_FAILED — ошибка БД: инвойс нужно попробовать зачислить снова
+    """
+    try:
+        new_balance = await db.credit_invoice(invoice_id, user_id, amount, asset)
+    except Exception as e:
+        print(f"❌ Ошибка при обработке оплаченного инвойса {invoice_id}: {e}")
+        if invoice_id not in _delay_warned:
+            _delay_warned.add(invoice_id)
+            try:
+                await send_queue.send_message(
+                    bot, user_id,
+                    "⚠️ <b>Платеж получен, зачисление задерживается</b>\n\n"
+                    "Средства поступят на баланс автоматически. Если этого не произойдет, "
+                    "обратитесь в поддержку.\n\n"
+                    f"🆔 ID инвойса: <code>{invoice_id}</code>",
+                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                        [InlineKeyboardButton(text="🌐 Поддержка", url="https://t.me/makker_o")]
+                    ]),
+                    priority=PRIORITY_PAYMENT
+                )
+            except Exception as e:
+                print(f"❌ Ошибка уведомления о задержке инвойса {invoice_id}: {e}")
+        return CREDIT_FAILED
+    _delay_warned.discard(invoice_id)
+
+    # Инвойс уже зачислен (другим обработчиком или раньше)
+    if new_balance is None:
+        return ALREADY_CREDITED
+
+    print(f"✅ Инвойс {invoice_id} оплачен и обработан для пользователя {user_id}")
+    try:
+        # Отправляем уведомление пользователю
+        await send_queue.send_message(
+            bot, user_id,
+            "✅ <b>Платеж успешно получен!</b>\n\n"
+            f"💰 Зачислено: {amount} {asset}\n"
+            f"💳 Новый баланс: {new_balance} $\n\n"
+            f"🆔 ID инвойса: <code>{invoice_id}</code>\n\n"
+            "Спасибо за пополнение! 🎉",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🚹 Профиль", callback_data="profile")]
+            ]),
+            priority=PRIORITY_PAYMENT
+        )
+    except Exception as e:
+        # Деньги уже зачислены — не сообщаем об ошибке платежа
+        print(f"❌ Ошибка уведомления об оплате инвойса {invoice_id}: {e}")
+    return CREDITED
+
+
+@dataclass
+class PendingInvoice:
+    invoice_id: int
+    user_id: int
+    amount: float
+    asset: str
+    deadline: float
+    # Оплачен, но зачислить не удалось — не отменяем по таймауту, пробуем снова
+    paid: bool = False
+
+
+class InvoiceScheduler:
+    """
+    Проверка всех ожидающих оплаты инвойсов одним таймером.
+
+    Раз в poll_interval все ожидающие инвойсы запрашиваются пачками через
+    getInvoices?invoice_ids=a,b,c; переходы в paid / expired обрабатываются
+    сразу. Таймаут ожидания оплаты берется из min-кучи по дедлайнам.
+    """
+
+    def __init__(self, poll_interval: float, timeout: float, batch_size: int = INVOICE_BATCH_SIZE):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._pending: Dict[int, PendingInvoice] = {}
+        self._deadlines: List[Tuple[float, int]] = []
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, invoice_id: int, user_id: int, amount: float, asset: str) -> None:
+        """Ставит инвойс на автоматическую проверку"""
+        deadline = time.monotonic() + self.timeout
+        self._pending[invoice_id] = PendingInvoice(invoice_id, user_id, amount, asset, deadline)
+        heapq.heappush(self._deadlines, (deadline, invoice_id))
+
+    def discard(self, invoice_id: int) -> Optional[PendingInvoice]:
+        """Снимает инвойс с проверки (запись в куче отбросится при извлечении)"""
+        return self._pending.pop(invoice_id, None)
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"❌ Ошибка в фоновой проверке инвойсов: {e}")
+
+    async def poll(self) -> None:
+        """Один проход: статусы всех ожидающих инвойсов, затем таймауты"""
+        ids = list(self._pending)
+        checked = set()
+        for i in range(0, len(ids), self.batch_size):
+            batch = ids[i:i + self.batch_size]
+            items = await get_invoices(batch)
+            if items is None:
+                continue
+            checked.update(batch)
+            for item in items:
+                try:
+                    await self._dispatch(item)
+                except Exception as e:
+                    print(f"❌ Ошибка обработки инвойса {item.get('invoice_id')}: {e}")
+        await self._expire_overdue(checked)
+
+    async def _dispatch(self, item: dict) -> None:
+        status = item.get("status")
+        if status not in ("paid", "expired"):
+            return
+        invoice = self._pending.get(int(item.get("invoice_id")))
+        if invoice is None:
+            return
+
+        if status == "paid":
+            result = await credit_paid_invoice(
+                self._bot, invoice.invoice_id, invoice.user_id, invoice.amount, invoice.asset
+            )
+            if result == CREDIT_FAILED:
+                # Остается в проверке: следующий проход зачислит снова
+                invoice.paid = True
+                return
+            self.discard(invoice.invoice_id)
+        else:
+            self.discard(invoice.invoice_id)
+            # Инвойс истек
+            await send_queue.send_message(
+                self._bot, invoice.user_id,
+                "⌛ <b>Время оплаты истекло</b>\n\n"
+                f"Инвойс на сумму {invoice.amount} {invoice.asset} был отменен.\n"
+                f"🆔 ID инвойса: <code>{invoice.invoice_id}</code>\n\n"
+                "Создайте новый инвойс для пополнения баланса.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="💰 Пополнить снова", callback_data="cryptobotadd")]
+                ]),
+                priority=PRIORITY_PAYMENT
+            )
+            print(f"⌛ Инвойс {invoice.invoice_id} истек для пользователя {invoice.user_id}")
+
+    async def _expire_overdue(self, checked: set) -> None:
+        now = time.monotonic()
+        unchecked = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, invoice_id = heapq.heappop(self._deadlines)
+            invoice = self._pending.get(invoice_id)
+            # Инвойс уже обработан или поставлен заново с новым дедлайном
+            if invoice is None or invoice.deadline != deadline:
+                continue
+            if invoice.paid:
+                continue  # Оплачен — не отменяем, зачисление повторится при опросе
+            if invoice_id not in checked:
+                # API не ответил — не отменяем вслепую, ждем следующего прохода
+                unchecked.append((deadline, invoice_id))
+                continue
+            del self._pending[invoice_id]
+            # Статус этого инвойса только что был проверен в poll — он все еще active
+            try:
+                await send_queue.send_message(
+                    self._bot, invoice.user_id,
+                    "❌ <b>Заказ отменен</b>\n\n"
+                    f"Время ожидания оплаты истекло ({int(self.timeout // 60)} минут).\n"
+                    f"Инвойс на сумму {invoice.amount} {invoice.asset} отменен.\n\n"
+                    f"🆔 ID инвойса: <code>{invoice_id}</code>\n\n"
+                    "Вы можете создать новый инвойс для пополнения.",
+                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                        [InlineKeyboardButton(text="💰 Пополнить снова", callback_data="cryptobotadd")]
+                    ]),
+                    priority=PRIORITY_PAYMENT
+                )
+            except Exception as e:
+                print(f"❌ Ошибка уведомления об отмене инвойса {invoice_id}: {e}")
+            print(f"❌ Инвойс {invoice_id} отменен по таймауту для пользователя {invoice.user_id}")
+        for entry in unchecked:
+            heapq.heappush(self._deadlines, entry)
+
+
+invoice_scheduler = InvoiceScheduler(
+    # С вебхуком оплаты приходят сразу, опрос только подбирает потерянные уведомления
+    poll_interval=INVOICE_RECONCILE_INTERVAL_SEC if CRYPTO_WEBHOOK_ENABLED else INVOICE_POLL_INTERVAL_SEC,
+    timeout=INVOICE_TIMEOUT_SEC,
+)
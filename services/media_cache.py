@@ -0,0 +1,155 @@
+# services/media_cache.py
+import os
+import secrets
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from config import MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_TTL_SEC
+
+# Недописанный файл старше этого точно брошен (процесс упал посреди записи);
+# более свежие может прямо сейчас писать другой воркер
+STALE_TMP_SEC = 3600
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    # Жёсткая ссылка: байты не дублируются, и файл переживает вытеснение из кэша
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class MediaCache:
+    """
+    Дисковый LRU-кэш исходников и промежуточных файлов по file_unique_id.
+
+    Раскладка: <root>/<file_unique_id>/<kind><suffix>, где kind —
+    "original" (скачанный файл) или "normalized" (1080x1920).
+    Время последнего обращения хранится в mtime, поэтому порядок LRU
+    восстанавливается после перезапуска. Каталог общий для воркеров вебхука,
+    индекс и бюджет — у каждого свои (см. share).
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl_sec: float):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Path, int]]" = OrderedDict()
+        self._total = 0
+
+    def share(self, count: int) -> None:
+        """Доля бюджета одного из count процессов, пишущих в общий каталог"""
+        self.max_bytes = self.max_bytes // max(1, count)
+
+    def scan(self) -> None:
+        """Перестраивает индекс по содержимому каталога"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = []
+        now = time.time()
+        for key_dir in self.root.iterdir():
+            if not key_dir.is_dir():
+                continue
+            for path in key_dir.iterdir():
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue  # Вытеснил или переименовал другой воркер
+                if path.name.startswith("."):
+                    # Недописанный файл: удаляем, только если его давно бросили
+                    if now - st.st_mtime > STALE_TMP_SEC:
+                        path.unlink(missing_ok=True)
+                    continue
+                found.append((st.st_mtime, key_dir.name, path.stem, path, st.st_size))
+
+        self._entries.clear()
+        self._total = 0
+        for _, key, kind, path, size in sorted(found):
+            self._entries[(key, kind)] = (path, size)
+            self._total += size
+        self._evict()
+
+    def _drop(self, entry_key: Tuple[str, str]) -> None:
+        path, size = self._entries.pop(entry_key)
+        self._total -= size
+        path.unlink(missing_ok=True)
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        now = time.time()
+        # Сначала протухшие по TTL (с головы — самые давние)
+        for entry_key, (path, _) in list(self._entries.items()):
+            try:
+                expired = now - path.stat().st_mtime > self.ttl_sec
+            except FileNotFoundError:
+                expired = True
+            if not expired:
+                break
+            self._drop(entry_key)
+        # Потом по бюджету
+        while self._total > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def get_into(self, key: str, kind: str, dest_dir: str) -> Optional[str]:
+        """
+        Достаёт файл из кэша в dest_dir
+
+        Returns:
+            Путь к файлу в dest_dir или None при промахе
+        """
+        entry = self._entries.get((key, kind))
+        if entry is None:
+            return None
+        path, _ = entry
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_sec:
+                self._drop((key, kind))
+                return None
+            dest = Path(dest_dir) / f"{kind}_cached{path.suffix}"
+            _link_or_copy(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            self._entries.pop((key, kind), None)
+            self._total -= entry[1]
+            return None
+        self._entries.move_to_end((key, kind))
+        return str(dest)
+
+    def put(self, key: str, kind: str, src_path: str) -> None:
+        """Кладёт файл в кэш (исходный файл остаётся на месте)"""
+        try:
+            src = Path(src_path)
+            size = src.stat().st_size
+            if size > self.max_bytes:
+                return
+            key_dir = self.root / key
+            key_dir.mkdir(parents=True, exist_ok=True)
+            final = key_dir / f"{kind}{src.suffix}"
+            # Свое имя на каждую запись: тот же файл может класть и другой воркер
+            tmp = key_dir / f".{kind}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+            try:
+                _link_or_copy(src, tmp)
+                os.utime(tmp)
+                tmp.replace(final)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+
+            old = self._entries.pop((key, kind), None)
+            if old is not None:
+                self._total -= old[1]
+                if old[0] != final:
+                    old[0].unlink(missing_ok=True)
+            self._entries[(key, kind)] = (final, size)
+            self._total += size
+            self._evict()
+        except Exception as e:
+            print(f"❌ Ошибка записи в кэш медиа: {e}")
+
+
+media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_TTL_SEC)
@@ -0,0 +1,169 @@
+# services/media_catalog.py
+"""
+Каталог шрифтов и музыки в памяти процесса.
+
+Таблицы fonts и music маленькие и меняются только из админки, а читаются
+постоянно — поэтому целиком загружаются при старте, и количество, поиск
+по id и случайный трек отдаются без запросов к БД. Согласованность между
+процессами бота держат триггеры (create_tables.py): каждое изменение строки
+шлет NOTIFY media_catalog с "таблица:операция:id", и каталог перечитывает
+одну строку. После потери LISTEN-соединения каталог переподключается и
+загружается заново — пропущенные уведомления не теряются.
+"""
+import asyncio
+import random
+from typing import Dict, List, Optional
+
+from database.user import db
+
+CHANNEL = "media_catalog"
+RECONNECT_DELAY_SEC = 5
+# Как часто проверять, живо ли LISTEN-соединение, когда уведомлений нет
+HEALTH_CHECK_SEC = 30
+
+# Таблица -> (загрузка всех строк, чтение строки по id)
+TABLES = {
+    "fonts": (db.get_all_fonts, db.get_font_by_id),
+    "music": (db.get_all_music, db.get_music_by_id),
+}
+
+
+class _Table:
+    """Строки по id + список id для случайного выбора за O(1)"""
+
+    def __init__(self):
+        self.rows: Dict[int, dict] = {}
+        self._ids: List[int] = []
+        self._pos: Dict[int, int] = {}
+
+    def replace(self, rows: list) -> None:
+        self.rows = {row["id"]: row for row in rows}
+        self._ids = list(self.rows)
+        self._pos = {row_id: i for i, row_id in enumerate(self._ids)}
+
+    def put(self, row: dict) -> None:
+        row_id = row["id"]
+        if row_id not in self.rows:
+            self._pos[row_id] = len(self._ids)
+            self._ids.append(row_id)
+        self.rows[row_id] = row
+
+    def remove(self, row_id: int) -> None:
+        if self.rows.pop(row_id, None) is None:
+            return
+        # Последний id встает на место удаленного
+        i = self._pos.pop(row_id)
+        last = self._ids.pop()
+        if last != row_id:
+            self._ids[i] = last
+            self._pos[last] = i
+
+    def random(self) -> Optional[dict]:
+        if not self._ids:
+            return None
+        return self.rows[random.choice(self._ids)]
+
+
+class MediaCatalog:
+    def __init__(self):
+        self._tables = {name: _Table() for name in TABLES}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loaded = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Чтение (без БД) ---
+
+    def count(self, table: str) -> int:
+        return len(self._tables[table].rows)
+
+    def get(self, table: str, row_id: int) -> Optional[dict]:
+        return self._tables[table].rows.get(row_id)
+
+    def random(self, table: str) -> Optional[dict]:
+        return self._tables[table].random()
+
+    def all(self, table: str) -> list:
+        """Все строки, новые первыми (как в списках админки)"""
+        return sorted(self._tables[table].rows.values(), key=lambda row: row["created_at"], reverse=True)
+
+    # --- Обновление ---
+
+    async def load(self) -> None:
+        for name, (load_all, _) in TABLES.items():
+            self._tables[name].replace(await load_all())
+
+    async def refresh(self, table: str, row_id: int) -> None:
+        """Перечитывает одну строку (после изменения в этом или другом процессе)"""
+        row = await TABLES[table][1](row_id)
+        if row is None:
+            self._tables[table].remove(row_id)
+        else:
+            self._tables[table].put(row)
+
+    def remove(self, table: str, row_id: int) -> None:
+        self._tables[table].remove(row_id)
+
+    async def start(self, timeout: float = 10) -> None:
+        """Подписка на изменения и первая загрузка (ждем ее, но не дольше timeout)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._loaded.wait(), timeout)
+        except asyncio.TimeoutError:
+            print("❌ Каталог шрифтов и музыки не загрузился вовремя, продолжаем загрузку в фоне")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._queue.put_nowait(payload)
+
+    async def _run(self) -> None:
+        while True:
+            conn = None
+            try:
+                # Сначала LISTEN, потом загрузка — изменения во время загрузки придут уведомлениями
+                conn = await db.listen(CHANNEL, self._on_notify)
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                await self.load()
+                self._loaded.set()
+                print(f"📚 Каталог загружен: шрифтов {self.count('fonts')}, треков {self.count('music')}")
+
+                while True:
+                    try:
+                        payload = await asyncio.wait_for(self._queue.get(), HEALTH_CHECK_SEC)
+                    except asyncio.TimeoutError:
+                        if conn.is_closed():
+                            raise ConnectionError("LISTEN-соединение закрыто")
+                        continue
+                    await self._apply(payload)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка каталога шрифтов и музыки: {e}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(RECONNECT_DELAY_SEC)
+
+    async def _apply(self, payload: str) -> None:
+        table, op, row_id = payload.split(":")
+        if table not in self._tables:
+            return
+        if op == "TRUNCATE":
+            self._tables[table].replace([])
+        elif op == "DELETE":
+            self._tables[table].remove(int(row_id))
+        else:
+            await self.refresh(table, int(row_id))
+
+
+media_catalog = MediaCatalog()
@@ -0,0 +1,228 @@
+# services/media_store.py
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from config import MEDIA_STORE_DIR
+from services.storage import storage, StorageBackend
+
+CHUNK_SIZE = 1024 * 1024
+# Сколько файлов одновременно докачивать из общего хранилища
+FETCH_CONCURRENCY = 8
+
+
+class _HashingWriter:
+    """Файл-приемник для bot.download_file: пишет на диск и считает SHA-256 на лету"""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> int:
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        return self._file.write(chunk)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def seek(self, *args) -> int:
+        return self._file.seek(*args)
+
+
+class MediaStore:
+    """
+    Контентно-адресуемое хранилище ассетов, которые загружает админ (шрифты, музыка).
+    Встроенные оверлеи (images/, угловые плашки) лежат в репозитории и ASSETS_DIR.
+
+    Файл лежит по пути <root>/<ab>/<cd>/<sha256><suffix> и после записи
+    не меняется (только чтение), поэтому одинаковые загрузки хранятся один
+    раз, а одноименные разные файлы больше не перезаписывают друг друга.
+    Ссылки на файл — строки public.fonts / public.music с тем же
+    content_hash; файл удаляется, когда последняя ссылка исчезла.
+
+    Локальная папка — рабочая копия; каждый файл публикуется в общее
+    хранилище (services/storage.py) под ключом media/<sha256><suffix>,
+    откуда его забирают воркеры на других узлах.
+    """
+
+    def __init__(self, root: str, backend: StorageBackend):
+        self.root = Path(root)
+        self.backend = backend
+
+    @staticmethod
+    def storage_key(content_hash: str, suffix: str = "") -> str:
+        return f"media/{content_hash}{suffix.lower()}"
+
+    def path_for(self, content_hash: str, suffix: str = "") -> Path:
+        return self.root / content_hash[:2] / content_hash[2:4] / f"{content_hash}{suffix.lower()}"
+
+    def exists(self, content_hash: str, suffix: str = "") -> bool:
+        return self.path_for(content_hash, suffix).exists()
+
+    def _tmp_file(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".incoming-", dir=self.root)
+        return os.fdopen(fd, "wb"), tmp
+
+    def _commit(self, tmp: str, content_hash: str, suffix: str) -> str:
+        """Переносит временный файл на его постоянное место (или выкидывает дубликат)"""
+        final = self.path_for(content_hash, suffix)
+        if final.exists():
+            os.remove(tmp)
+        else:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, final)
+        return str(final)
+
+    async def put_from_telegram(self, bot, telegram_path: str, suffix: str) -> tuple:
+        """
+        Скачивает файл из Telegram прямо в хранилище, считая хеш во время загрузки
+
+        Args:
+            bot: Экземпляр бота
+            telegram_path: file.file_path из bot.get_file
+            suffix: Расширение файла (.ttf, .otf, ...)
+
+        Returns:
+            (content_hash, путь к файлу в хранилище)
+        """
+        fileobj, tmp = self._tmp_file()
+        try:
+            with fileobj:
+                writer = _HashingWriter(fileobj)
+                await bot.download_file(telegram_path, writer)
+            content_hash = writer.sha256.hexdigest()
+            return content_hash, self._commit(tmp, content_hash, suffix)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def put_file(self, src_path: str, suffix: Optional[str] = None,
+                 expected_hash: Optional[str] = None) -> tuple:
+        """
+        Копирует локальный файл в хранилище
+
+        Args:
+            src_path: Исходный файл (остается на месте)
+            suffix: Расширение (по умолчанию — расширение src_path)
+            expected_hash: Если задан — файл с другим хешем не принимается
+
+        Returns:
+            (content_hash, путь к файлу в хранилище)
+        """
+        suffix = Path(src_path).suffix if suffix is None else suffix
+        fileobj, tmp = self._tmp_file()
+        try:
+            with fileobj, open(src_path, "rb") as src:
+                writer = _HashingWriter(fileobj)
+                shutil.copyfileobj(src, writer, CHUNK_SIZE)
+            content_hash = writer.sha256.hexdigest()
+            if expected_hash and content_hash != expected_hash:
+                raise ValueError(f"хеш не совпадает: {content_hash} != {expected_hash}")
+            return content_hash, self._commit(tmp, content_hash, suffix)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    async def publish(self, content_hash: str, suffix: str) -> None:
+        """Кладет локальный файл в общее хранилище (если его там еще нет)"""
+        key = self.storage_key(content_hash, suffix)
+        if not await self.backend.exists(key):
+            await self.backend.put_file(key, str(self.path_for(content_hash, suffix)))
+
+    async def release(self, content_hash: str, suffix: str, refs_left: int) -> None:
+        """Удаляет файл (локально и из общего хранилища), если на него больше не ссылается ни одна строка БД"""
+        if refs_left > 0:
+            return
+        try:
+            await self.backend.delete(self.storage_key(content_hash, suffix))
+        except Exception as e:
+            print(f"❌ Ошибка удаления {content_hash} из хранилища: {e}")
+        path = self.path_for(content_hash, suffix)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        # Чистим опустевшие шард-папки
+        for parent in (path.parent, path.parent.parent):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def missing(self, refs: Iterable[tuple]) -> List[tuple]:
+        """
+        Файлы, на которые ссылается БД, но которых нет локально
+
+        Args:
+            refs: Пары (content_hash, file_path) из db.get_all_content_refs
+
+        Returns:
+            Пары (content_hash, suffix)
+        """
+        entries = {(h, Path(p or "").suffix.lower()) for h, p in refs if h}
+        return sorted((h, s) for h, s in entries if not self.exists(h, s))
+
+    def sync_from(self, source_root: str, refs: Iterable[tuple]) -> int:
+        """
+        Докачивает недостающие файлы из хранилища другого узла (общая папка, rsync-зеркало)
+
+        Returns:
+            Сколько файлов скопировано
+        """
+        source = MediaStore(source_root, self.backend)
+        copied = 0
+        for content_hash, suffix in self.missing(refs):
+            src = source.path_for(content_hash, suffix)
+            if not src.exists():
+                print(f"❌ Нет файла {content_hash}{suffix} в {source_root}")
+                continue
+            try:
+                self.put_file(str(src), suffix, expected_hash=content_hash)
+                copied += 1
+            except Exception as e:
+                print(f"❌ Ошибка синхронизации {content_hash}: {e}")
+        return copied
+
+    async def _fetch_one(self, content_hash: str, suffix: str, sem: asyncio.Semaphore) -> bool:
+        async with sem:
+            fileobj, tmp = self._tmp_file()
+            fileobj.close()
+            try:
+                if not await self.backend.get_file(self.storage_key(content_hash, suffix), tmp):
+                    print(f"❌ Нет файла {content_hash}{suffix} в общем хранилище")
+                    return False
+                # Проверяем хеш: в хранилище не должно попасть ничего чужого
+                await asyncio.to_thread(self.put_file, tmp, suffix, content_hash)
+                return True
+            except Exception as e:
+                print(f"❌ Ошибка загрузки {content_hash} из хранилища: {e}")
+                return False
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    async def fetch_missing(self, refs: Iterable[tuple]) -> int:
+        """
+        Параллельно докачивает из общего хранилища файлы, которых нет локально
+
+        Returns:
+            Сколько файлов скачано
+        """
+        sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+        results = await asyncio.gather(*[
+            self._fetch_one(content_hash, suffix, sem) for content_hash, suffix in self.missing(refs)
+        ])
+        return sum(results)
+
+
+media_store = MediaStore(MEDIA_STORE_DIR, storage)
@@ -0,0 +1,118 @@
+# services/music_library.py
+import asyncio
+import json
+import re
+from typing import Optional
+
+from services.encoder_pool import encoder_pool
+
+# Канонический формат треков библиотеки: один раз при загрузке,
+# дальше при наложении звук не нужно декодировать/ресемплировать заново
+MUSIC_SAMPLE_RATE = 48000
+MUSIC_CHANNELS = 2
+MUSIC_BITRATE = "192k"
+MUSIC_EXT = ".m4a"
+# Целевая громкость трека (EBU R128), LUFS
+MUSIC_TARGET_LUFS = -16.0
+MUSIC_TARGET_TP = -1.5
+MUSIC_TARGET_LRA = 11.0
+# Насколько музыка тише исходного звука видео при смешивании, дБ
+MUSIC_BED_GAIN_DB = -12.0
+
+
+async def probe(path: str) -> dict:
+    """ffprobe: потоки и формат файла"""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration:stream=codec_type,sample_rate,channels',
+        '-of', 'json',
+        path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    try:
+        return json.loads(out.decode() or "{}")
+    except ValueError:
+        return {}
+
+
+async def has_audio_stream(path: str) -> bool:
+    """Есть ли в файле звуковая дорожка"""
+    info = await probe(path)
+    return any(s.get("codec_type") == "audio" for s in info.get("streams", []))
+
+
+def _parse_loudnorm(stderr: str) -> Optional[dict]:
+    # loudnorm печатает JSON-блок последним в stderr
+    match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", stderr, re.S)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except ValueError:
+        return None
+
+
+async def measure_loudness(path: str) -> Optional[dict]:
+    """Первый проход loudnorm: измерение громкости (EBU R128)"""
+    result = await encoder_pool.run([
+        'ffmpeg', '-hide_banner', '-nostats',
+        '-i', path,
+        '-vn',
+        '-af', f'loudnorm=I={MUSIC_TARGET_LUFS}:TP={MUSIC_TARGET_TP}:LRA={MUSIC_TARGET_LRA}:print_format=json',
+        '-f', 'null', '-'
+    ], timeout=300)
+    if result.returncode != 0:
+        return None
+    return _parse_loudnorm(result.stderr)
+
+
+async def ingest_track(src_path: str, dest_path: str) -> Optional[dict]:
+    """
+    Переводит загруженный трек в канонический формат библиотеки
+
+    Args:
+        src_path: Загруженный файл (mp3/wav/m4a...)
+        dest_path: Куда сохранить канонический .m4a
+
+    Returns:
+        dict с duration, sample_rate, channels, loudness_lufs или None при ошибке
+    """
+    measured = await measure_loudness(src_path)
+    if measured:
+        # Второй проход с измеренными значениями — линейная нормализация без «накачки»
+        loudnorm = (
+            f"loudnorm=I={MUSIC_TARGET_LUFS}:TP={MUSIC_TARGET_TP}:LRA={MUSIC_TARGET_LRA}:"
+            f"measured_I={measured['input_i']}:measured_TP={measured['input_tp']}:"
+            f"measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}:"
+            f"offset={measured['target_offset']}:linear=true"
+        )
+    else:
+        loudnorm = f"loudnorm=I={MUSIC_TARGET_LUFS}:TP={MUSIC_TARGET_TP}:LRA={MUSIC_TARGET_LRA}"
+
+    result = await encoder_pool.run([
+        'ffmpeg', '-y',
+        '-i', src_path,
+        '-vn', '-map_metadata', '-1',
+        '-af', f'{loudnorm},aresample={MUSIC_SAMPLE_RATE}',
+        '-ar', str(MUSIC_SAMPLE_RATE), '-ac', str(MUSIC_CHANNELS),
+        '-c:a', 'aac', '-b:a', MUSIC_BITRATE,
+        '-movflags', '+faststart',
+        dest_path
+    ], timeout=600)
+    if result.returncode != 0:
+        return None
+
+    info = await probe(dest_path)
+    final = await measure_loudness(dest_path)
+    try:
+        duration = float(info.get("format", {}).get("duration", 0))
+    except (TypeError, ValueError):
+        duration = 0.0
+    return {
+        "duration": int(round(duration)),
+        "sample_rate": MUSIC_SAMPLE_RATE,
+        "channels": MUSIC_CHANNELS,
+        "loudness_lufs": float(final["input_i"]) if final else MUSIC_TARGET_LUFS,
+    }
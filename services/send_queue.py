@@ -0,0 +1,369 @@
+# services/send_queue.py
+"""
+Очередь исходящих сообщений бота.
+
+Telegram ограничивает отправку: ~30 сообщений/с на бота, ~1 сообщение/с
+в один чат и 20/мин в группу, при превышении отвечает 429 с retry_after.
+Уведомления об оплате, прогресс и результаты обработки идут через одну
+очередь: токен-бакеты глобально и на каждый чат, приоритеты
+(оплаты > результаты > прогресс) и склейка правок — из нескольких еще не
+отправленных edit_text одного сообщения уходит только последняя.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from config import (
+    SEND_GLOBAL_RATE,
+    SEND_CHAT_RATE,
+    SEND_CHAT_BURST,
+    SEND_GROUP_RATE_PER_MIN,
+    SEND_MAX_RETRIES,
+    BOT_MODE,
+    WEBHOOK_WORKERS,
+)
+
+# Приоритеты: меньше — раньше
+PRIORITY_PAYMENT = 0
+PRIORITY_RESULT = 1
+PRIORITY_PROGRESS = 2
+PRIORITY_BROADCAST = 3
+
+# Как часто забывать бакеты чатов, в которые давно ничего не отправлялось
+PRUNE_INTERVAL_SEC = 60
+
+
+class TokenBucket:
+    """rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """Через сколько секунд можно потратить cost токенов (0 — сразу)"""
+        self._refill(now)
+        need = min(cost, self.capacity) - self.tokens
+        return max(0.0, need / self.rate)
+
+    def take(self, now: float, cost: float = 1.0) -> None:
+        # Дорогая отправка (альбом) уводит бакет в минус — следующие подождут
+        self._refill(now)
+        self.tokens -= cost
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Op:
+    priority: int
+    seq: int
+    chat_id: int
+    call: Callable[[], Awaitable[Any]]
+    cost: float = 1.0
+    key: Optional[Tuple[int, int]] = None
+    futures: List[asyncio.Future] = field(default_factory=list)
+    attempts: int = 0
+
+
+class _ChatLane:
+    """Ожидающие отправки в один чат и его бакет"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.ops: List[Tuple[int, int, _Op]] = []
+        self.paused_until = 0.0
+        # Запись в расписании действительна, только если ее версия совпадает
+        self.version = 0
+
+
+class SendQueue:
+    """
+    Планировщик исходящих вызовов Bot API.
+
+    Каждый чат — своя куча ожидающих (priority, seq). Чаты, которые могут
+    отправлять прямо сейчас, лежат в куче _ready по приоритету своего первого
+    сообщения, остальные — в _sleeping по времени готовности. Один цикл
+    берет лучший готовый чат, когда есть глобальный токен, и запускает
+    отправку отдельной задачей, чтобы долгая загрузка видео не держала очередь.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: int,
+                 group_rate_per_min: int, max_retries: int):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_min / 60
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, _ChatLane] = {}
+        self._ready: List[Tuple[int, int, int, int]] = []
+        self._sleeping: List[Tuple[float, int, int]] = []
+        self._edits: Dict[Tuple[int, int], _Op] = {}
+        self._seq = itertools.count()
+        self._inflight: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pruned_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return sum(len(lane.ops) for lane in self._chats.values())
+
+    # ---------- Отправка ----------
+
+    def send_message(self, bot: Bot, chat_id: int, text: str,
+                     priority: int = PRIORITY_RESULT, **kwargs) -> Awaitable[Message]:
+        return self.submit(chat_id, lambda: bot.send_message(chat_id, text, **kwargs), priority)
+
+    def send_video(self, bot: Bot, chat_id: int, video: Any,
+                   priority: int = PRIORITY_RESULT, **kwargs) -> Awaitable[Message]:
+        return self.submit(chat_id, lambda: bot.send_video(chat_id, video=video, **kwargs), priority)
+
+    def send_media_group(self, bot: Bot, chat_id: int, media: list,
+                         priority: int = PRIORITY_RESULT, **kwargs) -> Awaitable[List[Message]]:
+        # Альбом — столько сообщений, сколько в нем файлов
+        return self.submit(
+            chat_id, lambda: bot.send_media_group(chat_id, media=media, **kwargs), priority, cost=len(media)
+        )
+
+    def copy_message(self, bot: Bot, chat_id: int, from_chat_id: int, message_id: int,
+                     priority: int = PRIORITY_BROADCAST, **kwargs) -> Awaitable[Any]:
+        return self.submit(
+            chat_id, lambda: bot.copy_message(chat_id, from_chat_id, message_id, **kwargs), priority
+        )
+
+    def edit_message_text(self, bot: Bot, chat_id: int, message_id: int, text: str,
+                          priority: int = PRIORITY_PROGRESS, **kwargs) -> Awaitable[Any]:
+        # Правка по ID — когда объекта Message уже нет (например, после рестарта)
+        return self.submit(
+            chat_id, lambda: bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs),
+            priority, key=(chat_id, message_id)
+        )
+
+    def answer(self, message: Message, text: str,
+               priority: int = PRIORITY_PROGRESS, **kwargs) -> Awaitable[Message]:
+        return self.submit(message.chat.id, lambda: message.answer(text, **kwargs), priority)
+
+    def answer_video(self, message: Message, video: Any,
+                     priority: int = PRIORITY_RESULT, **kwargs) -> Awaitable[Message]:
+        return self.submit(message.chat.id, lambda: message.answer_video(video=video, **kwargs), priority)
+
+    def edit_text(self, message: Message, text: str,
+                  priority: int = PRIORITY_PROGRESS, **kwargs) -> Awaitable[Any]:
+        key = (message.chat.id, message.message_id)
+        return self.submit(message.chat.id, lambda: message.edit_text(text, **kwargs), priority, key=key)
+
+    def submit(self, chat_id: int, call: Callable[[], Awaitable[Any]], priority: int,
+               cost: float = 1.0, key: Optional[Tuple[int, int]] = None) -> asyncio.Future:
+        """
+        Ставит вызов Bot API в очередь
+
+        Args:
+            call: Функция без аргументов, выполняющая запрос
+            key: (chat_id, message_id) для правок — неотправленная правка того же
+                 сообщения заменяется новой
+        Returns:
+            Future с результатом запроса
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+
+        pending = self._edits.get(key) if key is not None else None
+        if pending is not None:
+            # Предыдущая правка еще ждет — отправится сразу новый текст, на том же месте
+            pending.call = call
+            pending.futures.append(future)
+            if priority < pending.priority:
+                # Новая правка важнее (например, итог после прогресса) — поднимаем ее
+                self._raise_priority(pending, priority)
+            return future
+
+        op = _Op(priority, next(self._seq), chat_id, call, cost, key, [future])
+        if key is not None:
+            self._edits[key] = op
+        lane = self._lane(chat_id)
+        heapq.heappush(lane.ops, (op.priority, op.seq, op))
+        if lane.ops[0][2] is op:
+            # Новое сообщение стало первым в чате — обновляем место в расписании
+            self._schedule(chat_id, lane, time.monotonic())
+        return future
+
+    def _raise_priority(self, op: _Op, priority: int) -> None:
+        op.priority = priority
+        lane = self._chats.get(op.chat_id)
+        if lane is None or not any(entry[2] is op for entry in lane.ops):
+            return
+        lane.ops = [(o.priority, o.seq, o) for _, _, o in lane.ops]
+        heapq.heapify(lane.ops)
+        if lane.ops[0][2] is op:
+            self._schedule(op.chat_id, lane, time.monotonic())
+
+    # ---------- Расписание ----------
+
+    def _lane(self, chat_id: int) -> _ChatLane:
+        lane = self._chats.get(chat_id)
+        if lane is None:
+            # Отрицательный chat_id — группа или канал
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            lane = self._chats[chat_id] = _ChatLane(TokenBucket(rate, self.chat_burst))
+        return lane
+
+    def _schedule(self, chat_id: int, lane: _ChatLane, now: float) -> None:
+        lane.version += 1
+        if not lane.ops:
+            return
+        priority, seq, op = lane.ops[0]
+        ready_at = max(lane.paused_until, now + lane.bucket.wait_time(now, op.cost))
+        if ready_at <= now:
+            heapq.heappush(self._ready, (priority, seq, chat_id, lane.version))
+        else:
+            heapq.heappush(self._sleeping, (ready_at, chat_id, lane.version))
+        self._wakeup.set()
+
+    def _pop_ready(self) -> Optional[Tuple[Tuple[int, int, int, int], _ChatLane]]:
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            lane = self._chats.get(entry[2])
+            if lane is not None and lane.version == entry[3] and lane.ops:
+                return entry, lane
+        return None
+
+    def _wake_sleeping(self, now: float) -> None:
+        while self._sleeping and self._sleeping[0][0] <= now:
+            _, chat_id, version = heapq.heappop(self._sleeping)
+            lane = self._chats.get(chat_id)
+            if lane is not None and lane.version == version and lane.ops:
+                priority, seq, _ = lane.ops[0]
+                heapq.heappush(self._ready, (priority, seq, chat_id, version))
+
+    def _prune(self, now: float) -> None:
+        self._pruned_at = now
+        idle = [
+            chat_id for chat_id, lane in self._chats.items()
+            if not lane.ops and lane.paused_until <= now and lane.bucket.full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    # ---------- Цикл отправки ----------
+
+    def _ensure_started(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now - self._pruned_at > PRUNE_INTERVAL_SEC:
+                self._prune(now)
+            self._wake_sleeping(now)
+
+            picked = self._pop_ready()
+            if picked is None:
+                timeout = self._sleeping[0][0] - now if self._sleeping else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            entry, lane = picked
+            op = lane.ops[0][2]
+            wait = self._global.wait_time(now, op.cost)
+            if wait > 0:
+                # Глобальный лимит исчерпан: чат остается в готовых, за это время
+                # может появиться сообщение важнее
+                heapq.heappush(self._ready, entry)
+                await asyncio.sleep(wait)
+                continue
+
+            heapq.heappop(lane.ops)
+            if op.key is not None and self._edits.get(op.key) is op:
+                del self._edits[op.key]
+            self._global.take(now, op.cost)
+            lane.bucket.take(now, op.cost)
+            self._schedule(op.chat_id, lane, now)
+
+            task = asyncio.create_task(self._execute(op))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, op: _Op) -> None:
+        if all(f.done() for f in op.futures):
+            # Все, кто ждал отправки, уже отменены
+            return
+        try:
+            result = await op.call()
+        except TelegramRetryAfter as e:
+            if op.attempts < self.max_retries:
+                op.attempts += 1
+                self._retry_later(op, e.retry_after)
+                return
+            self._resolve(op, error=e)
+        except Exception as e:
+            self._resolve(op, error=e)
+        else:
+            self._resolve(op, result)
+
+    def _retry_later(self, op: _Op, retry_after: float) -> None:
+        print(f"⚠️ Telegram 429 в чате {op.chat_id}: пауза {retry_after} с")
+        if op.key is not None:
+            newer = self._edits.get(op.key)
+            if newer is not None:
+                # Пока ждали, пришла более свежая правка — она и отправится
+                newer.futures.extend(op.futures)
+                return
+            self._edits[op.key] = op
+
+        now = time.monotonic()
+        lane = self._lane(op.chat_id)
+        lane.paused_until = max(lane.paused_until, now + retry_after)
+        # Прежний seq — после паузы сообщение уйдет первым среди равных по приоритету
+        heapq.heappush(lane.ops, (op.priority, op.seq, op))
+        self._schedule(op.chat_id, lane, now)
+
+    @staticmethod
+    def _resolve(op: _Op, result: Any = None, error: Optional[BaseException] = None) -> None:
+        for future in op.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+send_queue = SendQueue(
+    # Каждый воркер вебхука отправляет сам — делим общий лимит бота между ними
+    global_rate=SEND_GLOBAL_RATE / max(1, WEBHOOK_WORKERS) if BOT_MODE == "webhook" else SEND_GLOBAL_RATE,
+    chat_rate=SEND_CHAT_RATE,
+    chat_burst=SEND_CHAT_BURST,
+    group_rate_per_min=SEND_GROUP_RATE_PER_MIN,
+    max_retries=SEND_MAX_RETRIES,
+)
@@ -0,0 +1,214 @@
+# services/storage.py
+"""
+Хранилище файлов: локальный диск или S3-совместимый сервер (AWS, MinIO).
+
+Бот и воркеры работают с файлами по ключу ("media/<sha256>.ttf"),
+не зная, где они физически лежат. Выбор бэкенда — STORAGE_BACKEND.
+"""
+import asyncio
+import os
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+from config import (
+    STORAGE_BACKEND,
+    STORAGE_LOCAL_DIR,
+    STORAGE_PRESIGN_TTL_SEC,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    S3_REGION,
+    S3_PREFIX,
+    S3_MULTIPART_CHUNK_MB,
+    S3_MAX_CONCURRENCY,
+)
+
+
+class StorageBackend(ABC):
+    """Общий интерфейс бэкендов хранилища (неполный бэкенд не создастся)"""
+
+    # Файлы лежат на другой машине (нужно скачивать / загружать)
+    remote = False
+
+    @abstractmethod
+    async def put_file(self, key: str, src_path: str) -> None:
+        """Загружает локальный файл под ключом key"""
+
+    @abstractmethod
+    async def get_file(self, key: str, dest_path: str) -> bool:
+        """Скачивает файл в dest_path; False, если ключа нет"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Есть ли файл под ключом key"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаляет файл (отсутствующий ключ — не ошибка)"""
+
+    async def presigned_url(self, key: str, expires: int = STORAGE_PRESIGN_TTL_SEC) -> Optional[str]:
+        """Временная ссылка на чтение (None, если бэкенд их не выдает)"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Файлы в папке на диске (или в общей сетевой папке)"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Недопустимый ключ: {key}")
+        return path
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path) -> None:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.tmp")
+        tmp.unlink(missing_ok=True)
+        # На одном разделе — жесткая ссылка, байты не дублируются
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    async def put_file(self, key: str, src_path: str) -> None:
+        await asyncio.to_thread(self._link_or_copy, Path(src_path), self._path(key))
+
+    async def get_file(self, key: str, dest_path: str) -> bool:
+        path = self._path(key)
+        if not path.exists():
+            return False
+        await asyncio.to_thread(self._link_or_copy, path, Path(dest_path))
+        return True
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    async def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    async def presigned_url(self, key: str, expires: int = STORAGE_PRESIGN_TTL_SEC) -> Optional[str]:
+        path = self._path(key)
+        return path.as_uri() if path.exists() else None
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-совместимое хранилище через boto3 (необязательная зависимость).
+
+    Загрузка и скачивание идут потоково, частями по S3_MULTIPART_CHUNK_MB
+    в S3_MAX_CONCURRENCY потоков (multipart upload / ranged GET).
+    """
+
+    remote = True
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, region: Optional[str] = None, prefix: str = "",
+                 chunk_mb: int = 16, max_concurrency: int = 8):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client_kwargs = {
+            "endpoint_url": endpoint_url or None,
+            "aws_access_key_id": access_key or None,
+            "aws_secret_access_key": secret_key or None,
+            "region_name": region or None,
+        }
+        self._chunk = chunk_mb * 1024 * 1024
+        self._max_concurrency = max_concurrency
+        self._client = None
+        self._transfer = None
+
+    def _s3(self):
+        # boto3 импортируем лениво: нужен только при STORAGE_BACKEND=s3
+        if self._client is None:
+            try:
+                import boto3
+                from boto3.s3.transfer import TransferConfig
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("Для STORAGE_BACKEND=s3 установите boto3: pip install boto3")
+            self._client = boto3.client(
+                "s3",
+                config=Config(signature_version="s3v4", max_pool_connections=self._max_concurrency * 2),
+                **self._client_kwargs,
+            )
+            self._transfer = TransferConfig(
+                multipart_threshold=self._chunk,
+                multipart_chunksize=self._chunk,
+                max_concurrency=self._max_concurrency,
+                use_threads=True,
+            )
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def put_file(self, key: str, src_path: str) -> None:
+        s3 = self._s3()
+        await asyncio.to_thread(s3.upload_file, src_path, self.bucket, self._key(key), Config=self._transfer)
+
+    async def get_file(self, key: str, dest_path: str) -> bool:
+        if not await self.exists(key):
+            return False
+        s3 = self._s3()
+        tmp = f"{dest_path}.part"
+        try:
+            await asyncio.to_thread(s3.download_file, self.bucket, self._key(key), tmp, Config=self._transfer)
+            os.replace(tmp, dest_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return True
+
+    async def exists(self, key: str) -> bool:
+        s3 = self._s3()
+        try:
+            await asyncio.to_thread(s3.head_object, Bucket=self.bucket, Key=self._key(key))
+            return True
+        except s3.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key: str) -> None:
+        s3 = self._s3()
+        await asyncio.to_thread(s3.delete_object, Bucket=self.bucket, Key=self._key(key))
+
+    async def presigned_url(self, key: str, expires: int = STORAGE_PRESIGN_TTL_SEC) -> Optional[str]:
+        s3 = self._s3()
+        return await asyncio.to_thread(
+            s3.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires,
+        )
+
+
+def create_storage() -> StorageBackend:
+    """Бэкенд по настройкам из .env"""
+    if STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3, но S3_BUCKET не задан")
+        return S3Storage(
+            bucket=S3_BUCKET,
+            endpoint_url=S3_ENDPOINT_URL,
+            access_key=S3_ACCESS_KEY,
+            secret_key=S3_SECRET_KEY,
+            region=S3_REGION,
+            prefix=S3_PREFIX,
+            chunk_mb=S3_MULTIPART_CHUNK_MB,
+            max_concurrency=S3_MAX_CONCURRENCY,
+        )
+    if STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Неизвестный STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return LocalStorage(STORAGE_LOCAL_DIR)
+
+
+storage = create_storage()
@@ -0,0 +1,145 @@
+# services/subscription_reminders.py
+"""
+Напоминания об окончании подписки.
+
+Раз в SUBSCRIPTION_SWEEP_INTERVAL_SEC проход по окнам дат окончания:
+"осталось меньше 72 ч", "меньше 24 ч" (SUBSCRIPTION_REMINDER_HOURS) и
+"истекла за последние SUBSCRIPTION_EXPIRED_LOOKBACK_HOURS". Каждое окно
+читается страницами по индексу (subscription_end_date, user_id), так что
+проход стоит пропорционально числу подписок в окне, а не всех пользователей.
+Страница сразу отмечается в subscription_notifications — каждое
+напоминание уходит один раз на дату окончания (после продления придет
+снова для новой даты). Если отправка сорвалась (сеть, флуд), отметка
+снимается и следующий проход попробует снова. Отправка — через send_queue
+с низким приоритетом.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import (
+    SUBSCRIPTION_REMINDER_HOURS, SUBSCRIPTION_EXPIRED_LOOKBACK_HOURS,
+    SUBSCRIPTION_SWEEP_INTERVAL_SEC, SUBSCRIPTION_SWEEP_BATCH,
+)
+from database.user import db
+from services.send_queue import send_queue, PRIORITY_BROADCAST
+
+
+def _renew_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💰 Продлить подписку", callback_data="balanceadd")]
+    ])
+
+
+def _notification_text(kind: str, end_date: datetime) -> str:
+    if kind == "expired":
+        return (
+            "⌛ <b>Ваша подписка истекла</b>\n\n"
+            f"Подписка закончилась {end_date.strftime('%d.%m.%Y %H:%M')}.\n"
+            "Продлите ее, чтобы продолжить обработку видео."
+        )
+    return (
+        "⏰ <b>Подписка скоро закончится</b>\n\n"
+        f"Действует до: {end_date.strftime('%d.%m.%Y %H:%M')}\n"
+        "Продлите ее заранее, чтобы обработка видео не прерывалась."
+    )
+
+
+class SubscriptionSweeper:
+    """Фоновый проход по истекающим подпискам (только в основном процессе)"""
+
+    def __init__(self, interval: float, reminder_hours: List[int], expired_lookback_hours: int, batch_size: int):
+        self.interval = interval
+        self.reminder_hours = sorted(set(h for h in reminder_hours if h > 0))
+        self.expired_lookback = timedelta(hours=expired_lookback_hours)
+        self.batch_size = batch_size
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Ошибка проверки окончания подписок: {e}")
+            await asyncio.sleep(self.interval)
+
+    def windows(self, now: datetime) -> list:
+        """
+        Окна (вид, от, до] — не пересекаются, поэтому подписке, которая уже
+        ближе к концу, не придут сразу два напоминания
+        """
+        windows = [("expired", now - self.expired_lookback, now)]
+        lower = now
+        for hours in self.reminder_hours:
+            upper = now + timedelta(hours=hours)
+            windows.append((f"remind_{hours}h", lower, upper))
+            lower = upper
+        return windows
+
+    async def sweep(self) -> None:
+        """Один проход по всем окнам"""
+        # Даты подписок хранятся во времени БД — от него и считаем
+        now = await db.get_db_time()
+        for kind, lower, upper in self.windows(now):
+            sent = blocked = failed = 0
+            after = (lower, 0)
+            while True:
+                rows = await db.claim_subscription_notifications(kind, after, upper, self.batch_size)
+                if not rows:
+                    break
+                results = await asyncio.gather(*[
+                    self._notify(kind, row["user_id"], row["end_date"]) for row in rows
+                ])
+                sent += results.count("sent")
+                blocked += results.count("blocked")
+                failed += results.count("failed")
+                # Сбой отправки (сеть, флуд) — снимаем отметку, напомним на следующем проходе.
+                # Заблокировавшим бота отметка остается
+                unsent = [row for row, result in zip(rows, results) if result == "failed"]
+                if unsent:
+                    await db.release_subscription_notifications(kind, unsent)
+                if len(rows) < self.batch_size:
+                    break
+                after = (rows[-1]["end_date"], rows[-1]["user_id"])
+            if sent or blocked or failed:
+                print(f"⏰ Уведомления {kind}: отправлено {sent}, заблокировали {blocked}, ошибок {failed}")
+
+    async def _notify(self, kind: str, user_id: int, end_date: datetime) -> str:
+        try:
+            await send_queue.send_message(
+                self._bot, user_id, _notification_text(kind, end_date),
+                priority=PRIORITY_BROADCAST, reply_markup=_renew_kb()
+            )
+            return "sent"
+        except TelegramForbiddenError:
+            return "blocked"
+        except Exception as e:
+            print(f"❌ Ошибка уведомления о подписке {user_id}: {e}")
+            return "failed"
+
+
+subscription_sweeper = SubscriptionSweeper(
+    interval=SUBSCRIPTION_SWEEP_INTERVAL_SEC,
+    reminder_hours=SUBSCRIPTION_REMINDER_HOURS,
+    expired_lookback_hours=SUBSCRIPTION_EXPIRED_LOOKBACK_HOURS,
+    batch_size=SUBSCRIPTION_SWEEP_BATCH,
+)
@@ -0,0 +1,178 @@
+# services/text_overlay.py
+"""
+Растеризация подписей в PNG один раз вместо drawtext на каждом кадре.
+
+Подпись (текст + шрифт + размер) рисуется PIL'ом в RGBA-картинку и
+кэшируется на диске по хешу; дальше ffmpeg только накладывает готовую
+картинку через overlay. Экранировать пользовательский текст для
+ffmpeg больше не нужно.
+"""
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config import EMOJI_FONT_PATH
+from services.filtergraph import ASSETS_DIR, OUT_W
+
+CAPTIONS_DIR = ASSETS_DIR / "captions"
+# Меняем, если поменялся внешний вид подписей — старый кэш перестанет совпадать
+STYLE_VERSION = 1
+
+TEXT_COLOR = (255, 255, 255, 255)
+BOX_COLOR = (0, 0, 0, 128)  # black@0.5, как было в drawtext
+BOX_PADDING = 10
+LINE_SPACING = 0.2  # доля от размера шрифта
+MAX_TEXT_WIDTH = OUT_W - 120
+
+# Цветные эмодзи-шрифты (NotoColorEmoji) растеризуются только в этом размере
+EMOJI_BITMAP_SIZE = 109
+
+
+def _is_emoji(ch: str) -> bool:
+    cp = ord(ch)
+    return (
+        0x1F000 <= cp <= 0x1FAFF
+        or 0x2600 <= cp <= 0x27BF
+        or cp in (0x200D, 0xFE0F)  # ZWJ и variation selector идут вместе с эмодзи
+    )
+
+
+def _runs(line: str) -> List[Tuple[str, bool]]:
+    """Разбивает строку на куски обычного текста и эмодзи"""
+    runs: List[Tuple[str, bool]] = []
+    for ch in line:
+        emoji = _is_emoji(ch)
+        if runs and runs[-1][1] == emoji:
+            runs[-1] = (runs[-1][0] + ch, emoji)
+        else:
+            runs.append((ch, emoji))
+    return runs
+
+
+@lru_cache(maxsize=32)
+def _load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=4)
+def _load_emoji_font(size: int) -> Optional[Tuple[ImageFont.FreeTypeFont, float]]:
+    """Шрифт эмодзи и коэффициент масштабирования до нужного размера"""
+    if not EMOJI_FONT_PATH or not os.path.exists(EMOJI_FONT_PATH):
+        return None
+    try:
+        return ImageFont.truetype(EMOJI_FONT_PATH, size), 1.0
+    except OSError:
+        # Битмап-шрифт: рисуем в родном размере и потом масштабируем
+        return ImageFont.truetype(EMOJI_FONT_PATH, EMOJI_BITMAP_SIZE), size / EMOJI_BITMAP_SIZE
+
+
+def _render_run(text: str, emoji: bool, font: ImageFont.FreeTypeFont, size: int) -> Image.Image:
+    emoji_font = _load_emoji_font(size) if emoji else None
+    use_font, scale = emoji_font if emoji_font else (font, 1.0)
+
+    left, top, right, bottom = use_font.getbbox(text)
+    ascent, descent = use_font.getmetrics()
+    img = Image.new("RGBA", (max(1, right - min(0, left)), ascent + descent), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.text((-min(0, left), 0), text, font=use_font, fill=TEXT_COLOR, embedded_color=bool(emoji_font))
+
+    if scale != 1.0:
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+    return img
+
+
+def _render_line(line: str, font: ImageFont.FreeTypeFont, size: int) -> Image.Image:
+    parts = [_render_run(text, emoji, font, size) for text, emoji in _runs(line)] or [
+        Image.new("RGBA", (1, sum(font.getmetrics())), (0, 0, 0, 0))
+    ]
+    height = max(p.height for p in parts)
+    img = Image.new("RGBA", (sum(p.width for p in parts), height), (0, 0, 0, 0))
+    x = 0
+    for part in parts:
+        # Выравниваем куски по нижнему краю строки
+        img.alpha_composite(part, (x, height - part.height))
+        x += part.width
+    return img
+
+
+def _split_word(word: str, font: ImageFont.FreeTypeFont) -> List[str]:
+    """Режет слово шире кадра (ссылка, длинный хэштег) на куски по символам"""
+    pieces: List[str] = []
+    current = ""
+    for ch in word:
+        if current and font.getlength(current + ch) > MAX_TEXT_WIDTH:
+            pieces.append(current)
+            current = ch
+        else:
+            current += ch
+    pieces.append(current)
+    return pieces
+
+
+def _wrap(text: str, font: ImageFont.FreeTypeFont) -> List[str]:
+    """Переносит строки по словам, чтобы подпись влезала в кадр"""
+    lines: List[str] = []
+    for paragraph in text.splitlines() or [""]:
+        current = ""
+        for word in paragraph.split(" "):
+            if font.getlength(word) > MAX_TEXT_WIDTH:
+                pieces = _split_word(word, font)
+                if current:
+                    lines.append(current)
+                lines.extend(pieces[:-1])
+                current = pieces[-1]
+                continue
+            candidate = f"{current} {word}" if current else word
+            if current and font.getlength(candidate) > MAX_TEXT_WIDTH:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        lines.append(current)
+    return lines
+
+
+def render_caption(text: str, font_path: str, size: int = 60) -> str:
+    """
+    Рисует подпись в RGBA PNG (с полупрозрачной плашкой) или берет из кэша
+
+    Args:
+        text: Текст подписи (можно несколько строк и эмодзи)
+        font_path: Путь к шрифту из public.fonts
+        size: Размер шрифта
+
+    Returns:
+        Путь к PNG
+    """
+    font_mtime = int(os.path.getmtime(font_path))
+    key = hashlib.sha1(
+        f"{STYLE_VERSION}|{font_path}|{font_mtime}|{size}|{text}".encode("utf-8")
+    ).hexdigest()
+    path = CAPTIONS_DIR / f"{key}.png"
+    if path.exists():
+        return str(path)
+
+    font = _load_font(font_path, size)
+    lines = [_render_line(line, font, size) for line in _wrap(text, font)]
+    gap = int(size * LINE_SPACING)
+
+    text_w = max(line.width for line in lines)
+    text_h = sum(line.height for line in lines) + gap * (len(lines) - 1)
+    img = Image.new("RGBA", (text_w + 2 * BOX_PADDING, text_h + 2 * BOX_PADDING), BOX_COLOR)
+
+    y = BOX_PADDING
+    for line in lines:
+        img.alpha_composite(line, ((img.width - line.width) // 2, y))
+        y += line.height + gap
+
+    CAPTIONS_DIR.mkdir(parents=True, exist_ok=True)
+    # Свой временный файл на каждый рендер: одну подпись могут рисовать
+    # одновременно несколько воркеров
+    with tempfile.NamedTemporaryFile(dir=CAPTIONS_DIR, suffix=".png", delete=False) as tmp:
+        img.save(tmp, format="PNG")
+    os.replace(tmp.name, path)
+    return str(path)
@@ -0,0 +1,66 @@
+# services/user_activity.py
+"""
+Отложенная запись username и времени последней активности.
+
+Каждый апдейт только отмечает пользователя в памяти; раз в
+USER_ACTIVITY_FLUSH_SEC все отметки уходят в БД одним UPDATE
+(db.touch_users). Повторные апдейты одного пользователя между записями
+схлопываются в одну строку.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from config import USER_ACTIVITY_FLUSH_SEC
+from database.user import db
+
+
+class UserActivityBuffer:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        # user_id -> (username, monotonic-время последнего апдейта)
+        self._pending: Dict[int, Tuple[Optional[str], float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, user_id: int, username: Optional[str]) -> None:
+        self._pending[user_id] = (username, time.monotonic())
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и сохраняет то, что накопилось"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.monotonic()
+        rows = [(user_id, username, now - seen) for user_id, (username, seen) in pending.items()]
+        try:
+            await db.touch_users(rows)
+        except Exception as e:
+            print(f"❌ Ошибка записи активности пользователей ({len(rows)}): {e}")
+            # Вернем в буфер, не затирая более свежие отметки
+            for user_id, item in pending.items():
+                self._pending.setdefault(user_id, item)
+
+
+user_activity = UserActivityBuffer(USER_ACTIVITY_FLUSH_SEC)
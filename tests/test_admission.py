@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services.admission import AdmissionController, estimate_cost
+
+
+def make(workers=1):
+    return AdmissionController(workers=workers, max_job_sec=100, user_budget_sec=150, global_budget_sec=300)
+
+
+def test_estimate_cost_grows_with_duration():
+    short = estimate_cost("all", 10, 1080, 1920, 5_000_000)
+    long = estimate_cost("all", 60, 1080, 1920, 30_000_000)
+    assert 0 < short < long
+    # Музыка не перекодирует видео — заметно дешевле
+    assert estimate_cost("music", 60, 1080, 1920, 0) < estimate_cost("all", 60, 1080, 1920, 0)
+
+
+def test_reject_too_expensive_and_user_budget():
+    admission = make()
+    assert admission.reserve(1, 101).reason == "too_expensive"
+
+    assert admission.reserve(1, 90).status == "admit"
+    assert admission.reserve(1, 90).reason == "user_budget"
+    # Бюджет у каждого пользователя свой
+    assert not admission.reserve(2, 90).rejected
+
+
+def test_defer_when_workers_busy_and_reject_over_global_budget():
+    admission = make()
+    assert admission.reserve(1, 80).status == "admit"
+    deferred = admission.reserve(2, 80)
+    assert deferred.status == "defer" and deferred.wait_sec == 80
+
+    admission.reserve(3, 80)
+    admission.reserve(4, 80)
+    assert admission.reserve(5, 80).reason == "global_budget"
+
+
+def test_fifo_and_release_of_queued_ticket():
+    async def scenario():
+        admission = make()
+        first = admission.reserve(1, 10).ticket
+        second = admission.reserve(2, 10).ticket
+        third = admission.reserve(3, 10).ticket
+
+        await admission.acquire(first)
+        waiter = asyncio.create_task(admission.acquire(third))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        # Второй так и не стартовал (например, упала отправка) — его снятие
+        # и завершение первого пропускают третьего
+        await admission.release(second)
+        await admission.release(first)
+        await asyncio.wait_for(waiter, 1)
+        await admission.release(third)
+        assert admission.expected_wait() == 0
+
+    asyncio.run(scenario())
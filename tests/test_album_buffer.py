@@ -0,0 +1,34 @@
+import asyncio
+
+from services.album_buffer import AlbumBuffer
+
+
+def test_album_collected_once_in_message_order():
+    async def scenario():
+        buffer = AlbumBuffer(collect_delay=0.05)
+
+        async def part(message_id, delay):
+            await asyncio.sleep(delay)
+            return await buffer.add("g1", message_id, {"file_id": str(message_id)})
+
+        return await asyncio.gather(part(12, 0.02), part(10, 0), part(11, 0.01))
+
+    results = asyncio.run(scenario())
+    albums = [r for r in results if r is not None]
+    # Альбом забирает ровно одна часть — пришедшая последней
+    assert len(albums) == 1
+    assert results[0] == albums[0]
+    assert [s["file_id"] for s in albums[0]] == ["10", "11", "12"]
+
+
+def test_albums_are_independent():
+    async def scenario():
+        buffer = AlbumBuffer(collect_delay=0.01)
+        return await asyncio.gather(
+            buffer.add("a", 1, {"file_id": "a1"}),
+            buffer.add("b", 2, {"file_id": "b1"}),
+        )
+
+    a, b = asyncio.run(scenario())
+    assert a == [{"file_id": "a1"}]
+    assert b == [{"file_id": "b1"}]
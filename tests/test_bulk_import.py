@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from handlers.Admin.bulk_import import _parse_csv
+
+
+def test_header_and_delimiters():
+    rows, errors = _parse_csv("user_id;days\n1;30\n2;7\n".encode(), "subscriptions")
+    assert rows == [(1, 30), (2, 7)]
+    assert errors == []
+
+
+def test_users_with_optional_username():
+    rows, errors = _parse_csv(b"1,alice\n2\n", "users")
+    assert rows == [(1, "alice"), (2, None)]
+    assert errors == []
+
+
+def test_balance_accepts_decimal_comma():
+    rows, errors = _parse_csv(b"1;10,5\n2;3\n", "balance")
+    assert rows == [(1, 10.5), (2, 3.0)]
+    assert errors == []
+
+
+@pytest.mark.parametrize("op,value", [
+    ("subscriptions", "0"),
+    ("subscriptions", "-5"),
+    ("balance", "0"),
+    ("balance", "-1.5"),
+    ("balance", "nan"),
+    ("balance", "inf"),
+])
+def test_non_positive_values_rejected(op, value):
+    rows, errors = _parse_csv(f"1,10\n2,{value}\n".encode(), op)
+    assert [user_id for user_id, _ in rows] == [1]
+    assert errors == ["строка 2: значение должно быть больше нуля"]
+
+
+def test_bad_rows_reported_with_line_numbers():
+    rows, errors = _parse_csv(b"user_id,days\nabc,3\n5\n6,x\n7,2\n", "subscriptions")
+    assert rows == [(7, 2)]
+    assert errors == [
+        "строка 2: неверный user_id abc",
+        "строка 3: ожидается user_id,days",
+        "строка 4: ожидается user_id,days",
+    ]
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services.encoder_pool import EncoderPool
+
+
+def make(workers=0, cores=8, reserved=()):
+    pool = EncoderPool(workers=workers, threads=0, reserved_cores=0)
+    # Фиксированная топология: 8 физических ядер по 2 SMT-потока
+    pool._encode_cores = [[i, i + cores] for i in range(cores)]
+    pool._layout(pool._encode_cores, workers)
+    pool.bot_cpus = pool._reserved_cpus = list(reserved)
+    return pool
+
+
+def test_partition_splits_cores_between_processes():
+    seen = []
+    for index in range(4):
+        pool = make()
+        pool.partition(index, 4)
+        cpus = sorted(cpu for s in pool.cpu_sets for cpu in s)
+        seen.extend(cpus)
+        assert len(cpus) == 4  # 2 физических ядра на процесс
+    # Наборы CPU процессов не пересекаются и покрывают все ядра
+    assert sorted(seen) == list(range(16))
+
+
+def test_partition_splits_explicit_workers():
+    totals = []
+    for index in range(3):
+        pool = make(workers=8)
+        pool.partition(index, 3)
+        totals.append(pool.workers)
+    assert sum(totals) == 8
+    # Процессов больше, чем слотов — у каждого все равно есть слот
+    pool = make(workers=2)
+    pool.partition(3, 4)
+    assert pool.workers == 1
+
+
+def test_partition_single_process_keeps_layout():
+    pool = make(workers=4)
+    before = list(pool.cpu_sets)
+    pool.partition(0, 1)
+    assert pool.cpu_sets == before
+
+
+def test_partition_splits_bot_cpus():
+    first, second = make(reserved=(16, 17)), make(reserved=(16, 17))
+    first.partition(0, 2)
+    second.partition(1, 2)
+    assert first.bot_cpus and second.bot_cpus
+    assert not set(first.bot_cpus) & set(second.bot_cpus)
+    # Процессов больше, чем зарезервированных CPU — каждому достается один
+    pool = make(reserved=(16, 17))
+    pool.partition(2, 3)
+    assert len(pool.bot_cpus) == 1 and pool.bot_cpus[0] in (16, 17)
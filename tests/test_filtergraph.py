@@ -0,0 +1,47 @@
+import re
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from services import filtergraph
+
+
+def test_ultra_unique_downscales_before_eq():
+    chain = filtergraph.ultra_unique_chain(0.025, 1.03)
+    assert chain.index("scale=") < chain.index("eq=")
+    # Только уменьшение: коэффициент ограничен сверху единицей
+    assert "min(1," in chain
+
+
+def test_all_effects_graph_single_pass():
+    graph = filtergraph.all_effects_graph(0.025, 1.03)
+
+    # Ultra Unique уменьшает сразу до размера рамки, а не холста
+    first = graph.split(";")[0]
+    assert str(filtergraph.FRAME_W) in first and str(filtergraph.FRAME_H) in first
+    assert first.index("scale=") < first.index("eq=")
+    # Весь кадр в rgba не переводится
+    assert "rgba" not in graph
+    assert graph.endswith("[0:a]atempo=1.03[a]")
+
+
+def test_all_effects_graph_labels_are_connected():
+    graph = filtergraph.all_effects_graph(0.025, 1.03)
+    produced, consumed = set(), []
+    for part in graph.split(";"):
+        labels = re.findall(r"\[([^\]]+)\]", part)
+        # Входы — в начале фильтра, выходы — в конце
+        head = re.match(r"^(\[[^\]]+\])+", part)
+        inputs = re.findall(r"\[([^\]]+)\]", head.group(0)) if head else []
+        consumed += [label for label in inputs if ":" not in label]
+        produced |= set(labels) - set(inputs)
+    assert set(consumed) <= produced
+    assert {"v", "a"} <= produced
+
+
+def test_subscribe_bait_fit_canvas():
+    graph = filtergraph.subscribe_bait_graph("x", "1:v", "v")
+    # Вписывает в холст как normalize (в том же энкоде), а не растягивает
+    assert filtergraph.normalize_chain() in graph
+    assert "scale=" not in filtergraph.subscribe_bait_graph("x", "1:v", "v", fit_canvas=False)
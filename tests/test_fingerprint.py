@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services.fingerprint import (
+    VideoFingerprintIndex, pack_fingerprint, unpack_fingerprint, sequence_distance,
+)
+
+# 16 "информативных" кадровых хешей (половина бит установлена)
+HASHES = tuple((0x0F0F0F0F0F0F0F0F << (i % 4)) & 0xFFFFFFFFFFFFFFFF for i in range(16))
+OTHER = tuple((0x3333CCCC3333CCCC >> (i % 3)) for i in range(16))
+
+
+def test_pack_roundtrip():
+    assert unpack_fingerprint(pack_fingerprint(HASHES)) == HASHES
+
+
+def test_sequence_distance_penalizes_length():
+    assert sequence_distance(HASHES, HASHES) == 0
+    assert sequence_distance(HASHES, HASHES[:8]) > 10
+
+
+def test_find_similar_same_effect_only():
+    index = VideoFingerprintIndex(max_distance=10)
+    index.add("a", "mirror", HASHES, "result_a")
+
+    assert index.find_similar(HASHES, "mirror").result_file_id == "result_a"
+    assert index.find_similar(HASHES, "subtitles") is None
+    assert index.lookup_exact("a", "mirror") == "result_a"
+
+
+def test_readd_reindexes_changed_fingerprint():
+    index = VideoFingerprintIndex(max_distance=10)
+    index.add("a", "mirror", HASHES, "result_a")
+    index.add("a", "mirror", OTHER, "result_b")
+
+    assert len(index) == 1
+    assert index.find_similar(HASHES, "mirror") is None
+    assert index.find_similar(OTHER, "mirror").result_file_id == "result_b"
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from services import invoices
+from services.invoices import (
+    ALREADY_CREDITED,
+    CREDIT_FAILED,
+    CREDITED,
+    InvoiceScheduler,
+    credit_paid_invoice,
+)
+
+
+class FakeSendQueue:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, bot, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    queue = FakeSendQueue()
+    monkeypatch.setattr(invoices, "send_queue", queue)
+    monkeypatch.setattr(invoices, "_delay_warned", set())
+    return queue.sent
+
+
+def fake_credit(monkeypatch, outcomes):
+    calls = []
+
+    async def credit_invoice(invoice_id, user_id, amount, asset):
+        calls.append(invoice_id)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(invoices.db, "credit_invoice", credit_invoice)
+    return calls
+
+
+def test_credit_results_are_distinguished(monkeypatch, sent):
+    fake_credit(monkeypatch, [RuntimeError("db down"), RuntimeError("db down"), 15.0, None])
+
+    async def scenario():
+        return [await credit_paid_invoice(None, 7, 1, 5.0, "USDT") for _ in range(4)]
+
+    assert asyncio.run(scenario()) == [CREDIT_FAILED, CREDIT_FAILED, CREDITED, ALREADY_CREDITED]
+    # О задержке предупреждаем один раз, о зачислении — один раз
+    assert len(sent) == 2
+
+
+def test_scheduler_keeps_paid_invoice_until_credited(monkeypatch, sent):
+    fake_credit(monkeypatch, [RuntimeError("db down"), 10.0])
+    scheduler = InvoiceScheduler(poll_interval=1, timeout=0)
+    scheduler.add(7, 1, 5.0, "USDT")
+
+    async def scenario():
+        await scheduler._dispatch({"invoice_id": 7, "status": "paid"})
+        # Дедлайн прошел, но оплаченный инвойс не отменяется
+        await scheduler._expire_overdue({7})
+        pending_after_failure = len(scheduler)
+        await scheduler._dispatch({"invoice_id": 7, "status": "paid"})
+        return pending_after_failure
+
+    assert asyncio.run(scenario()) == 1
+    assert len(scheduler) == 0
+    assert not any("отменен" in text for _, text in sent)
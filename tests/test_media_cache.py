@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services import media_cache as media_cache_module
+from services.media_cache import MediaCache
+
+
+def write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_put_and_get_into(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_bytes=1000, ttl_sec=3600)
+    cache.scan()
+    src = write(tmp_path / "in.mp4", 10)
+    cache.put("k", "original", str(src))
+    dest = cache.get_into("k", "original", str(tmp_path))
+    assert dest and open(dest, "rb").read() == b"x" * 10
+    # Временных файлов не осталось
+    assert [p.name for p in (tmp_path / "cache" / "k").iterdir()] == ["original.mp4"]
+
+
+def test_scan_keeps_fresh_tmp_files_of_other_workers(tmp_path):
+    root = tmp_path / "cache"
+    fresh = write(root / "k" / ".original.123.abcd.tmp", 5)
+    stale = write(root / "k" / ".normalized.456.ef01.tmp", 5)
+    old = time.time() - media_cache_module.STALE_TMP_SEC - 10
+    os.utime(stale, (old, old))
+
+    cache = MediaCache(str(root), max_bytes=1000, ttl_sec=3600)
+    cache.scan()
+    assert fresh.exists()
+    assert not stale.exists()
+    assert len(cache._entries) == 0
+
+
+def test_share_splits_budget(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_bytes=100, ttl_sec=3600)
+    cache.share(4)
+    cache.scan()
+    for i in range(3):
+        cache.put(f"k{i}", "original", str(write(tmp_path / f"in{i}.mp4", 10)))
+    # Бюджет 25 байт: остаются только два последних файла
+    assert [key for key, _ in cache._entries] == ["k1", "k2"]
+    assert cache._total == 20
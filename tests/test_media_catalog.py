@@ -0,0 +1,79 @@
+import asyncio
+import random
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from services import media_catalog
+from services.media_catalog import MediaCatalog, _Table
+
+
+def check(table: _Table) -> None:
+    # Список id и позиции согласованы со строками
+    assert sorted(table._ids) == sorted(table.rows)
+    assert all(table._ids[pos] == row_id for row_id, pos in table._pos.items())
+    assert len(table._pos) == len(table._ids)
+
+
+def test_swap_remove_keeps_index_consistent():
+    table = _Table()
+    table.replace([{"id": i} for i in range(5)])
+    table.remove(1)    # из середины — на его место встает последний
+    assert table._ids == [0, 4, 2, 3]
+    table.remove(3)    # последний
+    table.remove(42)   # отсутствующий — ничего не меняет
+    assert table._ids == [0, 4, 2]
+    check(table)
+
+
+def test_put_updates_existing_row_in_place():
+    table = _Table()
+    table.put({"id": 7, "name": "a"})
+    table.put({"id": 7, "name": "b"})
+    assert table._ids == [7]
+    assert table.rows[7]["name"] == "b"
+
+
+def test_random_operations_keep_invariants():
+    rng = random.Random(0)
+    table = _Table()
+    for _ in range(500):
+        row_id = rng.randrange(20)
+        if rng.random() < 0.5:
+            table.put({"id": row_id})
+        else:
+            table.remove(row_id)
+        check(table)
+        picked = table.random()
+        assert (picked is None) == (not table.rows)
+        assert picked is None or picked["id"] in table.rows
+
+
+def test_refresh_puts_or_removes(monkeypatch):
+    rows = {1: {"id": 1, "created_at": 1}, 2: {"id": 2, "created_at": 2}}
+
+    async def load_all():
+        return list(rows.values())
+
+    async def get_one(row_id):
+        return rows.get(row_id)
+
+    monkeypatch.setattr(media_catalog, "TABLES", {"fonts": (load_all, get_one), "music": (load_all, get_one)})
+
+    async def scenario():
+        catalog = MediaCatalog()
+        await catalog.load()
+        rows[3] = {"id": 3, "created_at": 3}
+        await catalog.refresh("fonts", 3)
+        del rows[1]
+        await catalog.refresh("fonts", 1)
+        return catalog
+
+    catalog = asyncio.run(scenario())
+    assert catalog.count("fonts") == 2
+    assert catalog.get("fonts", 1) is None
+    assert [row["id"] for row in catalog.all("fonts")] == [3, 2]
+    # Другая таблица не затронута
+    assert catalog.count("music") == 2
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("dotenv")
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from services.send_queue import (
+    PRIORITY_PAYMENT,
+    PRIORITY_PROGRESS,
+    PRIORITY_RESULT,
+    SendQueue,
+    TokenBucket,
+)
+
+
+def make(chat_rate=100.0, chat_burst=5):
+    return SendQueue(global_rate=1000, chat_rate=chat_rate, chat_burst=chat_burst,
+                     group_rate_per_min=20, max_retries=2)
+
+
+def recorder(log, name, result=None):
+    async def call():
+        log.append(name)
+        return result if result is not None else name
+    return call
+
+
+def test_token_bucket_refill_and_debt():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.take(now, cost=2)
+    # Пусто: токен появится через 1/rate
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    # Альбом дороже запаса — бакет уходит в минус
+    bucket.take(now, cost=3)
+    assert bucket.wait_time(now) == pytest.approx(2.0)
+    assert bucket.full(now + 3.5)
+
+
+def test_higher_priority_goes_first():
+    async def scenario():
+        queue, log = make(), []
+        futures = [
+            queue.submit(1, recorder(log, "progress"), PRIORITY_PROGRESS),
+            queue.submit(2, recorder(log, "result"), PRIORITY_RESULT),
+            queue.submit(3, recorder(log, "payment"), PRIORITY_PAYMENT),
+        ]
+        await asyncio.gather(*futures)
+        await queue.stop()
+        return log
+
+    assert asyncio.run(scenario()) == ["payment", "result", "progress"]
+
+
+def test_chat_rate_does_not_block_other_chats():
+    async def scenario():
+        queue, log = make(chat_rate=10, chat_burst=1), []
+        futures = [
+            queue.submit(1, recorder(log, "a1"), PRIORITY_RESULT),
+            queue.submit(1, recorder(log, "a2"), PRIORITY_RESULT),
+            queue.submit(2, recorder(log, "b1"), PRIORITY_RESULT),
+        ]
+        await asyncio.gather(*futures)
+        await queue.stop()
+        return log
+
+    # Второе сообщение в чат 1 ждет его бакет, чат 2 отправляет сразу
+    assert asyncio.run(scenario()) == ["a1", "b1", "a2"]
+
+
+def test_pending_edits_are_coalesced():
+    async def scenario():
+        queue, log = make(), []
+        key = (1, 42)
+        futures = [
+            queue.submit(1, recorder(log, f"edit{i}"), PRIORITY_PROGRESS, key=key)
+            for i in range(3)
+        ]
+        assert len(queue) == 1
+        results = await asyncio.gather(*futures)
+        await queue.stop()
+        return log, results
+
+    log, results = asyncio.run(scenario())
+    # Уходит только последняя правка, ответ получают все ожидавшие
+    assert log == ["edit2"]
+    assert results == ["edit2"] * 3
+
+
+def test_retry_after_is_retried():
+    def retry_after(seconds):
+        error = TelegramRetryAfter.__new__(TelegramRetryAfter)
+        error.retry_after = seconds
+        return error
+
+    async def scenario():
+        queue, attempts = make(), []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise retry_after(0.01)
+            return "ok"
+
+        result = await queue.submit(1, flaky, PRIORITY_RESULT)
+        await queue.stop()
+        return result, len(attempts)
+
+    assert asyncio.run(scenario()) == ("ok", 2)
+
+
+def test_coalesced_edit_takes_higher_priority():
+    async def scenario():
+        queue, log = make(chat_rate=10, chat_burst=1), []
+        key = (1, 42)
+        futures = [
+            # Первое сообщение тратит запас чата — остальные ждут в очереди
+            queue.submit(1, recorder(log, "notice"), PRIORITY_RESULT),
+            queue.submit(1, recorder(log, "other"), PRIORITY_PROGRESS),
+            queue.submit(1, recorder(log, "progress"), PRIORITY_PROGRESS, key=key),
+        ]
+        await asyncio.sleep(0)
+        # Итог в то же сообщение обгоняет прогресс, вставший в очередь раньше
+        futures.append(queue.submit(1, recorder(log, "final"), PRIORITY_RESULT, key=key))
+        await asyncio.gather(*futures)
+        await queue.stop()
+        return log
+
+    assert asyncio.run(scenario()) == ["notice", "final", "other"]
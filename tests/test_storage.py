@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services.storage import LocalStorage, StorageBackend
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PutOnly(StorageBackend):
+        async def put_file(self, key, src_path):
+            pass
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+def test_local_storage_roundtrip(tmp_path):
+    storage = LocalStorage(str(tmp_path / "store"))
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"data")
+
+    async def scenario():
+        await storage.put_file("media/abc.bin", str(src))
+        assert await storage.exists("media/abc.bin")
+        dest = tmp_path / "out" / "abc.bin"
+        assert await storage.get_file("media/abc.bin", str(dest))
+        assert dest.read_bytes() == b"data"
+
+        await storage.delete("media/abc.bin")
+        await storage.delete("media/abc.bin")  # повторно — не ошибка
+        assert not await storage.get_file("media/abc.bin", str(dest))
+
+    asyncio.run(scenario())
+
+
+def test_local_storage_rejects_escaping_keys(tmp_path):
+    storage = LocalStorage(str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+        asyncio.run(storage.exists("../outside"))
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from database.user import AsyncDB
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetchrow(self, query, *args):
+        self.db.reads += 1
+        if self.db.end_date is None:
+            return None
+        return {"subscription_end_date": self.db.end_date, "remaining": self.db.remaining}
+
+    async def execute(self, query, *args):
+        return "OK"
+
+
+class FakePool:
+    def __init__(self, db):
+        self.conn = FakeConn(db)
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def make_db():
+    db = AsyncDB("db", "user", "password", "localhost")
+    db._prepare_hot = False
+    db.pool = FakePool(db)
+    db.reads = 0
+    db.end_date = datetime(2030, 1, 1)
+    db.remaining = 3600.0
+    return db
+
+
+def test_status_is_cached():
+    async def scenario():
+        db = make_db()
+        first = await db.get_subscription_status(1)
+        assert await db.is_subscription_active(1)
+        assert await db.has_subscription(1)
+        assert await db.get_subscription_end_date(1) == datetime(2030, 1, 1)
+        return first, db.reads
+
+    status, reads = asyncio.run(scenario())
+    assert status == {"exists": True, "active": True, "end_date": datetime(2030, 1, 1)}
+    assert reads == 1
+
+
+def test_expired_subscription_is_inactive():
+    async def scenario():
+        db = make_db()
+        db.remaining = -10.0
+        return await db.get_subscription_status(1)
+
+    status = asyncio.run(scenario())
+    assert status["exists"] and not status["active"]
+
+
+@pytest.mark.parametrize("write", [
+    lambda db: db.add_subscription(1, datetime(2031, 1, 1)),
+    lambda db: db.update_subscription_date(1, datetime(2031, 1, 1)),
+    lambda db: db.extend_subscription(1, 30),
+    lambda db: db.remove_subscription(1),
+])
+def test_writes_invalidate_cache(write):
+    async def scenario():
+        db = make_db()
+        await db.get_subscription_status(1)
+        await db.get_subscription_status(2)
+        await write(db)
+        await db.get_subscription_status(1)
+        # Кэш другого пользователя не трогаем
+        await db.get_subscription_status(2)
+        return db.reads
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_read_overlapping_write_is_not_cached():
+    async def scenario():
+        db = make_db()
+        original = FakeConn.fetchrow
+
+        async def slow_fetchrow(conn, query, *args):
+            row = await original(conn, query, *args)
+            # Пока шел запрос, подписку продлили
+            db._invalidate_subscription(1)
+            return row
+
+        db.pool.conn.fetchrow = slow_fetchrow.__get__(db.pool.conn)
+        await db.get_subscription_status(1)
+        db.pool.conn.fetchrow = original.__get__(db.pool.conn)
+        await db.get_subscription_status(1)
+        return db.reads
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("asyncpg")
+pytest.importorskip("dotenv")
+
+from services import subscription_reminders
+from services.subscription_reminders import SubscriptionSweeper
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def make(reminder_hours=(72, 24), batch_size=2):
+    return SubscriptionSweeper(interval=60, reminder_hours=list(reminder_hours),
+                               expired_lookback_hours=48, batch_size=batch_size)
+
+
+def test_windows_are_contiguous_and_disjoint():
+    windows = make().windows(NOW)
+    assert windows == [
+        ("expired", NOW - timedelta(hours=48), NOW),
+        ("remind_24h", NOW, NOW + timedelta(hours=24)),
+        ("remind_72h", NOW + timedelta(hours=24), NOW + timedelta(hours=72)),
+    ]
+    for (_, _, upper), (_, lower, _) in zip(windows, windows[1:]):
+        assert upper == lower
+
+
+def test_windows_ignore_duplicate_and_non_positive_hours():
+    kinds = [kind for kind, _, _ in make(reminder_hours=(24, 0, -5, 24)).windows(NOW)]
+    assert kinds == ["expired", "remind_24h"]
+
+
+class FakeDB:
+    def __init__(self, rows_by_kind):
+        self.rows_by_kind = rows_by_kind
+        self.calls = []
+        self.released = []
+
+    async def get_db_time(self):
+        return NOW
+
+    async def claim_subscription_notifications(self, kind, after, until, limit):
+        self.calls.append((kind, after))
+        rows = [r for r in self.rows_by_kind.get(kind, []) if (r["end_date"], r["user_id"]) > after]
+        return rows[:limit]
+
+    async def release_subscription_notifications(self, kind, rows):
+        self.released.append((kind, [row["user_id"] for row in rows]))
+
+
+def test_sweep_pages_by_keyset(monkeypatch):
+    end = NOW + timedelta(hours=1)
+    rows = [{"user_id": user_id, "end_date": end} for user_id in (1, 2, 3)]
+    fake_db = FakeDB({"remind_24h": rows})
+    monkeypatch.setattr(subscription_reminders, "db", fake_db)
+
+    sweeper = make()
+    notified = []
+
+    async def notify(kind, user_id, end_date):
+        notified.append((kind, user_id))
+        return "sent"
+
+    sweeper._notify = notify
+    asyncio.run(sweeper.sweep())
+
+    assert notified == [("remind_24h", 1), ("remind_24h", 2), ("remind_24h", 3)]
+    # Вторая страница начинается после последней строки первой
+    assert ("remind_24h", (end, 2)) in fake_db.calls
+    # Неполная страница — окно закончено, лишнего запроса нет
+    assert [c for c in fake_db.calls if c[0] == "remind_24h"] == [
+        ("remind_24h", (NOW, 0)), ("remind_24h", (end, 2))
+    ]
+
+
+def test_failed_sends_are_released(monkeypatch):
+    end = NOW + timedelta(hours=1)
+    rows = [{"user_id": user_id, "end_date": end} for user_id in (1, 2, 3)]
+    fake_db = FakeDB({"remind_24h": rows})
+    monkeypatch.setattr(subscription_reminders, "db", fake_db)
+
+    sweeper = make(batch_size=10)
+    outcomes = {1: "sent", 2: "failed", 3: "blocked"}
+
+    async def notify(kind, user_id, end_date):
+        return outcomes[user_id]
+
+    sweeper._notify = notify
+    asyncio.run(sweeper.sweep())
+    # Заблокировавший бота остается отмеченным, сбой отправки — снимается
+    assert fake_db.released == [("remind_24h", [2])]
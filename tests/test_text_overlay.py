@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("dotenv")
+
+from services.text_overlay import MAX_TEXT_WIDTH, _runs, _wrap
+
+
+class FixedWidthFont:
+    """Каждый символ — 1/40 ширины строки"""
+    char = MAX_TEXT_WIDTH / 40
+
+    def getlength(self, text):
+        return len(text) * self.char
+
+
+def test_wrap_by_words():
+    lines = _wrap("слово " * 20, FixedWidthFont())
+    assert len(lines) > 1
+    assert all(len(line) <= 40 for line in lines)
+    assert " ".join(lines).split() == ["слово"] * 20
+
+
+def test_wrap_splits_word_wider_than_frame():
+    url = "https://example.com/" + "a" * 100
+    lines = _wrap(f"ссылка {url} конец", FixedWidthFont())
+    # Слово режется по ширине кадра, без пробелов внутри
+    assert lines == ["ссылка", url[:40], url[40:80], url[80:], "конец"]
+
+
+def test_wrap_keeps_paragraphs():
+    assert _wrap("раз\nдва", FixedWidthFont()) == ["раз", "два"]
+
+
+def test_runs_separate_emoji():
+    assert _runs("hi 🔥🔥 ok") == [("hi ", False), ("🔥🔥", True), (" ok", False)]